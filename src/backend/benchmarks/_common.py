@@ -0,0 +1,118 @@
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+# Permite importar os módulos do backend ao rodar os scripts desta pasta
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * (p / 100.0)
+    lo = int(k)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize_ms(samples):
+    return {
+        "mean_ms": round(statistics.fmean(samples) * 1000, 4) if samples else 0.0,
+        "p50_ms": round(percentile(samples, 50) * 1000, 4),
+        "p90_ms": round(percentile(samples, 90) * 1000, 4),
+        "p99_ms": round(percentile(samples, 99) * 1000, 4),
+        "n": len(samples),
+    }
+
+
+def time_call(fn, iterations, warmup=3):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def allocations_per_call(fn, iterations=20, warmup=3):
+    # Mede bytes alocados e número de blocos vivos durante cada chamada
+    for _ in range(warmup):
+        fn()
+    tracemalloc.start()
+    try:
+        peak_total = 0
+        blocks_total = 0
+        for _ in range(iterations):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            snap_before = tracemalloc.take_snapshot()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            snap_after = tracemalloc.take_snapshot()
+            peak_total += max(0, peak - before)
+            blocks_total += sum(max(0, s.count_diff) for s in snap_after.compare_to(snap_before, "filename"))
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_bytes_per_call": peak_total // iterations,
+        "new_blocks_per_call": round(blocks_total / iterations, 2),
+    }
+
+
+def synthetic_jpeg(width, height, quality=70, seed=0):
+    # Gradiente com ruído: comprime de forma parecida com um frame de webcam
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = (x + y) / 2
+    img = np.stack([base, base[:, ::-1], np.flipud(base)], axis=-1)
+    img += rng.normal(0, 12, img.shape)
+    img = np.clip(img, 0, 255).astype(np.uint8)
+    ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return buf.tobytes()
+
+
+def peak_rss_mb():
+    # Pico de memória residente do processo (ru_maxrss é KiB no Linux)
+    import resource
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def git_revision():
+    import subprocess
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def environment_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(path, results):
+    if not path:
+        return
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Resultados salvos em {path}")
@@ -0,0 +1,103 @@
+"""Benchmark da decodificação de frames JPEG.
+
+Compara os caminhos antigos (PIL + cvtColor e imdecode + cvtColor) com o
+FrameDecoder em várias resoluções, medindo tempo e alocações por frame e
+se o array de saída é reaproveitado entre chamadas (só com TurboJPEG com
+dst; o caminho padrão do OpenCV aloca um array por frame).
+Antes de medir, confere que RGB e BGR saem corretos em todos os fatores de
+redução (1, 2, 4, 8).
+
+    python benchmarks/bench_decode.py --iterations 200 --output decode.json
+"""
+import argparse
+from io import BytesIO
+
+from _common import allocations_per_call, environment_info, save_results, summarize_ms, synthetic_jpeg, time_call
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from frame_decoder import FrameDecoder
+
+RESOLUTIONS = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080), "4k": (3840, 2160)}
+
+
+def legacy_pil(data):
+    frame = np.array(Image.open(BytesIO(data)))
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+
+def legacy_imdecode(data):
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+
+def reuses_output(fn) -> bool:
+    # Duas chamadas seguidas devolvendo a mesma memória: buffer reaproveitado
+    return bool(np.shares_memory(fn(), fn()))
+
+
+def check_decoders():
+    # RGB tem que ser exatamente o BGR invertido em todo fator de redução,
+    # tanto pelo OpenCV quanto pelo caminho público (TurboJPEG, se instalado)
+    data = synthetic_jpeg(*RESOLUTIONS["4k"])
+    width, height = RESOLUTIONS["4k"]
+    rgb_decoder = FrameDecoder("rgb")
+    bgr_decoder = FrameDecoder("bgr")
+    for factor in (1, 2, 4, 8):
+        expected = (-(-height // factor), -(-width // factor), 3)
+        for path, rgb, bgr in (
+            ("opencv", rgb_decoder._decode_cv2(data, factor), bgr_decoder._decode_cv2(data, factor)),
+            ("decode", rgb_decoder.decode(data, max(width, height) // factor),
+             bgr_decoder.decode(data, max(width, height) // factor)),
+        ):
+            if rgb is None or bgr is None:
+                raise SystemExit(f"falha ao decodificar ({path}, fator {factor})")
+            if rgb.shape != expected or bgr.shape != expected:
+                raise SystemExit(f"formato inesperado ({path}, fator {factor}): {rgb.shape} / {bgr.shape}")
+            if not np.array_equal(rgb, bgr[..., ::-1]):
+                raise SystemExit(f"RGB não corresponde ao BGR invertido ({path}, fator {factor})")
+    print("decodificação RGB/BGR conferida nos fatores 1, 2, 4 e 8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS))
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    check_decoders()
+    results = {"environment": environment_info(), "cases": []}
+    for name in args.resolutions.split(","):
+        width, height = RESOLUTIONS[name]
+        data = synthetic_jpeg(width, height)
+        rgb_decoder = FrameDecoder("rgb")
+        bgr_decoder = FrameDecoder("bgr")
+        full_decoder = FrameDecoder("rgb", max_side=0)
+        paths = {
+            "pil+cvtColor": lambda: legacy_pil(data),
+            "imdecode+cvtColor": lambda: legacy_imdecode(data),
+            "FrameDecoder(rgb, full)": lambda: full_decoder.decode(data),
+            "FrameDecoder(rgb)": lambda: rgb_decoder.decode(data),
+            "FrameDecoder(bgr)": lambda: bgr_decoder.decode(data),
+        }
+        for path, fn in paths.items():
+            case = {"resolution": name, "jpeg_bytes": len(data), "path": path}
+            case.update(summarize_ms(time_call(fn, args.iterations)))
+            case.update(allocations_per_call(fn))
+            case["output_shape"] = list(fn().shape)
+            case["reuses_buffer"] = reuses_output(fn)
+            results["cases"].append(case)
+            print(
+                f"{name:>6} {path:<26} {case['mean_ms']:8.2f} ms  p99 {case['p99_ms']:8.2f} ms  "
+                f"{case['peak_bytes_per_call'] / 1024:10.1f} KiB/frame  saída {case['output_shape']}  "
+                f"{'buffer reaproveitado' if case['reuses_buffer'] else 'aloca por frame'}"
+            )
+
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Benchmark de serialização e tamanho das maiores respostas da API.
+
+Compara o caminho padrão do FastAPI (jsonable_encoder + json.dumps) com o
+orjson do responses.py e mede o tamanho e o custo da compressão gzip e, se
+instalado, brotli, nos payloads de /users/, /analyze/text,
+/videos/{id}/timeline e da mensagem de /ws/analyze.
+
+    python benchmarks/bench_json.py --output json.json
+"""
+import argparse
+import json
+import random
+from datetime import datetime, timedelta
+
+from _common import environment_info, save_results, summarize_ms, time_call
+
+from fastapi.encoders import jsonable_encoder
+
+import responses
+from emotion_model import EMOTION_TRANSLATION
+
+EMOTIONS = sorted(set(EMOTION_TRANSLATION.values()))
+
+
+def synthetic_users(n, seed=0):
+    # Linhas do RealDictCursor: created_at chega como datetime
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return {"users": [
+        {
+            "id": i + 1,
+            "name": f"Usuário {i + 1}",
+            "email": f"usuario{i + 1}@exemplo.com",
+            "created_at": start + timedelta(minutes=rng.randint(0, 500000))
+        }
+        for i in range(n)
+    ]}
+
+
+def synthetic_text_batch(n, seed=0):
+    rng = random.Random(seed)
+    sentiments = ("positivo", "neutro", "negativo")
+    behaviors = ("agressivo", "ansioso", "educado", "sarcastico")
+    results = []
+    for _ in range(n):
+        counts = {b: rng.randint(1, 3) for b in behaviors if rng.random() < 0.3}
+        results.append({
+            "sentiment": rng.choice(sentiments),
+            "polarity": rng.uniform(-1, 1),
+            "behaviors": counts,
+            "behavior": max(counts, key=counts.get) if counts else "nenhum"
+        })
+    return {"success": True, "results": results, "summary": {"total": n}}
+
+
+def synthetic_timeline(seconds, seed=0):
+    rng = random.Random(seed)
+    timeline = []
+    for second in range(seconds):
+        raw = [rng.random() for _ in EMOTIONS]
+        total = sum(raw)
+        emotions = {e: round(100.0 * v / total, 2) for e, v in zip(EMOTIONS, raw)}
+        timeline.append({
+            "second": second,
+            "samples": 2,
+            "faces": rng.randint(0, 3),
+            "dominant_emotion": max(emotions, key=emotions.get),
+            "emotions": emotions
+        })
+    return {"status": "done", "progress": 1.0, "timeline": timeline}
+
+
+def synthetic_ws_result(n_faces, seed=0):
+    rng = random.Random(seed)
+    faces = []
+    for i in range(n_faces):
+        raw = [rng.random() for _ in EMOTIONS]
+        total = sum(raw)
+        emotions = {e: 100.0 * v / total for e, v in zip(EMOTIONS, raw)}
+        faces.append({"box": {"x": 40 * i, "y": 60, "w": 120, "h": 140}, "emotions": emotions,
+                      "dominant_emotion": max(emotions, key=emotions.get), "track_id": i + 1})
+    return {"type": "analysis_result", "data": {
+        "emotions": faces[0]["emotions"], "dominant_emotion": faces[0]["dominant_emotion"],
+        "face_detected": True, "faces": faces, "degradation": 0,
+        "timestamp": datetime.now().isoformat()
+    }}
+
+
+def fastapi_default(content):
+    # O que o FastAPI faz quando a rota devolve um dict com JSONResponse padrão
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fast_json_default(content):
+    # FastJSONResponse como classe padrão: o jsonable_encoder continua rodando
+    return responses.dumps(jsonable_encoder(content))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--seconds", type=int, default=3600)
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    if responses.orjson is None:
+        print("orjson não instalado: responses.dumps usa o json da biblioteca padrão")
+    encodings = ["gzip"] + (["br"] if responses.brotli is not None else [])
+    if responses.brotli is None:
+        print("brotli não instalado: só gzip")
+
+    payloads = {
+        f"/users/ ({args.users})": synthetic_users(args.users),
+        f"/analyze/text ({args.messages})": synthetic_text_batch(args.messages),
+        f"/videos/timeline ({args.seconds} s)": synthetic_timeline(args.seconds),
+        "/ws/analyze (4 rostos)": synthetic_ws_result(4),
+    }
+    serializers = {
+        "encoder+json": fastapi_default,
+        "encoder+orjson": fast_json_default,
+        "orjson": responses.dumps,
+    }
+
+    results = {"environment": environment_info(), "cases": []}
+    for payload_name, content in payloads.items():
+        # Mesmo conteúdo nos dois caminhos antes de comparar tempos
+        assert json.loads(responses.dumps(content)) == json.loads(fastapi_default(content))
+        iterations = args.iterations if len(fastapi_default(content)) > 10000 else args.iterations * 100
+        baseline = None
+        for name, serialize in serializers.items():
+            case = {"payload": payload_name, "serializer": name}
+            case.update(summarize_ms(time_call(lambda: serialize(content), iterations)))
+            baseline = baseline or case["mean_ms"]
+            results["cases"].append(case)
+            print(f"{payload_name:<28} {name:<15} {case['mean_ms']:9.3f} ms  "
+                  f"{baseline / case['mean_ms']:5.1f}x")
+
+        body = responses.dumps(content)
+        sizes = {"payload": payload_name, "raw_bytes": len(body)}
+        for encoding in encodings:
+            compressed = responses.compress(body, encoding)
+            timing = summarize_ms(time_call(lambda: responses.compress(body, encoding), iterations))
+            sizes[f"{encoding}_bytes"] = len(compressed)
+            sizes[f"{encoding}_mean_ms"] = timing["mean_ms"]
+            print(f"{payload_name:<28} {encoding:<15} {len(body):9d} -> {len(compressed):8d} bytes "
+                  f"({len(compressed) / len(body):.0%})  {timing['mean_ms']:.3f} ms")
+        results.setdefault("sizes", []).append(sizes)
+
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
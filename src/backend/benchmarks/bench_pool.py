@@ -0,0 +1,115 @@
+"""Escalabilidade do pool de inferência (inference_pool) com o número de workers.
+
+Para cada quantidade de workers mantém 2 frames em voo por worker durante
+--duration segundos e mede frames por segundo e latência por frame. O
+caso "0" é a inferência no próprio processo, como o main.py faz com
+INFERENCE_WORKERS=0. Frames sintéticos não têm rostos; use --frames-dir
+com fotos reais para incluir a classificação.
+
+    python benchmarks/bench_pool.py --workers 0,1,2,4,8 --duration 10 --output pool.json
+"""
+import argparse
+import collections
+import os
+import time
+
+from _common import environment_info, percentile, save_results, synthetic_jpeg
+
+import cv2
+
+from frame_decoder import FrameDecoder
+from inference_pool import InferencePool
+from pipeline import analyze_faces
+from preprocessing import haar_detector
+
+
+def load_frames(args):
+    if args.frames_dir:
+        data = [
+            open(os.path.join(args.frames_dir, n), "rb").read()
+            for n in sorted(os.listdir(args.frames_dir)) if n.lower().endswith((".jpg", ".jpeg"))
+        ]
+    else:
+        data = [synthetic_jpeg(args.width, args.height, seed=i) for i in range(8)]
+    decoder = FrameDecoder("bgr")
+    return [decoder.decode(d).copy() for d in data]
+
+
+def run_in_process(frames, duration):
+    detector = haar_detector()
+    latencies = []
+    deadline = time.perf_counter() + duration
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        analyze_faces(detector, frames[i % len(frames)], "bgr")
+        latencies.append(time.perf_counter() - start)
+        i += 1
+    return latencies
+
+
+def run_pool(frames, workers, duration, in_flight):
+    pool = InferencePool(workers).start()
+    try:
+        # Espera os workers subirem (imports e modelo) antes de medir
+        for future in [pool.submit(frames[0]) for _ in range(workers)]:
+            future.result(timeout=300)
+
+        latencies = []
+        pending = collections.deque()
+        deadline = time.perf_counter() + duration
+        i = 0
+        while time.perf_counter() < deadline:
+            while len(pending) < in_flight:
+                pending.append((time.perf_counter(), pool.submit(frames[i % len(frames)])))
+                i += 1
+            start, future = pending.popleft()
+            future.result()
+            latencies.append(time.perf_counter() - start)
+        for _, future in pending:
+            future.result()
+        return latencies
+    finally:
+        pool.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="0,1,2,4")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--in-flight-per-worker", type=int, default=2)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--frames-dir", help="pasta com JPEGs reais")
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    # O caso em processo também fica em um núcleo, como cada worker
+    cv2.setNumThreads(1)
+    frames = load_frames(args)
+
+    results = []
+    baseline = None
+    for workers in (int(v) for v in args.workers.split(",")):
+        if workers == 0:
+            latencies = run_in_process(frames, args.duration)
+        else:
+            latencies = run_pool(frames, workers, args.duration, workers * args.in_flight_per_worker)
+        fps = len(latencies) / args.duration
+        baseline = baseline or fps
+        row = {
+            "workers": workers,
+            "fps": round(fps, 2),
+            "speedup": round(fps / baseline, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+        results.append(row)
+        print(f"{workers:3d} workers  {row['fps']:8.1f} fps  {row['speedup']:5.2f}x  "
+              f"p50 {row['p50_ms']:7.1f} ms  p99 {row['p99_ms']:7.1f} ms")
+
+    save_results(args.output, {"environment": environment_info(), "config": vars(args), "results": results})
+
+
+if __name__ == "__main__":
+    main()
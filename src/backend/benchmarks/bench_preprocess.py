@@ -0,0 +1,98 @@
+"""Benchmark da detecção em frame reduzido e do recorte direto para o classificador.
+
+Compara, em 720p e 1080p, a detecção no frame inteiro com a detecção no
+frame reduzido (DETECTION_MAX_SIDE) e o recorte no estilo do DeepFace
+(224x224 e depois 48x48) com o recorte direto para 48x48. Reporta tempo de
+CPU por frame para cada caminho.
+
+    python benchmarks/bench_preprocess.py --max-sides 320,480,640 --output preprocess.json
+"""
+import argparse
+import time
+
+from _common import environment_info, save_results, summarize_ms
+
+import cv2
+import numpy as np
+
+from preprocessing import FaceBox, crop_faces, detect_faces, haar_detector, mediapipe_detector
+
+RESOLUTIONS = {"720p": (1280, 720), "1080p": (1920, 1080)}
+
+
+def synthetic_frame(width, height):
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    # Suaviza para parecer uma cena real em vez de ruído puro
+    return cv2.GaussianBlur(frame, (0, 0), 3)
+
+
+def cpu_samples(fn, iterations, warmup=2):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(iterations):
+        start = time.process_time()
+        fn()
+        samples.append(time.process_time() - start)
+    return samples
+
+
+def deepface_style_crop(frame, box):
+    face = frame[box.y:box.y + box.h, box.x:box.x + box.w]
+    face = cv2.resize(face, (224, 224))
+    gray = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(gray, (48, 48))
+
+
+def load_detectors():
+    detectors = {"haar": haar_detector()}
+    try:
+        import mediapipe as mp
+        fd = mp.solutions.face_detection.FaceDetection(min_detection_confidence=0.5)
+        detectors["mediapipe"] = mediapipe_detector(fd, "bgr")
+    except ImportError:
+        print("MediaPipe não instalado: medindo apenas o detector Haar")
+    return detectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--max-sides", default="320,480,640")
+    parser.add_argument("--faces", type=int, default=1, help="rostos simulados por frame no estágio de recorte")
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    detectors = load_detectors()
+    max_sides = [int(v) for v in args.max_sides.split(",")]
+    results = {"environment": environment_info(), "cases": []}
+
+    for name, (width, height) in RESOLUTIONS.items():
+        frame = synthetic_frame(width, height)
+        side = height // 3
+        boxes = [FaceBox(width // 3 + i * 10, height // 3, side, side) for i in range(args.faces)]
+
+        for det_name, detector in detectors.items():
+            baseline = summarize_ms(cpu_samples(lambda: detect_faces(detector, frame, 0), args.iterations))
+            results["cases"].append({"resolution": name, "stage": "detect", "detector": det_name,
+                                     "max_side": 0, **baseline})
+            print(f"{name:>6} detect {det_name:<9} full      {baseline['mean_ms']:8.2f} ms CPU")
+            for max_side in max_sides:
+                case = summarize_ms(cpu_samples(lambda: detect_faces(detector, frame, max_side), args.iterations))
+                saved = 100.0 * (1 - case["mean_ms"] / baseline["mean_ms"]) if baseline["mean_ms"] else 0.0
+                results["cases"].append({"resolution": name, "stage": "detect", "detector": det_name,
+                                         "max_side": max_side, "cpu_saved_pct": round(saved, 1), **case})
+                print(f"{name:>6} detect {det_name:<9} {max_side:<9} {case['mean_ms']:8.2f} ms CPU  ({saved:5.1f}% menos)")
+
+        legacy = summarize_ms(cpu_samples(lambda: [deepface_style_crop(frame, b) for b in boxes], args.iterations * 10))
+        direct = summarize_ms(cpu_samples(lambda: crop_faces(frame, boxes, "bgr"), args.iterations * 10))
+        for path, case in (("224->48", legacy), ("direto 48", direct)):
+            results["cases"].append({"resolution": name, "stage": "crop", "path": path, "faces": args.faces, **case})
+            print(f"{name:>6} crop   {path:<19} {case['mean_ms']:8.3f} ms CPU")
+
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark das análises por equipe (team_analytics.py) sem banco.
+
+Gera contagens diárias sintéticas para uma equipe (com alguns membros de
+estresse alto plantados) e mede o cálculo vetorizado, a consulta com cache,
+a consulta depois de dados novos de um usuário (só o dia afetado é
+recarregado) e a primeira consulta com todos os dias carregados.
+
+    python benchmarks/bench_team_analytics.py --users 5000 --output team.json
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+from _common import environment_info, save_results, summarize_ms, time_call
+
+from team_analytics import EMOTION_ORDER, STRESS, TeamAnalytics, compute_analytics
+
+
+def synthetic_rows(n_users, n_days, today, outliers=5, seed=0):
+    # Uma linha por usuário e dia com dados (~70% dos dias), como em user_emotion_daily
+    rng = np.random.default_rng(seed)
+    probs = np.full(len(EMOTION_ORDER), 1.0)
+    probs[STRESS] = 0.6
+    base = probs / probs.sum()
+    stressed = probs.copy()
+    stressed[STRESS] = 4.0
+    stressed /= stressed.sum()
+    rows = {}
+    for d in range(n_days):
+        day = today - timedelta(days=d)
+        present = np.flatnonzero(rng.random(n_users) < 0.7)
+        frames = rng.integers(50, 400, size=present.size)
+        counts = rng.multinomial(frames, base)
+        planted = present < outliers
+        if planted.any():
+            counts[planted] = rng.multinomial(frames[planted], stressed)
+        rows[day] = [{"user_id": int(u) + 1, "day": day, "counts": c.tolist()} for u, c in zip(present, counts)]
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    today = date.today()
+    print(f"Gerando {args.users} usuários x {args.days} dias...")
+    rows = synthetic_rows(args.users, args.days, today)
+    members = list(range(1, args.users + 1))
+
+    def load_days(team_id, days):
+        return [row for d in days for row in rows.get(d, ())]
+
+    results = {"environment": environment_info(), "users": args.users, "cases": []}
+
+    def report(name, samples):
+        case = {"case": name}
+        case.update(summarize_ms(samples))
+        results["cases"].append(case)
+        print(f"{name:<36} média {case['mean_ms']:8.2f} ms  p99 {case['p99_ms']:8.2f} ms")
+
+    user_ids = np.asarray(members, dtype=np.int64)
+    for window in (30, args.days):
+        days = [today - timedelta(days=i) for i in range(window - 1, -1, -1)]
+        counts = np.zeros((args.users, window, len(EMOTION_ORDER)), dtype=np.int32)
+        for j, d in enumerate(days):
+            for row in rows[d]:
+                counts[row["user_id"] - 1, j] = row["counts"]
+        for bucket in ("day", "week"):
+            report(f"cálculo {window} dias ({bucket})",
+                   time_call(lambda: compute_analytics(user_ids, days, counts, bucket), args.iterations))
+
+    analytics = TeamAnalytics(load_members=lambda team_id: members, load_days=load_days)
+    start = time.perf_counter()
+    result = analytics.get(1, 30, "day", today)
+    report("primeira consulta 30 dias (carga)", [time.perf_counter() - start])
+    planted = sorted(o["user_id"] for o in result["outliers"] if o["metric"] == "stress_share")
+    print(f"fora da curva (estresse): {planted[:10]}")
+
+    report("consulta com cache", time_call(lambda: analytics.get(1, 30, "day", today), args.iterations))
+
+    def after_new_data():
+        analytics.invalidate_user(1, today)
+        analytics.get(1, 30, "day", today)
+
+    report("consulta após dados novos (1 dia)", time_call(after_new_data, args.iterations))
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
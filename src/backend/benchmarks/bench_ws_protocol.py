@@ -0,0 +1,86 @@
+"""Benchmark do custo de serialização e do tamanho das mensagens de /ws/analyze.
+
+Compara o JSON atual com o protocolo binário (scores em uint8 e float16) e,
+se instalado, com MessagePack, para 1, 4 e 16 rostos por frame.
+
+    python benchmarks/bench_ws_protocol.py --output ws_protocol.json
+"""
+import argparse
+import json
+import random
+from datetime import datetime
+
+from _common import environment_info, save_results, summarize_ms, time_call
+
+from ws_protocol import WIRE_ORDER, decode_result, encode_result
+
+
+def synthetic_result(n_faces, seed=0):
+    rng = random.Random(seed)
+    faces = []
+    for i in range(n_faces):
+        raw = [rng.random() for _ in WIRE_ORDER]
+        total = sum(raw)
+        emotions = {label: 100.0 * v / total for label, v in zip(WIRE_ORDER, raw)}
+        faces.append({
+            "box": {"x": 40 * i, "y": 60, "w": 120, "h": 140},
+            "emotions": emotions,
+            "dominant_emotion": max(emotions, key=emotions.get),
+            "track_id": i + 1
+        })
+    return {
+        "emotions": faces[0]["emotions"],
+        "dominant_emotion": faces[0]["dominant_emotion"],
+        "face_detected": True,
+        "faces": faces
+    }
+
+
+def json_message(result):
+    return json.dumps({
+        "type": "analysis_result",
+        "data": {
+            "emotions": result["emotions"],
+            "dominant_emotion": result["dominant_emotion"],
+            "face_detected": result["face_detected"],
+            "faces": result["faces"],
+            "timestamp": datetime.now().isoformat()
+        }
+    }).encode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5000)
+    parser.add_argument("--faces", default="1,4,16")
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    encoders = {
+        "json": json_message,
+        "binary-uint8": lambda r: encode_result(r),
+        "binary-float16": lambda r: encode_result(r, float16=True),
+    }
+    try:
+        import msgpack
+        encoders["msgpack"] = lambda r: msgpack.packb({"type": "analysis_result", "data": r})
+    except ImportError:
+        print("msgpack não instalado: comparação com MessagePack ignorada")
+
+    results = {"environment": environment_info(), "cases": []}
+    for n_faces in (int(v) for v in args.faces.split(",")):
+        result = synthetic_result(n_faces)
+        # Garante que o formato binário é reversível antes de medir
+        assert len(decode_result(encode_result(result))["faces"]) == n_faces
+        for name, encode in encoders.items():
+            size = len(encode(result))
+            case = {"faces": n_faces, "format": name, "bytes": size}
+            case.update(summarize_ms(time_call(lambda: encode(result), args.iterations)))
+            results["cases"].append(case)
+            print(f"{n_faces:>3} rostos {name:<15} {size:6d} bytes  {case['mean_ms'] * 1000:8.2f} us/msg")
+
+    save_results(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
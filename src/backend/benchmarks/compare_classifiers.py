@@ -0,0 +1,133 @@
+"""Acurácia x velocidade dos backends do classificador de emoções.
+
+Cada --model é "deepface" ou "backend:caminho" (p.ex. onnx:models/emotion-int8.onnx).
+O primeiro modelo é a referência. Para cada um reporta:
+
+  accuracy     acerto top-1 no --dataset rotulado (pastas com o nome da
+               emoção, em inglês como no FER2013 ou em português)
+  agreement    emoção dominante igual à da referência
+  mean_abs_pp  diferença média das probabilidades para a referência, em pontos percentuais
+  latência     p50/p99 por lote de 1 e de 8 rostos, em um núcleo
+  memória      RSS acrescentado ao carregar o modelo
+
+    python benchmarks/compare_classifiers.py --dataset ~/fer2013/test \\
+        --model deepface --model onnx:models/emotion-fp16.onnx --model onnx:models/emotion-int8.onnx
+"""
+import argparse
+import os
+import time
+
+from _common import environment_info, save_results, summarize_ms
+
+import cv2
+import numpy as np
+
+from emotion_model import EMOTION_LABELS, EMOTION_TRANSLATION, faces_to_batch, load_classifier
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+_LABEL_INDEX = {label: i for i, label in enumerate(EMOTION_LABELS)}
+_LABEL_INDEX.update({pt: _LABEL_INDEX[en] for en, pt in EMOTION_TRANSLATION.items()})
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return None
+
+
+def load_dataset(path, limit):
+    faces, labels = [], []
+    per_label = max(1, limit // len(EMOTION_LABELS))
+    for folder in sorted(os.listdir(path)):
+        label = _LABEL_INDEX.get(folder.lower())
+        if label is None:
+            continue
+        names = sorted(n for n in os.listdir(os.path.join(path, folder)) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[:per_label]:
+            img = cv2.imread(os.path.join(path, folder, name), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                faces.append(cv2.resize(img, (48, 48), interpolation=cv2.INTER_AREA))
+                labels.append(label)
+    if not faces:
+        raise SystemExit(f"Nenhuma imagem rotulada em {path} (esperado: pastas {', '.join(EMOTION_LABELS)})")
+    return np.stack(faces), np.array(labels)
+
+
+def parse_model(spec):
+    backend, _, path = spec.partition(":")
+    return backend, path
+
+
+def predict_all(classifier, faces, batch_size=64):
+    batch = faces_to_batch(faces)
+    return np.concatenate([classifier.predict(batch[i:i + batch_size]) for i in range(0, len(batch), batch_size)])
+
+
+def latency(classifier, faces, batch_size, iterations):
+    batch = faces_to_batch(faces[:batch_size])
+    for _ in range(3):
+        classifier.predict(batch)
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        classifier.predict(batch)
+        samples.append(time.perf_counter() - start)
+    return summarize_ms(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", action="append", required=True, help="deepface ou backend:caminho")
+    parser.add_argument("--dataset", help="pasta com subpastas por emoção")
+    parser.add_argument("--limit", type=int, default=2000, help="máximo de imagens do dataset")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1, help="threads do runtime (1 = um núcleo)")
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    cv2.setNumThreads(1)
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", str(args.threads))
+    if args.dataset:
+        faces, labels = load_dataset(args.dataset, args.limit)
+    else:
+        print("Sem --dataset: só concordância com a referência, em rostos sintéticos")
+        faces, labels = np.random.default_rng(0).integers(0, 256, (256, 48, 48), dtype=np.uint8), None
+
+    results, reference = [], None
+    for spec in args.model:
+        backend, path = parse_model(spec)
+        rss_before = current_rss_mb()
+        start = time.perf_counter()
+        classifier = load_classifier(backend, path, threads=args.threads)
+        load_s = time.perf_counter() - start
+        probs = predict_all(classifier, faces)
+        rss_after = current_rss_mb()
+
+        predicted = probs.argmax(axis=1)
+        row = {
+            "model": spec,
+            "file_kib": round(os.path.getsize(path) / 1024) if path else None,
+            "load_s": round(load_s, 2),
+            "rss_added_mb": round(rss_after - rss_before, 1) if rss_before is not None else None,
+            "accuracy": round(float((predicted == labels).mean()), 4) if labels is not None else None,
+            "latency_batch1": latency(classifier, faces, 1, args.iterations),
+            "latency_batch8": latency(classifier, faces, 8, args.iterations),
+        }
+        if reference is None:
+            reference = probs
+        else:
+            row["agreement"] = round(float((predicted == reference.argmax(axis=1)).mean()), 4)
+            row["mean_abs_pp"] = round(float(np.abs(probs - reference).mean() * 100), 3)
+        results.append(row)
+
+        print(f"{spec:<40} acc {row['accuracy']}  concordância {row.get('agreement', 'ref')}  "
+              f"b1 p50 {row['latency_batch1']['p50_ms']:.2f} ms  b8 p50 {row['latency_batch8']['p50_ms']:.2f} ms  "
+              f"+RSS {row['rss_added_mb']} MB")
+
+    save_results(args.output, {"environment": environment_info(), "config": vars(args), "models": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""Suíte de benchmarks do pipeline de emoções (roda sem câmera, em modo headless).
+
+Alimenta conjuntos de frames sintéticos (em várias resoluções e quantidades
+de rostos) ou gravados (pasta de imagens ou arquivo de vídeo) por:
+
+  stages      decodificação, detecção, recorte, classificação e serialização,
+              medidos estágio a estágio (detector Haar do main.py e, se
+              instalado, MediaPipe do emotion_server.py)
+  analyze     analyze_emotions() do main.py, de ponta a ponta
+  websocket   o handler /ws/analyze do main.py, pelo TestClient do Starlette
+
+Reporta percentis de latência por estágio, frames por segundo por núcleo
+(1 / tempo de CPU por frame), pico de RSS e alocações por frame, e salva
+JSON para comparar commits:
+
+    python benchmarks/run_pipeline.py --output antes.json
+    python benchmarks/run_pipeline.py --output depois.json --compare antes.json
+    python benchmarks/run_pipeline.py --recorded ~/frames --paths stages,analyze
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from _common import (allocations_per_call, environment_info, peak_rss_mb, save_results,
+                     summarize_ms, synthetic_jpeg)
+
+import cv2
+import numpy as np
+
+from frame_decoder import FrameDecoder
+from pipeline import build_result
+from preprocessing import FaceBox, crop_faces, detect_faces, haar_detector, mediapipe_detector
+
+RESOLUTIONS = {"480p": (640, 480), "720p": (1280, 720), "1080p": (1920, 1080)}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def synthetic_set(width, height, n=8):
+    # Frames diferentes entre si, para não medir só o caso de cache quente
+    return [synthetic_jpeg(width, height, seed=i) for i in range(n)]
+
+
+def recorded_set(path, limit):
+    frames = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if not name.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            img = cv2.imread(os.path.join(path, name))
+            if img is not None:
+                frames.append(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 70])[1].tobytes())
+            if len(frames) >= limit:
+                break
+    else:
+        cap = cv2.VideoCapture(path)
+        while len(frames) < limit:
+            ok, img = cap.read()
+            if not ok:
+                break
+            frames.append(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 70])[1].tobytes())
+        cap.release()
+    if not frames:
+        raise SystemExit(f"Nenhum frame encontrado em {path}")
+    return frames
+
+
+def synthetic_boxes(width, height, n_faces):
+    # Rostos simulados em grade, usados quando o detector acha menos rostos que o pedido
+    if n_faces <= 0:
+        return []
+    cols = max(1, int(n_faces ** 0.5 + 0.999))
+    side = min(width, height) // (cols + 1)
+    return [
+        FaceBox((i % cols) * side + side // 2, (i // cols) * side + side // 2, side, side)
+        for i in range(n_faces)
+    ]
+
+
+def load_classifier():
+    try:
+        from emotion_model import classify_faces, get_classifier
+        get_classifier()
+        return classify_faces
+    except Exception as e:
+        print(f"Classificador indisponível ({e.__class__.__name__}): estágio 'classify' ignorado")
+        return None
+
+
+def bench_stages(frames, detector, color, n_faces, classify, iterations):
+    decoder = FrameDecoder(color)
+    stages = {"decode": [], "detect": [], "crop": [], "classify": [], "serialize": []}
+    cpu = []
+
+    def one_frame(data, record=True):
+        t0 = time.perf_counter()
+        c0 = time.process_time()
+        frame = decoder.decode(data)
+        t1 = time.perf_counter()
+        boxes = detect_faces(detector, frame)
+        t2 = time.perf_counter()
+        if len(boxes) < n_faces:
+            boxes = boxes + synthetic_boxes(frame.shape[1], frame.shape[0], n_faces - len(boxes))
+        boxes = boxes[:n_faces] if n_faces else boxes
+        faces = crop_faces(frame, boxes, color)
+        t3 = time.perf_counter()
+        if classify is not None and len(faces):
+            scores = classify(faces)
+        else:
+            scores = np.full((len(faces), 7), 100.0 / 7, dtype=np.float32)
+        t4 = time.perf_counter()
+        json.dumps(build_result(boxes, scores))
+        t5 = time.perf_counter()
+        if record:
+            stages["decode"].append(t1 - t0)
+            stages["detect"].append(t2 - t1)
+            stages["crop"].append(t3 - t2)
+            if classify is not None:
+                stages["classify"].append(t4 - t3)
+            stages["serialize"].append(t5 - t4)
+            stages.setdefault("total", []).append(t5 - t0)
+            cpu.append(time.process_time() - c0)
+
+    for i in range(min(3, len(frames))):
+        one_frame(frames[i], record=False)
+    for i in range(iterations):
+        one_frame(frames[i % len(frames)])
+
+    position = [0]
+
+    def next_frame():
+        position[0] += 1
+        one_frame(frames[position[0] % len(frames)], record=False)
+
+    alloc = allocations_per_call(next_frame, iterations=10)
+    return stages, cpu, alloc
+
+
+def bench_analyze(frames, iterations):
+    import main
+
+    loop = asyncio.new_event_loop()
+    samples, cpu = [], []
+    try:
+        for i in range(iterations):
+            t0, c0 = time.perf_counter(), time.process_time()
+            loop.run_until_complete(main.analyze_emotions(frames[i % len(frames)]))
+            samples.append(time.perf_counter() - t0)
+            cpu.append(time.process_time() - c0)
+    finally:
+        loop.close()
+    return {"total": samples}, cpu
+
+
+def bench_websocket(frames, iterations):
+    import main
+    from fastapi.testclient import TestClient
+
+    samples, cpu = [], []
+    with TestClient(main.app) as client, client.websocket_connect("/ws/analyze") as ws:
+        for i in range(iterations):
+            t0, c0 = time.perf_counter(), time.process_time()
+            ws.send_bytes(frames[i % len(frames)])
+            ws.receive_json()
+            samples.append(time.perf_counter() - t0)
+            cpu.append(time.process_time() - c0)
+    return {"round_trip": samples}, cpu
+
+
+def make_case(source, resolution, n_faces, path, stages, cpu, alloc=None):
+    mean_cpu = sum(cpu) / len(cpu) if cpu else 0.0
+    case = {
+        "source": source,
+        "resolution": resolution,
+        "faces": n_faces,
+        "path": path,
+        "stages": {name: summarize_ms(s) for name, s in stages.items() if s},
+        "cpu_ms_per_frame": round(mean_cpu * 1000, 3),
+        "fps_per_core": round(1.0 / mean_cpu, 2) if mean_cpu else None,
+        # Pico do processo até este caso (os casos rodam em sequência no mesmo processo)
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if alloc:
+        case["allocations"] = alloc
+    return case
+
+
+def print_case(case):
+    stages = "  ".join(f"{k} p50={v['p50_ms']:.2f} p99={v['p99_ms']:.2f}" for k, v in case["stages"].items())
+    faces = f" {case['faces']}f" if case["faces"] is not None else ""
+    print(f"[{case['source']} {case['resolution']}{faces} {case['path']}] "
+          f"{case['fps_per_core']} fps/núcleo  RSS {case['peak_rss_mb']} MB  {stages}")
+
+
+def case_key(case):
+    return (case["source"], case["resolution"], case["faces"], case["path"])
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {case_key(c): c for c in json.load(f)["cases"]}
+    print(f"\nComparação com {baseline_path} (p50 atual / p50 base):")
+    for case in results["cases"]:
+        old = baseline.get(case_key(case))
+        if not old:
+            continue
+        for stage, summary in case["stages"].items():
+            before = old["stages"].get(stage, {}).get("p50_ms")
+            if before:
+                ratio = summary["p50_ms"] / before
+                flag = "  <-- regressão" if ratio > 1.1 else ""
+                print(f"  {'/'.join(map(str, case_key(case)))} {stage:<10} {ratio:5.2f}x{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--resolutions", default=",".join(RESOLUTIONS))
+    parser.add_argument("--faces", default="0,1,4", help="rostos por frame no caminho 'stages'")
+    parser.add_argument("--paths", default="stages,analyze,websocket")
+    parser.add_argument("--recorded", help="pasta de imagens ou arquivo de vídeo com frames reais")
+    parser.add_argument("--recorded-limit", type=int, default=200)
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    parser.add_argument("--compare", help="JSON de uma execução anterior para comparar")
+    args = parser.parse_args()
+
+    paths = args.paths.split(",")
+    face_counts = [int(v) for v in args.faces.split(",")]
+
+    sets = []
+    if args.recorded:
+        frames = recorded_set(args.recorded, args.recorded_limit)
+        h, w = cv2.imdecode(np.frombuffer(frames[0], np.uint8), cv2.IMREAD_COLOR).shape[:2]
+        sets.append(("recorded", f"{w}x{h}", frames))
+    else:
+        for name in args.resolutions.split(","):
+            sets.append(("synthetic", name, synthetic_set(*RESOLUTIONS[name])))
+
+    detectors = {"haar": (haar_detector(), "bgr")}
+    try:
+        import mediapipe as mp
+        fd = mp.solutions.face_detection.FaceDetection(min_detection_confidence=0.5)
+        detectors["mediapipe"] = (mediapipe_detector(fd, "rgb"), "rgb")
+    except ImportError:
+        print("MediaPipe não instalado: caminho do emotion_server.py ignorado")
+
+    classify = load_classifier() if "stages" in paths else None
+    results = {
+        "environment": environment_info(),
+        "config": vars(args),
+        "cases": [],
+    }
+
+    for source, resolution, frames in sets:
+        if "stages" in paths:
+            for det_name, (detector, color) in detectors.items():
+                for n_faces in face_counts:
+                    stages, cpu, alloc = bench_stages(frames, detector, color, n_faces, classify, args.iterations)
+                    case = make_case(source, resolution, n_faces, f"stages:{det_name}", stages, cpu, alloc)
+                    results["cases"].append(case)
+                    print_case(case)
+        if "analyze" in paths:
+            stages, cpu = bench_analyze(frames, args.iterations)
+            case = make_case(source, resolution, None, "analyze_emotions", stages, cpu)
+            results["cases"].append(case)
+            print_case(case)
+        if "websocket" in paths:
+            stages, cpu = bench_websocket(frames, args.iterations)
+            case = make_case(source, resolution, None, "ws/analyze", stages, cpu)
+            results["cases"].append(case)
+            print_case(case)
+
+    save_results(args.output, results)
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
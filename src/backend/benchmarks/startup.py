@@ -0,0 +1,130 @@
+"""Tempo de subida e RSS base do main.py, com e sem a pilha de ML.
+
+  lazy   o que o main.py faz hoje: importa só FastAPI, banco e autenticação;
+         OpenCV, TextBlob e DeepFace/TensorFlow ficam para a primeira rota
+         de inferência
+  eager  o comportamento antigo: além do main, importa a pilha de visão e de
+         texto e carrega o modelo de emoções antes de atender
+
+Cada execução roda em um processo novo. Mede o tempo de import e o RSS logo
+depois e, com --serve, sobe o uvicorn e mede o tempo até o /health responder
+e o RSS do servidor pronto para atender /login/.
+
+    python benchmarks/startup.py --runs 5 --serve --output startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from _common import BACKEND_DIR, environment_info, save_results
+
+EAGER_IMPORTS = "import inference, text_analysis; inference.warm_up(); "
+
+IMPORT_SNIPPET = """
+import json, resource, sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+heavy = [m for m in ("cv2", "numpy", "textblob", "nltk", "deepface", "tensorflow") if m in sys.modules]
+print(json.dumps({{
+    "import_s": elapsed,
+    "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": heavy,
+}}))
+"""
+
+SERVE_SNIPPET = """
+{imports}
+import uvicorn
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+def imports_for(mode):
+    return "import main; " + (EAGER_IMPORTS if mode == "eager" else "")
+
+
+def run_import(mode):
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(imports=imports_for(mode))],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+    )
+    # O warm_up imprime mensagens; o resultado é a última linha
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def rss_of(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+def run_serve(mode, port, timeout=180.0):
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-c", SERVE_SNIPPET.format(imports=imports_for(mode), port=port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+                return {"ready_s": time.perf_counter() - start, "server_rss_mb": rss_of(proc.pid)}
+            except Exception:
+                time.sleep(0.05)
+        raise SystemExit(f"Servidor ({mode}) não respondeu em {timeout:.0f} s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", default="lazy,eager")
+    parser.add_argument("--serve", action="store_true", help="também mede a subida do uvicorn até o /health")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes.split(","):
+        imports = [run_import(mode) for _ in range(args.runs)]
+        summary = {
+            "import_s": median(r["import_s"] for r in imports),
+            "rss_mb": median(r["rss_mb"] for r in imports),
+            "heavy_modules": imports[-1]["heavy_modules"],
+        }
+        if args.serve:
+            serves = [run_serve(mode, args.port) for _ in range(args.runs)]
+            summary["ready_s"] = median(r["ready_s"] for r in serves)
+            summary["server_rss_mb"] = median(r["server_rss_mb"] for r in serves)
+        results[mode] = summary
+        ready = f"  pronto em {summary['ready_s']:.2f} s  RSS servidor {summary['server_rss_mb']} MB" if args.serve else ""
+        print(f"{mode:<6} import {summary['import_s']:.2f} s  RSS {summary['rss_mb']} MB{ready}  "
+              f"módulos pesados: {', '.join(summary['heavy_modules']) or 'nenhum'}")
+
+    save_results(args.output, {"environment": environment_info(), "config": vars(args), "modes": results})
+
+
+if __name__ == "__main__":
+    main()
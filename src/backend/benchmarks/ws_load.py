@@ -0,0 +1,251 @@
+"""Gerador de carga para /ws/analyze e curva de capacidade do backend.
+
+Abre N conexões simultâneas e envia frames JPEG no ritmo do Dashboard
+(3 FPS por padrão, como o loop de canvas do frontend), medindo a latência
+fim a fim de cada resultado, frames perdidos e a CPU do servidor. Repete
+para cada quantidade de sessões e gera a curva sessões x p50/p99.
+
+    # sobe um servidor local e mede 1, 5, 10 e 25 sessões por 20 s cada
+    python benchmarks/ws_load.py --spawn-server --sessions 1,5,10,25 --duration 20
+
+    # contra um servidor já rodando (informe o PID para medir a CPU)
+    python benchmarks/ws_load.py --url ws://localhost:8000/ws/analyze --server-pid 1234
+
+Todas as sessões saem do mesmo IP e sem token (fora do limite por usuário);
+com --spawn-server os limites de conexões (WS_MAX_PER_USER e
+WS_MAX_CONNECTIONS) são elevados para o maior nível pedido, a não ser que já
+estejam definidos no ambiente. Contra um servidor externo,
+ajuste os limites dele: conexões recusadas (1008/1013) aparecem em "rejected"
+e não entram na latência nem na perda.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import subprocess
+import sys
+import time
+
+from _common import BACKEND_DIR, environment_info, percentile, save_results, synthetic_jpeg
+
+import websockets
+
+from ws_protocol import decode_result
+
+# Fechamentos logo após o accept quando o servidor recusa a conexão
+# (limite por usuário ou token inválido, e servidor cheio)
+REJECT_CODES = (1008, 1013)
+
+
+class SessionStats:
+    def __init__(self):
+        self.sent = 0
+        self.received = 0
+        self.skipped = 0
+        # Frames que o servidor pulou por estar degradado (overload.py)
+        self.degraded = 0
+        self.errors = 0
+        self.rejected = False
+        self.latencies = []
+
+
+async def run_session(url, frames, fps, duration, max_in_flight, stats, binary):
+    interval = 1.0 / fps
+    pending = collections.deque()
+    deadline = time.perf_counter() + duration
+
+    try:
+        async with websockets.connect(url, max_size=None) as ws:
+            async def reader():
+                async for message in ws:
+                    if isinstance(message, bytes) and binary:
+                        decode_result(message)
+                    else:
+                        data = json.loads(message)
+                        if data.get("type") == "error":
+                            stats.errors += 1
+                        elif data.get("type") == "skipped":
+                            if pending:
+                                pending.popleft()
+                                stats.degraded += 1
+                            continue
+                        elif data.get("type") != "analysis_result":
+                            continue  # ping e outras mensagens de controle
+                    if pending:
+                        stats.latencies.append(time.perf_counter() - pending.popleft())
+                        stats.received += 1
+
+            reader_task = asyncio.create_task(reader())
+            next_send = time.perf_counter()
+            i = 0
+            while time.perf_counter() < deadline:
+                if reader_task.done():
+                    reader_task.result()  # propaga o fechamento pelo servidor
+                    break
+                # Como o canvas do navegador: manda no ritmo fixo, mas não acumula
+                # mais que max_in_flight frames sem resposta
+                if len(pending) >= max_in_flight:
+                    stats.skipped += 1
+                else:
+                    pending.append(time.perf_counter())
+                    await ws.send(frames[i % len(frames)])
+                    stats.sent += 1
+                    i += 1
+                next_send += interval
+                await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+
+            # Tempo de tolerância para os últimos resultados chegarem
+            grace_end = time.perf_counter() + 5.0
+            while pending and time.perf_counter() < grace_end:
+                await asyncio.sleep(0.05)
+            reader_task.cancel()
+    except websockets.exceptions.ConnectionClosed as e:
+        if e.rcvd is not None and e.rcvd.code in REJECT_CODES and not stats.received:
+            stats.rejected = True
+        else:
+            print(f"Sessão encerrada pelo servidor: {e}")
+            stats.errors += 1
+    except Exception as e:
+        print(f"Sessão encerrada com erro: {e}")
+        stats.errors += 1
+
+
+async def sample_cpu(pid, stop, samples):
+    try:
+        import psutil
+    except ImportError:
+        print("psutil não instalado: CPU do servidor não será medida")
+        return
+    proc = psutil.Process(pid)
+    children = proc.children(recursive=True)
+    procs = [proc] + children
+    for p in procs:
+        p.cpu_percent(None)
+    while not stop.is_set():
+        await asyncio.sleep(1.0)
+        samples.append(sum(p.cpu_percent(None) for p in procs if p.is_running()))
+
+
+async def run_level(url, sessions, frames, args):
+    stats = [SessionStats() for _ in range(sessions)]
+    cpu_samples = []
+    stop = asyncio.Event()
+    cpu_task = asyncio.create_task(sample_cpu(args.server_pid, stop, cpu_samples)) if args.server_pid else None
+
+    # Conexões entram escalonadas ao longo de 1 s, como abas abrindo em momentos diferentes
+    async def delayed(i, s):
+        await asyncio.sleep(i / max(1, sessions))
+        await run_session(url, frames, args.fps, args.duration, args.max_in_flight, s, args.format == "binary")
+
+    await asyncio.gather(*(delayed(i, s) for i, s in enumerate(stats)))
+    stop.set()
+    if cpu_task:
+        await cpu_task
+
+    rejected = sum(s.rejected for s in stats)
+    # Sessões recusadas não mediram nada: ficam fora da latência e da perda
+    stats = [s for s in stats if not s.rejected]
+    latencies = [lat for s in stats for lat in s.latencies]
+    sent = sum(s.sent for s in stats)
+    received = sum(s.received for s in stats)
+    skipped = sum(s.skipped for s in stats)
+    degraded = sum(s.degraded for s in stats)
+    return {
+        "sessions": sessions,
+        "accepted": sessions - rejected,
+        "rejected": rejected,
+        "sent": sent,
+        "received": received,
+        "dropped": sent - received - degraded,
+        "skipped_degraded": degraded,
+        "skipped_backpressure": skipped,
+        "drop_rate": round((sent - received - degraded + skipped) / max(1, sent + skipped), 4),
+        "errors": sum(s.errors for s in stats),
+        "throughput_fps": round(received / args.duration, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "server_cpu_percent": round(sum(cpu_samples) / len(cpu_samples), 1) if cpu_samples else None,
+    }
+
+
+def spawn_server(port, max_sessions):
+    # Os limites do servidor acompanham o maior nível pedido: acima deles a
+    # curva mediria recusas, não capacidade
+    env = dict(os.environ)
+    env.setdefault("WS_MAX_PER_USER", str(max_sessions))
+    env.setdefault("WS_MAX_CONNECTIONS", str(max_sessions))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--ws", "websockets", "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    # Espera o /health responder
+    import urllib.request
+    for _ in range(120):
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1)
+            return proc
+        except Exception:
+            time.sleep(0.5)
+    proc.terminate()
+    raise SystemExit("Servidor não subiu a tempo")
+
+
+async def main_async(args):
+    frames = [synthetic_jpeg(args.width, args.height, quality=70, seed=i) for i in range(8)]
+    if args.frames_dir:
+        frames = [
+            open(os.path.join(args.frames_dir, n), "rb").read()
+            for n in sorted(os.listdir(args.frames_dir)) if n.lower().endswith((".jpg", ".jpeg"))
+        ] or frames
+
+    url = args.url
+    if args.format == "binary":
+        url += ("&" if "?" in url else "?") + "format=binary"
+
+    curve = []
+    for sessions in (int(v) for v in args.sessions.split(",")):
+        level = await run_level(url, sessions, frames, args)
+        curve.append(level)
+        print(f"{sessions:4d} sessões  p50 {level['p50_ms']:8.1f} ms  p99 {level['p99_ms']:8.1f} ms  "
+              f"{level['throughput_fps']:7.1f} fps  perda {level['drop_rate'] * 100:5.1f}%  "
+              f"recusadas {level['rejected']:3d}  CPU {level['server_cpu_percent']}%")
+    return curve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/analyze")
+    parser.add_argument("--sessions", default="1,5,10,25,50")
+    parser.add_argument("--duration", type=float, default=20.0, help="segundos por nível de carga")
+    parser.add_argument("--fps", type=float, default=3.0)
+    parser.add_argument("--max-in-flight", type=int, default=3)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--frames-dir", help="pasta com JPEGs reais para enviar")
+    parser.add_argument("--format", choices=["json", "binary"], default="json")
+    parser.add_argument("--server-pid", type=int, help="PID do servidor para medir CPU")
+    parser.add_argument("--spawn-server", action="store_true", help="sobe 'uvicorn main:app' localmente")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", help="arquivo JSON de saída")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn_server:
+        server = spawn_server(args.port, max(int(v) for v in args.sessions.split(",")))
+        args.server_pid = server.pid
+        args.url = f"ws://127.0.0.1:{args.port}/ws/analyze"
+
+    try:
+        curve = asyncio.run(main_async(args))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+
+    save_results(args.output, {"environment": environment_info(), "config": vars(args), "curve": curve})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+from metrics import WEBSOCKET_BYTES, WEBSOCKET_CLOSED, WEBSOCKET_SESSIONS
+from responses import dumps
+from state_backend import WORKER_ID, StateError, StateBackend, get_state
+
+# Registro das conexões WebSocket abertas: usuário, última atividade e bytes
+# trafegados de cada socket, heartbeat num único timer para todas as conexões
+# e fechamento de sockets ociosos ou meio abertos (aba abandonada, rede caída).
+
+# Intervalo do timer compartilhado; conexões sem envio nesse tempo recebem um ping
+WS_HEARTBEAT_SECONDS = float(os.getenv("WS_HEARTBEAT_SECONDS", "10"))
+# Sem nada recebido do cliente (frame ou pong) nesse tempo, a conexão é fechada
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "60"))
+# Envio que não completa nesse tempo indica socket meio aberto
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "5"))
+# Limites de conexões simultâneas. O limite por usuário vale só para quem se
+# autentica (?token=): sem token, o único identificador é o IP, que várias
+# pessoas atrás do mesmo NAT ou proxy compartilham, e vale só o limite total
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "200"))
+WS_MAX_PER_USER = int(os.getenv("WS_MAX_PER_USER", "3"))
+
+# Com estado compartilhado (STATE_BACKEND != memory), cada worker publica
+# quantas conexões tem por usuário neste hash; o limite por usuário soma os
+# workers vivos (snapshot renovado a cada heartbeat)
+WORKERS_KEY = "ws:workers"
+
+# Códigos de fechamento (RFC 6455)
+CLOSE_GOING_AWAY = 1001
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_TRY_AGAIN_LATER = 1013
+
+
+def _is_pong(text: str) -> bool:
+    # Resposta do Dashboard ao ping: {"type": "pong"}
+    if len(text) > 64 or not text.startswith("{"):
+        return False
+    try:
+        return json.loads(text).get("type") == "pong"
+    except (ValueError, AttributeError):
+        return False
+
+
+class Connection:
+    __slots__ = ("websocket", "endpoint", "user", "idle_timeout", "connected_at", "last_received",
+                 "last_sent", "bytes_in", "bytes_out", "_closed", "close_reason")
+
+    def __init__(self, websocket: WebSocket, endpoint: str, user: str, idle_timeout: float):
+        now = time.monotonic()
+        self.websocket = websocket
+        self.endpoint = endpoint
+        self.user = user
+        self.idle_timeout = idle_timeout
+        self.connected_at = now
+        self.last_received = now
+        self.last_sent = now
+        self.bytes_in = 0
+        self.bytes_out = 0
+        # Sinalizado pelo registro ao fechar a conexão; desbloqueia o receive()
+        self._closed = asyncio.Event()
+        self.close_reason = None
+
+    @property
+    def closed(self) -> bool:
+        return self._closed.is_set()
+
+    async def receive(self, timeout: Optional[float] = None) -> dict:
+        # Próxima mensagem de dados do cliente. Pongs só contam como atividade.
+        # Levanta WebSocketDisconnect quando o cliente ou o registro fecha a
+        # conexão e asyncio.TimeoutError quando nada chega em `timeout`
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise asyncio.TimeoutError()
+            receive = asyncio.ensure_future(self.websocket.receive())
+            closed = asyncio.ensure_future(self._closed.wait())
+            done, _ = await asyncio.wait({receive, closed}, timeout=remaining,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            closed.cancel()
+            if receive not in done:
+                receive.cancel()
+                if self.closed:
+                    raise WebSocketDisconnect(CLOSE_GOING_AWAY, self.close_reason)
+                raise asyncio.TimeoutError()
+
+            message = receive.result()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            self.last_received = time.monotonic()
+            data = message.get("bytes")
+            if data is not None:
+                self._count_in(len(data))
+                return message
+            text = message.get("text") or ""
+            self._count_in(len(text))
+            if _is_pong(text):
+                continue
+            return message
+
+    async def receive_bytes(self, timeout: Optional[float] = None) -> bytes:
+        message = await self.receive(timeout)
+        if message.get("bytes") is None:
+            raise ValueError("Esperado frame binário")
+        return message["bytes"]
+
+    async def receive_json(self, timeout: Optional[float] = None):
+        message = await self.receive(timeout)
+        return json.loads(message.get("text") or message.get("bytes"))
+
+    def _count_in(self, size: int):
+        self.bytes_in += size
+        WEBSOCKET_BYTES.labels(endpoint=self.endpoint, direction="in").inc(size)
+
+    def _count_out(self, size: int):
+        self.last_sent = time.monotonic()
+        self.bytes_out += size
+        WEBSOCKET_BYTES.labels(endpoint=self.endpoint, direction="out").inc(size)
+
+    async def send_text(self, data: str):
+        await self.websocket.send_text(data)
+        self._count_out(len(data))
+
+    async def send_bytes(self, data: bytes):
+        await self.websocket.send_bytes(data)
+        self._count_out(len(data))
+
+    async def send_json(self, data):
+        await self.send_text(dumps(data).decode("utf-8"))
+
+    def info(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "endpoint": self.endpoint,
+            "user": self.user,
+            "connected_seconds": round(now - self.connected_at, 1),
+            "idle_seconds": round(now - self.last_received, 1),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
+
+
+class ConnectionRegistry:
+    """Conexões WebSocket abertas, com limites por usuário e no total.
+
+    connect() aceita o socket e devolve a Connection, ou None quando um
+    limite foi atingido (o socket já sai fechado com o motivo). Um único
+    timer envia pings às conexões sem tráfego de saída e fecha as que
+    passaram do tempo ocioso ou não conseguem receber.
+    """
+
+    def __init__(self, max_connections: int = WS_MAX_CONNECTIONS, max_per_user: int = WS_MAX_PER_USER,
+                 heartbeat: float = WS_HEARTBEAT_SECONDS, idle_timeout: float = WS_IDLE_TIMEOUT,
+                 send_timeout: float = WS_SEND_TIMEOUT, state: Optional[StateBackend] = None):
+        self.max_connections = max_connections
+        self.max_per_user = max_per_user
+        self.heartbeat = heartbeat
+        self.idle_timeout = idle_timeout
+        self.send_timeout = send_timeout
+        self.connections: List[Connection] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._state = state
+
+    @property
+    def state(self) -> StateBackend:
+        if self._state is None:
+            self._state = get_state()
+        return self._state
+
+    @property
+    def shared(self) -> bool:
+        return self.state.name != "memory"
+
+    def count(self, user: Optional[str] = None) -> int:
+        if user is None:
+            return len(self.connections)
+        return sum(1 for c in self.connections if c.user == user)
+
+    async def connect(self, websocket: WebSocket, endpoint: str, user: str,
+                      subprotocol: Optional[str] = None,
+                      idle_timeout: Optional[float] = None) -> Optional[Connection]:
+        await websocket.accept(subprotocol=subprotocol)
+        authenticated = user.startswith("user:")
+        remote = 0
+        if self.shared and authenticated:
+            _, users = await asyncio.to_thread(self._remote_users)
+            remote = users.get(user, 0)
+        # Checagem e registro sem await no meio: o event loop não intercala outra conexão
+        if len(self.connections) >= self.max_connections:
+            reason, code = "Servidor com o máximo de conexões", CLOSE_TRY_AGAIN_LATER
+        elif authenticated and self.count(user) + remote >= self.max_per_user:
+            reason, code = f"Máximo de {self.max_per_user} conexões por usuário", CLOSE_POLICY_VIOLATION
+        else:
+            conn = Connection(websocket, endpoint, user, idle_timeout or self.idle_timeout)
+            self.connections.append(conn)
+            WEBSOCKET_SESSIONS.labels(endpoint=endpoint).inc()
+            self._ensure_timer()
+            self._publish_snapshot()
+            return conn
+        WEBSOCKET_CLOSED.labels(endpoint=endpoint, reason="rejected").inc()
+        await websocket.close(code=code, reason=reason)
+        return None
+
+    def disconnect(self, conn: Connection):
+        if conn in self.connections:
+            self.connections.remove(conn)
+            WEBSOCKET_SESSIONS.labels(endpoint=conn.endpoint).dec()
+            self._publish_snapshot()
+
+    def _publish_snapshot(self):
+        # Montado no event loop, gravado numa thread sem esperar
+        if not self.shared:
+            return
+        users: Dict[str, int] = {}
+        for c in self.connections:
+            users[c.user] = users.get(c.user, 0) + 1
+        snapshot = json.dumps({"at": time.time(), "users": users}, separators=(",", ":"))
+        asyncio.get_running_loop().run_in_executor(None, self._write_snapshot, snapshot)
+
+    def _write_snapshot(self, snapshot: str):
+        try:
+            self.state.hset(WORKERS_KEY, {WORKER_ID: snapshot})
+        except StateError as e:
+            print(f"Erro ao publicar conexões no estado compartilhado: {str(e)}")
+
+    def _remote_users(self) -> Tuple[int, Dict[str, int]]:
+        # Workers vivos (fora este) e a soma das conexões deles por usuário.
+        # Com o estado compartilhado fora do ar o limite vale só para este worker
+        try:
+            entries = self.state.hgetall(WORKERS_KEY)
+        except StateError as e:
+            print(f"Erro ao ler conexões do estado compartilhado: {str(e)}")
+            return 0, {}
+        now = time.time()
+        workers, users, stale = 0, {}, []
+        for worker, raw in entries.items():
+            if worker == WORKER_ID:
+                continue
+            snapshot = json.loads(raw)
+            if now - snapshot["at"] > self.heartbeat * 3:
+                stale.append(worker)
+                continue
+            workers += 1
+            for user, n in snapshot["users"].items():
+                users[user] = users.get(user, 0) + n
+        if stale:
+            try:
+                self.state.hdel(WORKERS_KEY, *stale)
+            except StateError:
+                pass
+        return workers, users
+
+    async def close(self, conn: Connection, code: int, reason: str, label: str):
+        # Fecha pelo lado do servidor; o handler da conexão sai do receive()
+        if conn.closed:
+            return
+        conn.close_reason = reason
+        conn._closed.set()
+        WEBSOCKET_CLOSED.labels(endpoint=conn.endpoint, reason=label).inc()
+        self.disconnect(conn)
+        if conn.websocket.application_state != WebSocketState.DISCONNECTED:
+            try:
+                await asyncio.wait_for(conn.websocket.close(code=code, reason=reason), self.send_timeout)
+            except Exception:
+                pass
+
+    def _ensure_timer(self):
+        if self._timer is None or self._timer.done():
+            self._timer = asyncio.get_running_loop().create_task(self._run_timer())
+
+    async def _run_timer(self):
+        # Encerra sozinho quando não há conexões; o próximo connect() religa
+        while self.connections:
+            await asyncio.sleep(self.heartbeat)
+            await self.sweep()
+
+    async def sweep(self):
+        now = time.monotonic()
+        pings = []
+        for conn in list(self.connections):
+            if now - conn.last_received > conn.idle_timeout:
+                print(f"Fechando WebSocket ocioso ({conn.endpoint}, {conn.user})")
+                await self.close(conn, CLOSE_GOING_AWAY, "Conexão ociosa", "idle")
+            elif now - conn.last_sent >= self.heartbeat:
+                pings.append(conn)
+        if pings:
+            await asyncio.gather(*(self._ping(conn) for conn in pings))
+        # Renova o snapshot deste worker antes que os outros o considerem morto
+        self._publish_snapshot()
+
+    async def _ping(self, conn: Connection):
+        try:
+            await asyncio.wait_for(conn.send_json({"type": "ping"}), self.send_timeout)
+        except Exception:
+            # Envio travado ou com erro: o outro lado não está mais lá
+            await self.close(conn, CLOSE_GOING_AWAY, "Conexão sem resposta", "unresponsive")
+
+    def stats(self) -> Dict:
+        stats = {
+            "connections": len(self.connections),
+            "max_connections": self.max_connections,
+            "max_per_user": self.max_per_user,
+            "users": len({c.user for c in self.connections}),
+            "details": [c.info() for c in self.connections]
+        }
+        if self.shared:
+            workers, users = self._remote_users()
+            stats["cluster"] = {
+                "workers": workers + 1,
+                "connections": len(self.connections) + sum(users.values()),
+                "users": len(set(users) | {c.user for c in self.connections})
+            }
+        return stats
+
+
+registry = ConnectionRegistry()
@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+from psycopg2.extensions import connection as _PgConnection
+from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+
+from metrics import DB_POOL_CONNECTIONS, DB_QUERY_SECONDS, current_scope, route_label
+from tracing import record
+
+# Conexões ociosas mantidas no pool e limite de conexões abertas
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "20"))
+
+
+class InstrumentedCursor(RealDictCursor):
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - start
+            DB_QUERY_SECONDS.labels(route=route_label(current_scope.get())).observe(elapsed)
+            record("db", elapsed)
+
+
+class PooledConnection(_PgConnection):
+    # close() devolve a conexão ao pool em vez de fechá-la, então as rotas
+    # continuam usando o padrão conn.close() no finally
+    _pool = None
+
+    def close(self):
+        pool = self._pool
+        if pool is not None and not self.closed:
+            self._pool = None
+            DB_POOL_CONNECTIONS.labels(state="in_use").dec()
+            # O pool faz rollback de transações abertas e fecha o excedente
+            pool.putconn(self)
+            return
+        if not self.closed:
+            super().close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadedConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadedConnectionPool(
+                    DB_POOL_MIN,
+                    DB_POOL_MAX,
+                    host=os.getenv("DB_HOST"),
+                    database=os.getenv("DB_NAME"),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    connection_factory=PooledConnection,
+                    cursor_factory=InstrumentedCursor
+                )
+                DB_POOL_CONNECTIONS.labels(state="open").set_function(lambda: len(_pool._used) + len(_pool._pool))
+                DB_POOL_CONNECTIONS.labels(state="max").set(DB_POOL_MAX)
+    return _pool
+
+
+def get_db_connection():
+    try:
+        conn = _get_pool().getconn()
+        conn._pool = _pool
+        DB_POOL_CONNECTIONS.labels(state="in_use").inc()
+        return conn
+    except Exception as e:
+        print("Erro ao conectar ao banco de dados:", e)
+        raise
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
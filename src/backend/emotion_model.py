@@ -0,0 +1,210 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Ordem das saídas do modelo de emoções do DeepFace
+EMOTION_LABELS = ["angry", "disgust", "fear", "happy", "sad", "surprise", "neutral"]
+
+# Mapeamento de emoções para português (consistente com o frontend)
+EMOTION_TRANSLATION = {
+    "happy": "felicidade",
+    "sad": "tristeza",
+    "angry": "raiva",
+    "fear": "estresse",
+    "disgust": "nojo",
+    "surprise": "surpresa",
+    "neutral": "neutro"
+}
+
+# Nome em inglês (Dashboard) ou em português, em qualquer caixa -> rótulo em português
+_EMOTION_NAMES = {**EMOTION_TRANSLATION, **{v: v for v in EMOTION_TRANSLATION.values()}}
+
+
+def canonical_emotion(name: str) -> Optional[str]:
+    return _EMOTION_NAMES.get(name.strip().lower())
+
+# Backend do classificador: "deepface" (Keras/TensorFlow, float32), "onnx"
+# (ONNX Runtime) ou "tflite", os dois últimos com o modelo exportado por
+# tools/export_emotion_model.py (float16 ou int8)
+EMOTION_BACKEND = os.getenv("EMOTION_BACKEND", "deepface").lower()
+EMOTION_MODEL_PATH = os.getenv("EMOTION_MODEL_PATH", "")
+# Modelo leve opcional para o nível mais alto de degradação (overload.py);
+# sem ele, nesse nível os frames passam só pela detecção
+EMOTION_LIGHT_BACKEND = os.getenv("EMOTION_LIGHT_BACKEND", "").lower()
+EMOTION_LIGHT_MODEL_PATH = os.getenv("EMOTION_LIGHT_MODEL_PATH", "")
+# Threads do runtime por processo (0 = padrão do runtime)
+EMOTION_MODEL_THREADS = int(os.getenv("EMOTION_MODEL_THREADS", "0"))
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_emotion_model():
+    # Carrega o modelo Keras do DeepFace uma única vez, sob demanda
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from deepface import DeepFace
+                try:
+                    client = DeepFace.build_model(model_name="Emotion", task="facial_attribute")
+                except TypeError:
+                    # Versões antigas do DeepFace não têm o parâmetro task
+                    client = DeepFace.build_model("Emotion")
+                # Versões novas embrulham o modelo Keras em um cliente
+                _model = getattr(client, "model", client)
+    return _model
+
+
+class EmotionClassifier(ABC):
+    """Interface dos backends: predict recebe (N, 48, 48, 1) float32 em [0, 1]
+    e devolve (N, 7) probabilidades na ordem de EMOTION_LABELS."""
+
+    name = "base"
+
+    @abstractmethod
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        ...
+
+
+class DeepFaceClassifier(EmotionClassifier):
+    name = "deepface"
+
+    def __init__(self):
+        self.model = get_emotion_model()
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        # Chamar o modelo diretamente evita o overhead do predict() em lotes pequenos
+        return np.asarray(self.model(batch, training=False), dtype=np.float32)
+
+
+class OnnxClassifier(EmotionClassifier):
+    name = "onnx"
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        import onnxruntime as ort
+        threads = EMOTION_MODEL_THREADS if threads is None else threads
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        # Modelos float16 exportados sem keep_io_types esperam entrada float16
+        self.input_dtype = np.float16 if model_input.type == "tensor(float16)" else np.float32
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        outputs = self.session.run(None, {self.input_name: batch.astype(self.input_dtype, copy=False)})
+        return np.asarray(outputs[0], dtype=np.float32)
+
+
+class TFLiteClassifier(EmotionClassifier):
+    name = "tflite"
+
+    def __init__(self, path: str, threads: Optional[int] = None):
+        threads = EMOTION_MODEL_THREADS if threads is None else threads
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.interpreter = Interpreter(model_path=path, num_threads=threads or None)
+        self.interpreter.allocate_tensors()
+        self.input = self.interpreter.get_input_details()[0]
+        self.output = self.interpreter.get_output_details()[0]
+        self._batch = None
+
+    def _resize(self, n: int):
+        if self._batch != n:
+            self.interpreter.resize_tensor_input(self.input["index"], [n, *self.input["shape"][1:]])
+            self.interpreter.allocate_tensors()
+            self.input = self.interpreter.get_input_details()[0]
+            self.output = self.interpreter.get_output_details()[0]
+            self._batch = n
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        self._resize(len(batch))
+        dtype = self.input["dtype"]
+        scale, zero_point = self.input["quantization"]
+        if dtype in (np.int8, np.uint8) and scale:
+            # Modelo int8 completo: quantiza a entrada com os parâmetros do próprio modelo
+            batch = np.clip(np.round(batch / scale + zero_point), np.iinfo(dtype).min, np.iinfo(dtype).max)
+        self.interpreter.set_tensor(self.input["index"], batch.astype(dtype, copy=False))
+        self.interpreter.invoke()
+        probs = self.interpreter.get_tensor(self.output["index"])
+        scale, zero_point = self.output["quantization"]
+        if probs.dtype in (np.int8, np.uint8) and scale:
+            probs = (probs.astype(np.float32) - zero_point) * scale
+        return np.asarray(probs, dtype=np.float32)
+
+
+def load_classifier(backend: str = EMOTION_BACKEND, path: str = EMOTION_MODEL_PATH,
+                    threads: Optional[int] = None) -> EmotionClassifier:
+    if backend == "deepface":
+        return DeepFaceClassifier()
+    if not path:
+        raise ValueError(f"EMOTION_MODEL_PATH é obrigatório para o backend '{backend}'")
+    if backend == "onnx":
+        return OnnxClassifier(path, threads)
+    if backend == "tflite":
+        return TFLiteClassifier(path, threads)
+    raise ValueError(f"Backend de emoções desconhecido: {backend}")
+
+
+_classifier = None
+# Lock próprio: load_classifier("deepface") passa pelo _model_lock do get_emotion_model
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> EmotionClassifier:
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = load_classifier()
+    return _classifier
+
+
+_light_classifier = None
+
+
+def get_light_classifier() -> Optional[EmotionClassifier]:
+    global _light_classifier
+    if not EMOTION_LIGHT_BACKEND:
+        return None
+    if _light_classifier is None:
+        with _classifier_lock:
+            if _light_classifier is None:
+                _light_classifier = load_classifier(EMOTION_LIGHT_BACKEND, EMOTION_LIGHT_MODEL_PATH)
+    return _light_classifier
+
+
+def faces_to_batch(faces: np.ndarray) -> np.ndarray:
+    # (N, 48, 48) uint8 -> (N, 48, 48, 1) float32 em [0, 1], a entrada de todos os backends
+    batch = faces.astype(np.float32)[..., np.newaxis]
+    batch /= 255.0
+    return batch
+
+
+def classify_faces(faces: np.ndarray, classifier: Optional[EmotionClassifier] = None) -> np.ndarray:
+    # faces: (N, 48, 48) uint8 em tons de cinza -> (N, 7) em porcentagem
+    if len(faces) == 0:
+        return np.empty((0, len(EMOTION_LABELS)), dtype=np.float32)
+    probs = (classifier or get_classifier()).predict(faces_to_batch(faces))
+    return probs * 100.0
+
+
+def emotions_dict(scores: np.ndarray) -> Dict[str, float]:
+    return {label: float(score) for label, score in zip(EMOTION_LABELS, scores)}
+
+
+def dominant_emotion(scores: np.ndarray) -> str:
+    return EMOTION_LABELS[int(np.argmax(scores))]
+
+
+def dominant_emotions(scores: np.ndarray) -> List[str]:
+    return [EMOTION_LABELS[i] for i in np.argmax(scores, axis=1)]
@@ -1,21 +1,36 @@
-from fastapi import FastAPI, UploadFile, File
+from fastapi import Depends, FastAPI, UploadFile, File, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
 import cv2
 import mediapipe as mp
-from deepface import DeepFace
-from io import BytesIO
 import numpy as np
-from PIL import Image
 import asyncio
+import contextvars
+import os
 import threading
 import time
 import json
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from fastapi.responses import JSONResponse
 from threading import Lock
+from frame_decoder import FrameDecoder
+from preprocessing import mediapipe_detector
+from pipeline import analyze_faces
+from inference_pool import create_pool
+from emotion_model import EMOTION_TRANSLATION
+from metrics import (CONTENT_TYPE, CONTINUOUS_ANALYSIS_ACTIVE, INFERENCE_QUEUE_DEPTH, MetricsMiddleware,
+                     render_latest)
+from tracing import TracingMiddleware, log_if_slow, traced
+from overload import controller as overload
+from scene_gate import SceneChangeGate, luminance_thumbnail
+from responses import CompressionMiddleware, FastJSONResponse
+from state_backend import WORKER_ID, StateError, get_state
+import maintenance
+import profiling
 
 # Configuração do lock para thread safety
 emotion_lock = Lock()
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Configuração CORS para o frontend React
 app.add_middleware(
@@ -25,22 +40,25 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.include_router(profiling.router)
+
+@app.exception_handler(StateError)
+async def state_unavailable(request, exc):
+    # Servidor de estado lento ou fora do ar: erro temporário, não falha da rota
+    print(f"Erro no estado compartilhado em {request.url.path}: {str(exc)}")
+    return JSONResponse(status_code=503, content={"message": "Estado compartilhado indisponível, tente novamente"})
 
 # Inicialização do MediaPipe para detecção facial
 mp_face_detection = mp.solutions.face_detection
 face_detector = mp_face_detection.FaceDetection(min_detection_confidence=0.5)
 drawing = mp.solutions.drawing_utils
 
-# Mapeamento de emoções para português (consistente com o frontend)
-EMOTION_TRANSLATION = {
-    "happy": "felicidade",
-    "sad": "tristeza",
-    "angry": "raiva",
-    "fear": "estresse",
-    "disgust": "nojo",
-    "surprise": "surpresa",
-    "neutral": "neutro"
-}
+# Detecção roda no frame reduzido; o recorte do rosto vem do frame em resolução cheia
+detect_rgb = mediapipe_detector(face_detector, "rgb")
+detect_bgr = mediapipe_detector(face_detector, "bgr")
 
 # Cores para cada emoção (BGR para OpenCV, consistente com o frontend)
 EMOTION_COLORS = {
@@ -53,69 +71,170 @@ EMOTION_COLORS = {
     "neutro": (200, 200, 200)        # Cinza
 }
 
-# Variáveis globais para análise contínua
-emotion_counts = {
-    "felicidade": 0,
-    "tristeza": 0,
-    "raiva": 0,
-    "estresse": 0,
-    "nojo": 0,
-    "surpresa": 0,
-    "neutro": 0
-}
+# Estado da análise contínua compartilhado entre workers (state_backend.py):
+# contagens, dono da câmera (lease), última atividade do frontend e o status
+# do último frame. Start, consultas e stop podem cair em workers diferentes;
+# só o worker com o lease abre a câmera
+state = get_state()
+COUNTS_KEY = "continuous:counts"
+OWNER_KEY = "continuous:owner"
+ACTIVITY_KEY = "continuous:activity"
+STATUS_KEY = "continuous:status"
+SCENE_CONFIG_KEY = "continuous:scene_config"
+CONTROL_CHANNEL = "continuous:control"
+# O lease expira sozinho se o worker da câmera cair; a thread de captura o renova
+CAMERA_LEASE_SECONDS = float(os.getenv("CAMERA_LEASE_SECONDS", "15"))
+
+# Estado local do worker que está com a câmera
 camera_thread = None
 stop_camera = False
-camera_active = False
+# Último resultado analisado: repetido nos frames em que a cena não mudou
+last_result = None
+scene_gate = SceneChangeGate("continuous")
+
+# Sessão contínua sem consulta do frontend por esse tempo (aba abandonada) é encerrada
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "900"))
+# Contagens de uma sessão encerrada são descartadas depois disso
+SESSION_RETENTION_SECONDS = float(os.getenv("SESSION_RETENTION_SECONDS", "3600"))
+
+# Por processo: 1 só no worker que está com a câmera
+CONTINUOUS_ANALYSIS_ACTIVE.set_function(lambda: 1 if camera_thread is not None and camera_thread.is_alive() else 0)
+
+def read_counts():
+    counts = {e: 0 for e in EMOTION_TRANSLATION.values()}
+    counts.update(state.counters(COUNTS_KEY))
+    return counts
+
+def camera_active() -> bool:
+    return state.get(OWNER_KEY) is not None
+
+def touch_session():
+    state.set(ACTIVITY_KEY, str(time.time()))
+
+def session_idle() -> float:
+    last = state.get(ACTIVITY_KEY)
+    return time.time() - float(last) if last else 0.0
+
+def apply_scene_config():
+    config = state.get_json(SCENE_CONFIG_KEY) or {}
+    scene_gate.configure(config.get("threshold"), config.get("max_interval"))
+
+def on_control(message):
+    # Mensagens para todos os workers; o stop só vale para o dono da câmera
+    global stop_camera
+    action = message.get("action")
+    if action == "stop" and message.get("owner") == WORKER_ID:
+        stop_camera = True
+    elif action == "scene":
+        apply_scene_config()
+
+state.subscribe(CONTROL_CHANNEL, on_control)
+
+# Pool de processos de inferência (INFERENCE_WORKERS > 0), criado no primeiro uso
+_pool = None
+_pool_lock = Lock()
+# Sem pool, as imagens do /analyze-emotion/ são analisadas uma de cada vez nesta thread
+_analysis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analise")
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = create_pool("mediapipe") or False
+    return _pool or None
+
+def expire_stale_session() -> int:
+    # Roda em todos os workers; um worker da câmera que caiu perde o lease pelo TTL
+    global last_result
+    with emotion_lock:
+        owner = state.get(OWNER_KEY)
+        idle = session_idle()
+        if owner == WORKER_ID and (camera_thread is None or not camera_thread.is_alive()):
+            # A thread da câmera morreu (falha ao abrir, erro) e o lease ficou preso
+            state.delete_if_equal(OWNER_KEY, owner)
+            print("Sessão contínua sem thread de câmera: marcada como parada")
+            return 1
+        if owner is not None and idle > SESSION_IDLE_SECONDS:
+            # Só libera o lease lido aqui: outro worker pode ter pegado a câmera nesse meio tempo
+            if not state.delete_if_equal(OWNER_KEY, owner):
+                return 0
+            state.publish(CONTROL_CHANNEL, {"action": "stop", "owner": owner})
+            print(f"Sessão contínua sem consultas há {idle:.0f} s: câmera liberada")
+            return 1
+        if owner is None and idle > SESSION_RETENTION_SECONDS and any(read_counts().values()):
+            state.delete(COUNTS_KEY)
+            state.delete(STATUS_KEY)
+            last_result = None
+            return 1
+    return 0
+
+maintenance.scheduler.add("continuous_session", 60, expire_stale_session)
+
+@app.on_event("startup")
+async def start_maintenance():
+    maintenance.scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_maintenance():
+    await maintenance.scheduler.stop()
+    state.close()
 
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", dependencies=[Depends(profiling.require_metrics_token)])
+async def metrics():
+    return Response(content=render_latest(), media_type=CONTENT_TYPE)
+
 @app.post("/analyze-emotion/")
-async def analyze_emotion(file: UploadFile = File(...)):
+async def analyze_emotion(response: Response, file: UploadFile = File(...)):
     try:
         # Ler a imagem enviada
+        received_at = time.perf_counter()
         img_bytes = await file.read()
-        img = Image.open(BytesIO(img_bytes))
-        frame = np.array(img)
-
-        # Converter para RGB (OpenCV usa BGR)
-        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Detectar rostos
-        results = face_detector.process(rgb_frame)
-        emotions = {}
-
-        if results.detections:
-            for detection in results.detections:
-                # Extrair coordenadas do rosto
-                bbox = detection.location_data.relative_bounding_box
-                h, w, _ = frame.shape
-                x, y, w_box, h_box = int(bbox.xmin * w), int(bbox.ymin * h), int(bbox.width * w), int(bbox.height * h)
-
-                # Cortar a região do rosto
-                if x >= 0 and y >= 0 and x + w_box <= w and y + h_box <= h:
-                    face_region = frame[y:y + h_box, x:x + w_box]
 
-                    try:
-                        # Analisar emoções com DeepFace
-                        analysis = DeepFace.analyze(face_region, actions=['emotion'], enforce_detection=False)
+        # Sob carga a imagem é reduzida mais e, no último nível, o modelo é trocado
+        level = overload.current()
+        response.headers["X-Degradation-Level"] = str(level.level)
 
-                        if isinstance(analysis, list):
-                            emotion = analysis[0]['dominant_emotion']
-                        else:
-                            emotion = analysis['dominant_emotion']
+        # Decodificar uma única vez, já em RGB (ordem que o MediaPipe espera), num
+        # buffer da requisição: o frame pode esperar na fila da análise
+        frame = FrameDecoder("rgb").decode(img_bytes, level.decode_max_side)
+        if frame is None:
+            return JSONResponse(
+                status_code=400,
+                content={"message": "Não foi possível decodificar a imagem"}
+            )
 
-                        # Traduzir para português
-                        emotion_pt = EMOTION_TRANSLATION.get(emotion, emotion)
-                        emotions[emotion_pt] = emotions.get(emotion_pt, 0) + 1
+        emotions = {}
+        try:
+            # Detecção no frame reduzido, recorte em resolução cheia e todos os
+            # rostos classificados em um único lote
+            pool = get_pool()
+            with INFERENCE_QUEUE_DEPTH.track_inprogress():
+                if pool is not None:
+                    result = await pool.analyze(frame, "rgb", None, level.detection_max_side, level.classifier)
+                else:
+                    # Fora do event loop: a espera na fila entra na latência medida
+                    # (copy_context leva os estágios para o trace da requisição)
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        _analysis_executor, contextvars.copy_context().run, analyze_faces, detect_rgb,
+                        frame, "rgb", None, level.detection_max_side, level.classifier
+                    )
+            overload.observe(time.perf_counter() - received_at)
+            for face in result["faces"]:
+                if face["dominant_emotion"] == "none":
+                    continue
+                # Traduzir para português
+                emotion_pt = EMOTION_TRANSLATION.get(face["dominant_emotion"], face["dominant_emotion"])
+                emotions[emotion_pt] = emotions.get(emotion_pt, 0) + 1
 
-                    except Exception as e:
-                        print(f"Erro na análise facial: {str(e)}")
+        except Exception as e:
+            print(f"Erro na análise facial: {str(e)}")
         
         # Garantir que todas as emoções estejam presentes na resposta
-        response = {e: emotions.get(e, 0) for e in EMOTION_TRANSLATION.values()}
-        return response
+        return {e: emotions.get(e, 0) for e in EMOTION_TRANSLATION.values()}
 
     except Exception as e:
         print(f"Erro no endpoint /analyze-emotion: {str(e)}")
@@ -124,19 +243,27 @@ async def analyze_emotion(file: UploadFile = File(...)):
             content={"message": f"Erro interno ao processar imagem: {str(e)}"}
         )
 
+# As rotas abaixo só falam com o estado compartilhado (chamadas de rede que
+# bloqueiam): são def para rodar no threadpool, fora do event loop
+
 @app.post("/start-continuous-analysis/")
-async def start_continuous_analysis():
-    global camera_thread, stop_camera, camera_active, emotion_counts
+def start_continuous_analysis():
+    global camera_thread, stop_camera, last_result
     
     with emotion_lock:
-        if camera_active:
+        touch_session()
+        # Só um worker abre a câmera: o primeiro a pegar o lease
+        if not state.set(OWNER_KEY, WORKER_ID, ttl=CAMERA_LEASE_SECONDS, only_if_absent=True):
             return {"message": "Análise contínua já está em andamento"}
         
         # Resetar contadores
-        emotion_counts = {e: 0 for e in EMOTION_TRANSLATION.values()}
+        state.reset_counters(COUNTS_KEY, {e: 0 for e in EMOTION_TRANSLATION.values()})
+        state.delete(STATUS_KEY)
+        last_result = None
+        scene_gate.reset()
+        apply_scene_config()
         
         stop_camera = False
-        camera_active = True
         
         # Iniciar thread para captura contínua
         camera_thread = threading.Thread(target=continuous_analysis)
@@ -146,32 +273,110 @@ async def start_continuous_analysis():
         return {"message": "Análise contínua iniciada"}
 
 @app.post("/stop-continuous-analysis/")
-async def stop_continuous_analysis():
-    global stop_camera, camera_active
+def stop_continuous_analysis():
+    touch_session()
+    owner = state.get(OWNER_KEY)
+    # Remove só o lease lido; se ele mudou no meio tempo (venceu e outro worker o pegou), tenta com o novo dono
+    while owner is not None and not state.delete_if_equal(OWNER_KEY, owner):
+        owner = state.get(OWNER_KEY)
+    if owner is None:
+        return {"message": "Nenhuma análise contínua em andamento"}
     
-    with emotion_lock:
-        if not camera_active:
-            return {"message": "Nenhuma análise contínua em andamento"}
-        
-        stop_camera = True
-        camera_active = False
-        
-        # Copiar os dados atuais para retornar
-        final_data = emotion_counts.copy()
-        
-        return {
-            "message": "Análise contínua parada",
-            "final_data": final_data
-        }
+    # O worker dono da câmera (este ou outro) para a captura ao receber a mensagem
+    state.publish(CONTROL_CHANNEL, {"action": "stop", "owner": owner})
+    
+    # Copiar os dados atuais para retornar
+    final_data = read_counts()
+    
+    return {
+        "message": "Análise contínua parada",
+        "final_data": final_data
+    }
 
 @app.get("/get-emotion-data/")
-async def get_emotion_data():
+def get_emotion_data():
+    touch_session()
+    return read_counts()
+
+@app.get("/continuous-analysis/timings")
+def get_continuous_timings():
+    # Tempos e nível de degradação vêm do worker da câmera
+    status = state.get_json(STATUS_KEY) or {}
+    return {"active": camera_active(), "timings": status.get("timings", {}),
+            "degradation": status.get("degradation", overload.current().level)}
+
+# Filtro de mudança de cena: quantos frames deixaram de ser analisados
+@app.get("/continuous-analysis/scene")
+def get_scene_gate():
+    status = state.get_json(STATUS_KEY) or {}
+    return status.get("scene") or scene_gate.stats()
+
+# Ajuste em tempo real do compromisso entre CPU e resposta (threshold 0 desliga o filtro)
+@app.put("/continuous-analysis/scene")
+def configure_scene_gate(threshold: float = Query(None, ge=0), max_interval: float = Query(None, gt=0)):
+    # Gravado no estado compartilhado: vale para o worker da câmera e para os próximos
+    config = state.get_json(SCENE_CONFIG_KEY) or {}
+    if threshold is not None:
+        config["threshold"] = threshold
+    if max_interval is not None:
+        config["max_interval"] = max_interval
+    state.set_json(SCENE_CONFIG_KEY, config)
+    state.publish(CONTROL_CHANNEL, {"action": "scene"})
+    return {"threshold": config.get("threshold", scene_gate.threshold),
+            "max_interval_seconds": config.get("max_interval", scene_gate.max_interval)}
+
+def count_emotions(result, timings=None):
+    global last_result
+    # Rostos só detectados (degradação máxima sem modelo leve) não entram na contagem
+    emotions_pt = Counter(
+        EMOTION_TRANSLATION.get(f["dominant_emotion"], f["dominant_emotion"])
+        for f in result["faces"] if f["dominant_emotion"] != "none"
+    )
+    if timings is not None:
+        with emotion_lock:
+            last_result = result
+    try:
+        if emotions_pt:
+            state.incr(COUNTS_KEY, dict(emotions_pt))
+        if timings is not None:
+            state.set_json(STATUS_KEY, {"timings": timings, "scene": scene_gate.stats(),
+                                        "degradation": overload.current().level})
+    except StateError as e:
+        print(f"Erro ao gravar contagens no estado compartilhado: {str(e)}")
+
+def carry_forward():
+    # Frame pulado pelo filtro de cena: conta de novo o último resultado, para
+    # as contagens continuarem proporcionais ao tempo e não ao número de análises
     with emotion_lock:
-        return emotion_counts
+        result = last_result
+    if result is not None:
+        count_emotions(result)
+
+def count_pool_result(pool, future, captured_at, thumb):
+    try:
+        output = future.result()
+        result = pool.finish(output)
+    except Exception as e:
+        print(f"Erro na análise: {str(e)}")
+        return
+    scene_gate.mark_analyzed(thumb)
+    overload.observe(time.perf_counter() - captured_at)
+    count_emotions(result, {stage: round(seconds * 1000, 3) for stage, seconds in output[3].items()})
+
+def renew_camera_lease() -> bool:
+    # False quando a sessão foi parada ou o lease passou para outro worker
+    try:
+        # Compare-and-set: um lease que venceu e foi pego por outro worker não é sobrescrito
+        if not state.set_if_equal(OWNER_KEY, WORKER_ID, WORKER_ID, ttl=CAMERA_LEASE_SECONDS):
+            return False
+    except StateError as e:
+        print(f"Erro ao renovar o lease da câmera: {str(e)}")
+    return True
 
 def continuous_analysis():
-    global stop_camera, emotion_counts
+    global stop_camera
     
+    pool = get_pool()
     cap = None
     try:
         cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
@@ -182,7 +387,13 @@ def continuous_analysis():
         cap.set(cv2.CAP_PROP_FPS, 30)  # Tentar obter 30 FPS
         cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Buffer menor para menor latência
         
+        lease_renewed = time.monotonic()
         while not stop_camera:
+            if time.monotonic() - lease_renewed > CAMERA_LEASE_SECONDS / 3:
+                if not renew_camera_lease():
+                    break
+                lease_renewed = time.monotonic()
+
             # Limpar buffer para pegar o frame mais recente
             for _ in range(2):
                 cap.grab()
@@ -192,44 +403,45 @@ def continuous_analysis():
                 print("Falha ao capturar frame")
                 time.sleep(0.01)
                 continue
+            captured_at = time.perf_counter()
+            level = overload.current()
+
+            thumb = luminance_thumbnail(frame, "bgr") if scene_gate.active else None
+            if not scene_gate.check(thumb):
+                carry_forward()
+                time.sleep(max(0.01, level.min_interval))
+                continue
             
-            # Processar cada frame sem pular
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = face_detector.process(rgb_frame)
-            
-            if results.detections:
-                for detection in results.detections:
-                    bbox = detection.location_data.relative_bounding_box
-                    h, w, _ = frame.shape
-                    x, y, w_box, h_box = int(bbox.xmin * w), int(bbox.ymin * h), int(bbox.width * w), int(bbox.height * h)
+            if pool is not None:
+                # Vários frames em análise ao mesmo tempo, um por worker livre; com
+                # todos ocupados o frame é descartado (o próximo já é mais recente)
+                future = pool.submit(frame, "bgr", block=False,
+                                     max_side=level.detection_max_side, classifier=level.classifier)
+                if future is not None:
+                    future.add_done_callback(
+                        lambda f, t=captured_at, th=thumb: count_pool_result(pool, f, t, th)
+                    )
+                # Sob carga, menos frames por segundo
+                time.sleep(max(0.01, level.min_interval))
+                continue
+
+            # Processar o frame que passou pelo filtro de cena; só uma análise
+            # bem-sucedida troca a referência
+            with traced() as frame_trace:
+                try:
+                    with INFERENCE_QUEUE_DEPTH.track_inprogress():
+                        result = analyze_faces(detect_bgr, frame, "bgr", None,
+                                               level.detection_max_side, level.classifier)
+                    scene_gate.mark_analyzed(thumb)
+                    overload.observe(time.perf_counter() - captured_at)
+                    count_emotions(result, frame_trace.timings_ms())
                     
-                    if x >= 0 and y >= 0 and x + w_box <= w and y + h_box <= h:
-                        face_region = frame[y:y + h_box, x:x + w_box]
-                        
-                        try:
-                            # Usar apenas o modelo básico para melhor performance
-                            analysis = DeepFace.analyze(
-                                face_region, 
-                                actions=['emotion'],
-                                enforce_detection=False,
-                                detector_backend='opencv'  # Mais rápido que o padrão
-                            )
-                            
-                            if isinstance(analysis, list):
-                                emotion = analysis[0]['dominant_emotion']
-                            else:
-                                emotion = analysis['dominant_emotion']
-                            
-                            emotion_pt = EMOTION_TRANSLATION.get(emotion, emotion)
-                            
-                            with emotion_lock:
-                                emotion_counts[emotion_pt] += 1
-                            
-                        except Exception as e:
-                            print(f"Erro na análise: {str(e)}")
+                except Exception as e:
+                    print(f"Erro na análise: {str(e)}")
+            log_if_slow(frame_trace, "frame da análise contínua")
             
-            # Pequena pausa para não sobrecarregar
-            time.sleep(0.01)
+            # Pequena pausa para não sobrecarregar (maior sob degradação)
+            time.sleep(max(0.01, level.min_interval))
     
     except Exception as e:
         print(f"Erro na análise contínua: {str(e)}")
@@ -237,6 +449,10 @@ def continuous_analysis():
     finally:
         if cap and cap.isOpened():
             cap.release()
+        try:
+            state.delete_if_equal(OWNER_KEY, WORKER_ID)
+        except StateError:
+            pass
         print("Câmera liberada")
 
 if __name__ == "__main__":
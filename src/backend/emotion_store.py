@@ -0,0 +1,390 @@
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import Json, execute_values
+
+from db import get_db_connection
+
+# Persistência dos resultados de emoção: a linha do tempo das análises de
+# vídeo gravado e as contagens diárias por usuário usadas nas análises por
+# equipe (team_analytics.py). As tabelas são criadas no primeiro uso; a
+# retenção e a compactação ficam no maintenance.py.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_analyses (
+    id SERIAL PRIMARY KEY,
+    filename TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'processing',
+    progress REAL NOT NULL DEFAULT 0,
+    duration_seconds REAL,
+    sample_fps REAL,
+    error TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS video_emotion_timeline (
+    analysis_id INTEGER NOT NULL REFERENCES video_analyses(id) ON DELETE CASCADE,
+    second INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    faces INTEGER NOT NULL,
+    dominant_emotion TEXT,
+    emotions JSONB NOT NULL,
+    PRIMARY KEY (analysis_id, second)
+);
+
+-- Linha do tempo antiga compactada por minuto (maintenance.py)
+CREATE TABLE IF NOT EXISTS video_emotion_rollups (
+    analysis_id INTEGER NOT NULL REFERENCES video_analyses(id) ON DELETE CASCADE,
+    minute INTEGER NOT NULL,
+    seconds INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    faces INTEGER NOT NULL,
+    dominant_emotion TEXT,
+    emotions JSONB NOT NULL,
+    PRIMARY KEY (analysis_id, minute)
+);
+
+ALTER TABLE video_analyses ADD COLUMN IF NOT EXISTS rolled_up_at TIMESTAMP;
+-- Quem enviou o vídeo e quando a análise saiu da fila (status 'queued' -> 'processing')
+ALTER TABLE video_analyses ADD COLUMN IF NOT EXISTS user_id INTEGER REFERENCES users(id) ON DELETE CASCADE;
+ALTER TABLE video_analyses ADD COLUMN IF NOT EXISTS started_at TIMESTAMP;
+
+CREATE TABLE IF NOT EXISTS teams (
+    id SERIAL PRIMARY KEY,
+    name TEXT NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS team_members (
+    team_id INTEGER NOT NULL REFERENCES teams(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    PRIMARY KEY (team_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS team_members_user_idx ON team_members (user_id);
+-- Quem criou a equipe: só ele altera os membros e vê as análises
+ALTER TABLE teams ADD COLUMN IF NOT EXISTS manager_id INTEGER REFERENCES users(id) ON DELETE SET NULL;
+
+-- Frames por emoção dominante, por usuário e dia, na ordem de EMOTION_TRANSLATION
+CREATE TABLE IF NOT EXISTS user_emotion_daily (
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    counts INTEGER[] NOT NULL,
+    PRIMARY KEY (user_id, day)
+);
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(SCHEMA)
+            conn.commit()
+            _schema_ready = True
+        finally:
+            conn.close()
+
+
+def create_video_analysis(filename: str, duration_seconds: Optional[float], sample_fps: float,
+                          user_id: Optional[int] = None) -> int:
+    # A análise entra na fila; start_video_processing marca quando ela começa de fato
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO video_analyses (filename, duration_seconds, sample_fps, user_id, status)
+            VALUES (%s, %s, %s, %s, 'queued')
+            RETURNING id
+            """,
+            (filename, duration_seconds, sample_fps, user_id)
+        )
+        analysis_id = cur.fetchone()["id"]
+        conn.commit()
+        return analysis_id
+    finally:
+        conn.close()
+
+
+def start_video_processing(analysis_id: int):
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "UPDATE video_analyses SET status = 'processing', started_at = %s WHERE id = %s",
+            (datetime.now(), analysis_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def update_video_progress(analysis_id: int, progress: float):
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("UPDATE video_analyses SET progress = %s WHERE id = %s", (progress, analysis_id))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def save_video_timeline(analysis_id: int, timeline: List[Dict]):
+    # Uma linha por segundo; reprocessar um trecho sobrescreve os segundos dele
+    if not timeline:
+        return
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        execute_values(
+            cur,
+            """
+            INSERT INTO video_emotion_timeline (analysis_id, second, samples, faces, dominant_emotion, emotions)
+            VALUES %s
+            ON CONFLICT (analysis_id, second) DO UPDATE SET
+                samples = EXCLUDED.samples,
+                faces = EXCLUDED.faces,
+                dominant_emotion = EXCLUDED.dominant_emotion,
+                emotions = EXCLUDED.emotions
+            """,
+            [
+                (analysis_id, row["second"], row["samples"], row["faces"], row["dominant_emotion"], Json(row["emotions"]))
+                for row in timeline
+            ]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def finish_video_analysis(analysis_id: int, error: Optional[str] = None):
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE video_analyses
+            SET status = %s, progress = CASE WHEN %s IS NULL THEN 1 ELSE progress END,
+                error = %s, finished_at = %s
+            WHERE id = %s
+            """,
+            ("error" if error else "done", error, error, datetime.now(), analysis_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_video_analysis(analysis_id: int) -> Optional[Dict]:
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM video_analyses WHERE id = %s", (analysis_id,))
+        return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def get_video_timeline(analysis_id: int) -> List[Dict]:
+    # Depois da compactação os segundos valem pelos resumos por minuto, mesmo
+    # que as linhas ainda não tenham sido apagadas (maintenance.py apaga em lotes)
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT t.second, t.samples, t.faces, t.dominant_emotion, t.emotions
+            FROM video_emotion_timeline t
+            JOIN video_analyses a ON a.id = t.analysis_id
+            WHERE t.analysis_id = %s AND a.rolled_up_at IS NULL
+            ORDER BY t.second
+            """,
+            (analysis_id,)
+        )
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def get_video_rollups(analysis_id: int) -> List[Dict]:
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT minute, seconds, samples, faces, dominant_emotion, emotions
+            FROM video_emotion_rollups
+            WHERE analysis_id = %s
+            ORDER BY minute
+            """,
+            (analysis_id,)
+        )
+        return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def video_emotion_counts(analysis_id: int) -> Dict[str, int]:
+    # Segundos da linha do tempo por emoção dominante (entrada dos relatórios)
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT dominant_emotion, SUM(seconds) AS seconds
+            FROM (
+                SELECT t.dominant_emotion, 1 AS seconds
+                FROM video_emotion_timeline t
+                JOIN video_analyses a ON a.id = t.analysis_id
+                WHERE t.analysis_id = %s AND a.rolled_up_at IS NULL
+                UNION ALL
+                SELECT dominant_emotion, seconds FROM video_emotion_rollups WHERE analysis_id = %s
+            ) t
+            WHERE dominant_emotion IS NOT NULL
+            GROUP BY dominant_emotion
+            """,
+            (analysis_id, analysis_id)
+        )
+        return {row["dominant_emotion"]: int(row["seconds"]) for row in cur.fetchall()}
+    finally:
+        conn.close()
+
+
+def create_team(name: str, user_ids: Iterable[int], manager_id: Optional[int] = None) -> int:
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO teams (name, manager_id) VALUES (%s, %s) RETURNING id", (name, manager_id))
+        team_id = cur.fetchone()["id"]
+        execute_values(
+            cur,
+            "INSERT INTO team_members (team_id, user_id) VALUES %s ON CONFLICT DO NOTHING",
+            [(team_id, user_id) for user_id in set(user_ids)]
+        )
+        conn.commit()
+        return team_id
+    finally:
+        conn.close()
+
+
+def get_team(team_id: int) -> Optional[Dict]:
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id, name, manager_id FROM teams WHERE id = %s", (team_id,))
+        return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def set_team_members(team_id: int, user_ids: Iterable[int]) -> bool:
+    # Substitui os membros; False quando a equipe não existe
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM teams WHERE id = %s FOR UPDATE", (team_id,))
+        if cur.fetchone() is None:
+            conn.rollback()
+            return False
+        cur.execute("DELETE FROM team_members WHERE team_id = %s", (team_id,))
+        execute_values(
+            cur,
+            "INSERT INTO team_members (team_id, user_id) VALUES %s ON CONFLICT DO NOTHING",
+            [(team_id, user_id) for user_id in set(user_ids)]
+        )
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def get_team_members(team_id: int) -> Optional[List[int]]:
+    # None quando a equipe não existe (lista vazia = equipe sem membros)
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT t.id, m.user_id
+            FROM teams t LEFT JOIN team_members m ON m.team_id = t.id
+            WHERE t.id = %s
+            ORDER BY m.user_id
+            """,
+            (team_id,)
+        )
+        rows = cur.fetchall()
+        if not rows:
+            return None
+        return [row["user_id"] for row in rows if row["user_id"] is not None]
+    finally:
+        conn.close()
+
+
+def add_user_emotion_counts(rows: List[Tuple[int, date, List[int]]]) -> int:
+    # Soma as contagens às do dia (elemento a elemento). Linhas de usuários
+    # excluídos (o JWT continua válido até expirar) são descartadas, para não
+    # derrubar o lote inteiro pela chave estrangeira
+    if not rows:
+        return 0
+    ensure_schema()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        written = execute_values(
+            cur,
+            """
+            INSERT INTO user_emotion_daily (user_id, day, counts)
+            SELECT v.user_id, v.day, v.counts
+            FROM (VALUES %s) AS v(user_id, day, counts)
+            WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = v.user_id)
+            ON CONFLICT (user_id, day) DO UPDATE SET
+                counts = ARRAY(
+                    SELECT a + b
+                    FROM unnest(user_emotion_daily.counts, EXCLUDED.counts) WITH ORDINALITY AS t(a, b, i)
+                    ORDER BY i
+                )
+            RETURNING user_id
+            """,
+            rows,
+            fetch=True
+        )
+        conn.commit()
+        return len(written)
+    finally:
+        conn.close()
+
+
+def load_team_daily(team_id: int, days: List[date]) -> List[Dict]:
+    # Linhas (user_id, day, counts) dos membros da equipe nos dias pedidos
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT d.user_id, d.day, d.counts
+            FROM user_emotion_daily d
+            JOIN team_members m ON m.user_id = d.user_id
+            WHERE m.team_id = %s AND d.day = ANY(%s)
+            """,
+            (team_id, days)
+        )
+        return cur.fetchall()
+    finally:
+        conn.close()
@@ -0,0 +1,144 @@
+import os
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+from preprocessing import FaceBox
+
+# IoU mínimo para considerar que uma detecção continua uma trilha do frame anterior
+TRACK_IOU_THRESHOLD = float(os.getenv("TRACK_IOU_THRESHOLD", "0.3"))
+# Similaridade (cosseno) mínima de aparência para reidentificar um rosto que sumiu
+TRACK_REID_THRESHOLD = float(os.getenv("TRACK_REID_THRESHOLD", "0.85"))
+# Frames sem detecção antes de descartar a trilha
+TRACK_MAX_AGE = int(os.getenv("TRACK_MAX_AGE", "15"))
+
+_DESCRIPTOR_SIZE = 12
+
+
+def appearance_descriptors(faces: np.ndarray) -> np.ndarray:
+    # Descritor barato: recorte 12x12 normalizado (média zero, norma unitária)
+    if len(faces) == 0:
+        return np.empty((0, _DESCRIPTOR_SIZE * _DESCRIPTOR_SIZE), dtype=np.float32)
+    small = np.stack([
+        cv2.resize(face, (_DESCRIPTOR_SIZE, _DESCRIPTOR_SIZE), interpolation=cv2.INTER_AREA)
+        for face in faces
+    ]).reshape(len(faces), -1).astype(np.float32)
+    small -= small.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(small, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return small / norms
+
+
+def iou_matrix(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # a: (N, 4), b: (M, 4) no formato x, y, w, h
+    ax1, ay1 = a[:, 0:1], a[:, 1:2]
+    ax2, ay2 = ax1 + a[:, 2:3], ay1 + a[:, 3:4]
+    bx1, by1 = b[:, 0], b[:, 1]
+    bx2, by2 = bx1 + b[:, 2], by1 + b[:, 3]
+    iw = np.clip(np.minimum(ax2, bx2) - np.maximum(ax1, bx1), 0, None)
+    ih = np.clip(np.minimum(ay2, by2) - np.maximum(ay1, by1), 0, None)
+    inter = iw * ih
+    union = a[:, 2:3] * a[:, 3:4] + b[:, 2] * b[:, 3] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0)
+
+
+def _greedy_match(score: np.ndarray, threshold: float):
+    # Associa pares em ordem decrescente de pontuação, sem repetir linha ou coluna
+    pairs = []
+    if score.size == 0:
+        return pairs
+    used_rows, used_cols = set(), set()
+    for flat in np.argsort(score, axis=None)[::-1]:
+        r, c = divmod(int(flat), score.shape[1])
+        if score[r, c] < threshold:
+            break
+        if r in used_rows or c in used_cols:
+            continue
+        used_rows.add(r)
+        used_cols.add(c)
+        pairs.append((r, c))
+    return pairs
+
+
+class FaceTracker:
+    """Atribui IDs estáveis aos rostos entre frames de uma mesma sessão.
+
+    Primeiro associa por sobreposição das caixas (IoU) com as trilhas vistas
+    no frame anterior; detecções que sobram são comparadas por aparência com
+    trilhas perdidas há no máximo TRACK_MAX_AGE frames.
+    """
+
+    def __init__(self, iou_threshold: float = TRACK_IOU_THRESHOLD,
+                 reid_threshold: float = TRACK_REID_THRESHOLD, max_age: int = TRACK_MAX_AGE):
+        self.iou_threshold = iou_threshold
+        self.reid_threshold = reid_threshold
+        self.max_age = max_age
+        self._next_id = 1
+        self._ids: List[int] = []
+        self._boxes = np.empty((0, 4), dtype=np.float32)
+        self._descriptors = np.empty((0, _DESCRIPTOR_SIZE * _DESCRIPTOR_SIZE), dtype=np.float32)
+        self._age = np.empty(0, dtype=np.int32)
+
+    def update(self, boxes: List[FaceBox], faces: Optional[np.ndarray] = None) -> List[int]:
+        self._age += 1
+        if not boxes:
+            self._drop_expired()
+            return []
+
+        det_boxes = np.array([b[:4] for b in boxes], dtype=np.float32)
+        det_desc = appearance_descriptors(faces) if faces is not None else None
+        assigned = [0] * len(boxes)
+
+        # 1) trilhas ativas no frame anterior, por IoU
+        recent = np.flatnonzero(self._age == 1)
+        pairs = _greedy_match(iou_matrix(det_boxes, self._boxes[recent]), self.iou_threshold)
+        for d, t in pairs:
+            assigned[d] = self._refresh(recent[t], det_boxes[d], det_desc, d)
+
+        # 2) trilhas perdidas, por aparência
+        if det_desc is not None:
+            pending = [d for d in range(len(boxes)) if not assigned[d]]
+            lost = np.flatnonzero(self._age > 1)
+            if pending and len(lost):
+                similarity = det_desc[pending] @ self._descriptors[lost].T
+                for p, t in _greedy_match(similarity, self.reid_threshold):
+                    assigned[pending[p]] = self._refresh(lost[t], det_boxes[pending[p]], det_desc, pending[p])
+
+        # 3) novas trilhas
+        for d in range(len(boxes)):
+            if not assigned[d]:
+                assigned[d] = self._create(det_boxes[d], det_desc[d] if det_desc is not None else None)
+
+        self._drop_expired()
+        return assigned
+
+    def _refresh(self, index: int, box: np.ndarray, descriptors: Optional[np.ndarray], d: int) -> int:
+        self._boxes[index] = box
+        self._age[index] = 0
+        if descriptors is not None:
+            # Média móvel para tolerar variações de expressão e iluminação
+            blended = 0.7 * self._descriptors[index] + 0.3 * descriptors[d]
+            norm = np.linalg.norm(blended)
+            self._descriptors[index] = blended / norm if norm else blended
+        return self._ids[index]
+
+    def _create(self, box: np.ndarray, descriptor: Optional[np.ndarray]) -> int:
+        track_id = self._next_id
+        self._next_id += 1
+        if descriptor is None:
+            descriptor = np.zeros(self._descriptors.shape[1], dtype=np.float32)
+        self._ids.append(track_id)
+        self._boxes = np.vstack([self._boxes, box[None, :]])
+        self._descriptors = np.vstack([self._descriptors, descriptor[None, :]])
+        self._age = np.append(self._age, 0).astype(np.int32)
+        return track_id
+
+    def _drop_expired(self):
+        keep = self._age <= self.max_age
+        if keep.all():
+            return
+        self._ids = [i for i, k in zip(self._ids, keep) if k]
+        self._boxes = self._boxes[keep]
+        self._descriptors = self._descriptors[keep]
+        self._age = self._age[keep]
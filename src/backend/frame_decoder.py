@@ -0,0 +1,169 @@
+import inspect
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from metrics import observe_stage
+
+# PyTurboJPEG é opcional: quando disponível decodifica direto na ordem de cor
+# desejada e com escala reduzida no domínio DCT
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR, TJPF_RGB
+    _turbo = TurboJPEG()
+    _TURBO_HAS_DST = "dst" in inspect.signature(_turbo.decode).parameters
+except Exception:
+    _turbo = None
+    _TURBO_HAS_DST = False
+
+# Acima deste lado máximo (em pixels) a imagem é decodificada reduzida (1/2, 1/4, 1/8)
+MAX_DECODE_SIDE = int(os.getenv("MAX_DECODE_SIDE", "1920"))
+
+# OpenCV >= 4.10 decodifica direto em RGB sem conversão posterior. O bit de
+# IMREAD_COLOR (BGR), presente em todas as flags IMREAD_REDUCED_COLOR_*, precisa
+# sair antes: o OpenCV recusa BGR e RGB ao mesmo tempo
+_IMREAD_COLOR_RGB = getattr(cv2, "IMREAD_COLOR_RGB", None)
+
+_REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Marcadores SOF que carregam as dimensões do JPEG (exclui DHT, JPG e DAC)
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_size(data) -> Optional[Tuple[int, int]]:
+    # Lê (largura, altura) do cabeçalho do JPEG sem decodificar os pixels
+    view = memoryview(data)
+    n = len(view)
+    if n < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 < n:
+        if view[i] != 0xFF:
+            i += 1
+            continue
+        marker = view[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        length = (view[i + 2] << 8) | view[i + 3]
+        if marker in _SOF_MARKERS:
+            height = (view[i + 5] << 8) | view[i + 6]
+            width = (view[i + 7] << 8) | view[i + 8]
+            return width, height
+        i += 2 + length
+    return None
+
+
+def reduction_factor(width: int, height: int, max_side: int) -> int:
+    # Menor fator DCT (1, 2, 4, 8) que deixa o maior lado dentro do limite
+    if max_side <= 0:
+        return 1
+    side = max(width, height)
+    for factor in (1, 2, 4, 8):
+        if side / factor <= max_side:
+            return factor
+    return 8
+
+
+class FrameDecoder:
+    """Decodifica JPEGs uma única vez, já na ordem de cor pedida.
+
+    Com o TurboJPEG (versão com dst) e no OpenCV antigo sem IMREAD_COLOR_RGB,
+    os pixels vão para um buffer interno reaproveitado entre chamadas. No
+    caminho padrão do OpenCV o binding Python não aceita destino, e cada
+    chamada aloca um array novo. Por isso o retorno pode ser sobrescrito na
+    próxima chamada: quem precisar guardá-lo deve copiar. Use uma instância
+    por thread ou conexão.
+    """
+
+    def __init__(self, color: str = "bgr", max_side: int = MAX_DECODE_SIDE):
+        if color not in ("bgr", "rgb"):
+            raise ValueError("color deve ser 'bgr' ou 'rgb'")
+        self.color = color
+        self.max_side = max_side
+        self._buffer: Optional[np.ndarray] = None
+
+    def _buffer_for(self, shape: Tuple[int, int, int]) -> np.ndarray:
+        # Realoca apenas quando a resolução muda (p.ex. troca de câmera)
+        if self._buffer is None or self._buffer.shape != shape:
+            self._buffer = np.empty(shape, dtype=np.uint8)
+        return self._buffer
+
+    def decode(self, data, max_side: Optional[int] = None) -> Optional[np.ndarray]:
+        # max_side sobrescreve o limite da instância (p.ex. em sobrecarga)
+        if not data:
+            return None
+        start = time.perf_counter()
+        try:
+            return self._decode(data, self.max_side if max_side is None else max_side)
+        finally:
+            observe_stage("decode", time.perf_counter() - start)
+
+    def _decode(self, data, max_side: int) -> Optional[np.ndarray]:
+        size = jpeg_size(data)
+        factor = reduction_factor(*size, max_side) if size else 1
+
+        if _turbo is not None and size is not None:
+            try:
+                return self._decode_turbo(data, size, factor)
+            except Exception:
+                pass  # JPEG incomum: tenta pelo OpenCV
+
+        return self._decode_cv2(data, factor)
+
+    def _decode_turbo(self, data, size, factor) -> np.ndarray:
+        pixel_format = TJPF_RGB if self.color == "rgb" else TJPF_BGR
+        scaling = (1, factor) if factor > 1 else None
+        if _TURBO_HAS_DST:
+            width, height = size
+            # O TurboJPEG arredonda para cima ao reduzir
+            shape = (-(-height // factor), -(-width // factor), 3)
+            return _turbo.decode(
+                data, pixel_format=pixel_format, scaling_factor=scaling, dst=self._buffer_for(shape)
+            )
+        return _turbo.decode(data, pixel_format=pixel_format, scaling_factor=scaling)
+
+    def _decode_cv2(self, data, factor) -> Optional[np.ndarray]:
+        # np.frombuffer não copia os bytes recebidos
+        encoded = np.frombuffer(data, np.uint8)
+        flags = _REDUCED_FLAGS[factor]
+
+        # cv2.imdecode não expõe dst no Python: estes caminhos alocam a cada frame
+        if self.color == "rgb" and _IMREAD_COLOR_RGB is not None:
+            return cv2.imdecode(encoded, (flags & ~cv2.IMREAD_COLOR) | _IMREAD_COLOR_RGB)
+
+        img = cv2.imdecode(encoded, flags)
+        if img is None or self.color == "bgr":
+            return img
+
+        # OpenCV antigo: converte para RGB dentro do buffer reutilizável
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self._buffer_for(img.shape))
+
+
+_local = threading.local()
+
+
+def get_decoder(color: str = "bgr") -> FrameDecoder:
+    # Um decodificador por thread e ordem de cor, reaproveitado entre requisições
+    decoders = getattr(_local, "decoders", None)
+    if decoders is None:
+        decoders = _local.decoders = {}
+    decoder = decoders.get(color)
+    if decoder is None:
+        decoder = decoders[color] = FrameDecoder(color)
+    return decoder
+
+
+def decode_frame(data, color: str = "bgr", max_side: Optional[int] = None) -> Optional[np.ndarray]:
+    return get_decoder(color).decode(data, max_side)
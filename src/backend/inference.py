@@ -0,0 +1,90 @@
+import asyncio
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+
+from emotion_model import get_classifier
+from face_tracker import FaceTracker
+from frame_decoder import FrameDecoder
+from inference_pool import create_pool
+from metrics import INFERENCE_QUEUE_DEPTH
+from overload import LEVELS, Degradation, controller as overload
+from pipeline import analyze_faces, empty_result
+from preprocessing import haar_detector
+
+# Pilha de visão do main.py (OpenCV, NumPy e, na primeira classificação,
+# DeepFace/TensorFlow). Só é importada pelas rotas de inferência, para que
+# login, cadastro e OAuth subam sem ela.
+
+# Detector Haar (o mesmo do backend 'opencv' do DeepFace), aplicado ao frame reduzido
+face_detector = haar_detector()
+
+# Com INFERENCE_WORKERS > 0 os frames vão para processos separados
+pool = create_pool("haar")
+
+# Sem pool, a inferência roda nesta thread única, uma de cada vez como antes,
+# mas fora do event loop: os frames seguintes continuam sendo recebidos e a
+# espera deles na fila entra na latência que o controlador de sobrecarga mede
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inferencia")
+
+
+# Função para análise de emoções em uma imagem
+async def analyze_emotions(image_data: bytes) -> Dict:
+    received_at = time.perf_counter()
+    level = overload.current()
+    try:
+        # Decodificação única, já em BGR (ordem usada pelo detector e pelo classificador).
+        # Buffer próprio da requisição: o frame espera na fila da inferência e o
+        # buffer por thread do decode_frame seria sobrescrito por outra requisição
+        img = FrameDecoder("bgr").decode(image_data, level.decode_max_side)
+
+        if img is None:
+            result = empty_result()
+        else:
+            result = await analyze_frame_async(img, level=level)
+            overload.observe(time.perf_counter() - received_at)
+
+    except Exception as e:
+        print(f"Erro na análise: {str(e)}")
+        result = empty_result()
+    result["degradation"] = level.level
+    return result
+
+
+def _analyze(img: np.ndarray, tracker: Optional[FaceTracker], level: Degradation) -> Dict:
+    # Todos os rostos do frame, classificados em lote; o tracker (opcional) dá IDs estáveis
+    return analyze_faces(face_detector, img, "bgr", tracker, level.detection_max_side, level.classifier)
+
+
+def analyze_frame(img: np.ndarray, tracker: Optional[FaceTracker] = None,
+                  level: Degradation = LEVELS[0]) -> Dict:
+    with INFERENCE_QUEUE_DEPTH.track_inprogress():
+        return _analyze(img, tracker, level)
+
+
+async def analyze_frame_async(img: np.ndarray, tracker: Optional[FaceTracker] = None,
+                              level: Degradation = LEVELS[0]) -> Dict:
+    # A profundidade conta os frames esperando a vez, não só o que está rodando
+    with INFERENCE_QUEUE_DEPTH.track_inprogress():
+        if pool is not None:
+            return await pool.analyze(img, "bgr", tracker, level.detection_max_side, level.classifier)
+        # copy_context: os estágios medidos na thread entram no trace do frame
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            _executor, context.run, _analyze, img, tracker, level
+        )
+
+
+def warm_up():
+    # Carrega o modelo (e o TensorFlow) antes do primeiro frame; com o pool
+    # cada worker já carrega o seu ao subir
+    if pool is not None:
+        return
+    try:
+        get_classifier()
+        print("Modelo de emoções carregado")
+    except Exception as e:
+        print(f"Falha ao pré-carregar o modelo de emoções: {str(e)}")
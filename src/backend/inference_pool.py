@@ -0,0 +1,380 @@
+import asyncio
+import atexit
+import collections
+import concurrent.futures
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+from multiprocessing import connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from metrics import FACES_PER_FRAME, INFERENCE_WORKER_RESTARTS, INFERENCE_WORKERS_ALIVE, observe_stage
+from pipeline import finish_result
+from preprocessing import DETECTION_MAX_SIDE, FaceBox, build_detector, clip_box
+
+# Pool de processos de inferência. O processo da API decodifica o frame e o
+# copia para um slot de um anel em memória compartilhada do worker escolhido;
+# pelo pipe só passam (id, slot, shape, cor, opções) na ida e caixas, recortes 48x48
+# e scores na volta. Cada worker tem seu próprio TensorFlow/MediaPipe, então
+# o GIL deixa de limitar o paralelismo.
+
+# 0 mantém a inferência no próprio processo da API
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+# Frames em voo por worker (tamanho do anel de cada worker)
+INFERENCE_SLOTS = int(os.getenv("INFERENCE_SLOTS", "4"))
+# Tamanho de cada slot; frames maiores são reduzidos antes da cópia
+INFERENCE_SLOT_BYTES = int(os.getenv("INFERENCE_SLOT_BYTES", str(1920 * 1080 * 3)))
+# Quantas vezes um frame é reenviado quando o worker cai no meio dele
+INFERENCE_MAX_RETRIES = int(os.getenv("INFERENCE_MAX_RETRIES", "1"))
+
+# Worker que cai antes disso após subir espera para reiniciar (evita loop de crash)
+_FAST_CRASH_SECONDS = 2.0
+_RESTART_DELAY = 1.0
+
+
+class WorkerCrashed(RuntimeError):
+    pass
+
+
+def _worker_main(conn, shm_name: str, base: int, slot_bytes: int, detector_name: str):
+    # Roda no processo filho: imports pesados acontecem aqui, não na API.
+    # Um núcleo por worker; o paralelismo vem do número de processos
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", "1")
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    cv2.setNumThreads(1)
+    import emotion_model
+    if emotion_model.EMOTION_MODEL_THREADS == 0:
+        emotion_model.EMOTION_MODEL_THREADS = 1
+    from pipeline import detect_and_classify
+    from tracing import traced
+
+    shm = SharedMemory(name=shm_name)
+    detectors = {}
+    try:
+        emotion_model.get_classifier()
+    except Exception as e:
+        print(f"Worker de inferência sem modelo de emoções: {str(e)}")
+
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            job_id, slot, shape, color, (max_side, classifier) = message
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=base + slot * slot_bytes)
+            try:
+                detector = detectors.get(color)
+                if detector is None:
+                    detector = detectors[color] = build_detector(detector_name, color)
+                with traced() as trace:
+                    boxes, faces, scores = detect_and_classify(detector, frame, color, max_side, classifier)
+                spans = {name: total for name, (total, _) in trace.spans.items()}
+                conn.send((job_id, True, ([tuple(b) for b in boxes], faces, scores, spans)))
+            except Exception as e:
+                conn.send((job_id, False, f"{e.__class__.__name__}: {str(e)}"))
+            finally:
+                # A view precisa sumir antes do shm.close()
+                frame = None
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        shm.close()
+
+
+class _Job:
+    __slots__ = ("future", "slot", "shape", "source_shape", "color", "options", "sent", "retries")
+
+    def __init__(self, future, slot, shape, source_shape, color, options):
+        self.future = future
+        self.slot = slot
+        self.shape = shape
+        # Forma do frame de quem chamou: difere de shape quando _fit reduziu o frame
+        self.source_shape = source_shape
+        self.color = color
+        # (lado máximo da detecção, classificador), conforme o nível de degradação
+        self.options = options
+        self.sent = False
+        self.retries = 0
+
+
+def _source_boxes(job: _Job, boxes):
+    # Frame reduzido para caber no slot: caixas de volta ao frame de quem chamou,
+    # como o detect_faces faz com a redução da detecção
+    if job.shape == job.source_shape:
+        return boxes
+    sy = job.source_shape[0] / job.shape[0]
+    sx = job.source_shape[1] / job.shape[1]
+    return [
+        clip_box(FaceBox(int(b.x * sx), int(b.y * sy), int(b.w * sx), int(b.h * sy), b.score), job.source_shape, 0)
+        for b in boxes
+    ]
+
+
+class _Worker:
+    def __init__(self, index: int, slots: int):
+        self.index = index
+        self.free = collections.deque(range(slots))
+        self.jobs: Dict[int, _Job] = {}
+        self.process = None
+        self.conn = None
+        self.alive = False
+        self.started_at = 0.0
+
+
+class InferencePool:
+    """Pool de N processos de inferência com transporte de frames por memória compartilhada.
+
+    submit() devolve um concurrent.futures.Future com (caixas, recortes,
+    scores, tempos por estágio); analyze() e analyze_sync() já montam o
+    resultado no formato de pipeline.analyze_faces. Workers que caem são
+    reiniciados e os frames em voo reenviados.
+    """
+
+    def __init__(self, workers: int = INFERENCE_WORKERS, detector: str = "haar",
+                 slots: int = INFERENCE_SLOTS, slot_bytes: int = INFERENCE_SLOT_BYTES):
+        if workers <= 0:
+            raise ValueError("O pool precisa de pelo menos um worker")
+        self.detector = detector
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._ctx = multiprocessing.get_context("spawn")
+        self._shm = SharedMemory(create=True, size=workers * slots * slot_bytes)
+        self._workers = [_Worker(i, slots) for i in range(workers)]
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._closed = False
+        self._reader = None
+
+    @property
+    def size(self) -> int:
+        return len(self._workers)
+
+    def alive_workers(self) -> int:
+        return sum(1 for w in self._workers if w.alive)
+
+    def start(self):
+        with self._cond:
+            for worker in self._workers:
+                self._spawn(worker)
+        self._reader = threading.Thread(target=self._read_results, name="inference-pool-reader", daemon=True)
+        self._reader.start()
+        return self
+
+    def stop(self):
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            for worker in self._workers:
+                try:
+                    worker.conn.send(None)
+                except Exception:
+                    pass
+            self._cond.notify_all()
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(timeout=5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            for job in worker.jobs.values():
+                job.future.cancel()
+        if self._reader is not None:
+            self._reader.join(timeout=2)
+        self._shm.close()
+        self._shm.unlink()
+
+    def _spawn(self, worker: _Worker):
+        # Chamado com self._cond adquirido
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self._shm.name, worker.index * self.slots * self.slot_bytes,
+                  self.slot_bytes, self.detector),
+            name=f"inference-worker-{worker.index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker.process, worker.conn = process, parent_conn
+        worker.alive = True
+        worker.started_at = time.monotonic()
+        # Frames que estavam no worker anterior continuam no anel: reenvia
+        for job_id, job in list(worker.jobs.items()):
+            if job.sent:
+                self._send(worker, job_id, job)
+        self._cond.notify_all()
+
+    def _send(self, worker: _Worker, job_id: int, job: _Job):
+        # Mensagens pequenas e no máximo `slots` por worker: o send não bloqueia
+        job.sent = True
+        try:
+            worker.conn.send((job_id, job.slot, job.shape, job.color, job.options))
+        except (OSError, ValueError):
+            pass  # worker morrendo: o reinício reenvia
+
+    def _fit(self, frame: np.ndarray) -> np.ndarray:
+        if frame.nbytes <= self.slot_bytes:
+            return frame
+        scale = (self.slot_bytes / frame.nbytes) ** 0.5
+        h, w = frame.shape[:2]
+        return cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+    def submit(self, frame: np.ndarray, color: str = "bgr", block: bool = True,
+               timeout: Optional[float] = None, max_side: int = DETECTION_MAX_SIDE,
+               classifier: str = "full") -> Optional[concurrent.futures.Future]:
+        # Com block=False devolve None quando todos os anéis estão cheios
+        return self._submit(self._fit(frame), frame.shape, color, block, timeout, max_side, classifier)
+
+    def _submit(self, frame: np.ndarray, source_shape, color: str, block: bool, timeout: Optional[float],
+                max_side: int, classifier: str) -> Optional[concurrent.futures.Future]:
+        # frame já cabe no slot; as caixas voltam nas coordenadas de source_shape
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Pool de inferência encerrado")
+                candidates = [w for w in self._workers if w.alive and w.free]
+                if candidates:
+                    worker = max(candidates, key=lambda w: len(w.free))
+                    break
+                if not block:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            slot = worker.free.popleft()
+            job_id = next(self._ids)
+            job = _Job(concurrent.futures.Future(), slot, frame.shape, source_shape, color, (max_side, classifier))
+            worker.jobs[job_id] = job
+
+        # A cópia para o anel acontece fora do lock
+        offset = (worker.index * self.slots + slot) * self.slot_bytes
+        np.copyto(np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf, offset=offset), frame)
+
+        with self._cond:
+            if job_id in worker.jobs:
+                self._send(worker, job_id, job)
+        return job.future
+
+    def _read_results(self):
+        while not self._closed:
+            with self._cond:
+                conns = {w.conn: w for w in self._workers if w.alive}
+                sentinels = {w.process.sentinel: w for w in self._workers if w.alive}
+            if not conns:
+                time.sleep(0.05)
+                continue
+            ready = connection.wait(list(conns) + list(sentinels), timeout=0.5)
+            # Resultados primeiro: um worker pode responder e cair logo depois
+            for obj in ready:
+                if obj in conns:
+                    self._drain(conns[obj])
+            for obj in ready:
+                if obj in sentinels and not self._closed:
+                    self._handle_crash(sentinels[obj])
+
+    def _drain(self, worker: _Worker):
+        try:
+            while worker.conn.poll():
+                self._complete(worker, worker.conn.recv())
+        except (EOFError, OSError):
+            pass
+
+    def _complete(self, worker: _Worker, message):
+        job_id, ok, payload = message
+        with self._cond:
+            job = worker.jobs.pop(job_id, None)
+            if job is None:
+                return
+            worker.free.append(job.slot)
+            self._cond.notify()
+        if ok:
+            boxes, faces, scores, spans = payload
+            job.future.set_result((_source_boxes(job, [FaceBox(*b) for b in boxes]), faces, scores, spans))
+        else:
+            job.future.set_exception(RuntimeError(payload))
+
+    def _handle_crash(self, worker: _Worker):
+        self._drain(worker)
+        with self._cond:
+            if not worker.alive:
+                return
+            worker.alive = False
+            worker.conn.close()
+
+        # Fora do lock: o join pode levar até 1 s e os submit() não esperam por
+        # ele (o worker já está fora da escolha com alive=False)
+        worker.process.join(timeout=1)
+        exitcode = worker.process.exitcode
+        print(f"Worker de inferência {worker.index} caiu (código {exitcode}); reiniciando")
+        INFERENCE_WORKER_RESTARTS.inc()
+
+        with self._cond:
+            failed = []
+            for job_id, job in list(worker.jobs.items()):
+                if job.sent and job.retries >= INFERENCE_MAX_RETRIES:
+                    failed.append(worker.jobs.pop(job_id))
+                    worker.free.append(job.slot)
+                elif job.sent:
+                    job.retries += 1
+            fast_crash = time.monotonic() - worker.started_at < _FAST_CRASH_SECONDS
+
+        for job in failed:
+            job.future.set_exception(WorkerCrashed(f"Worker {worker.index} caiu durante a análise"))
+
+        def respawn():
+            with self._cond:
+                if not self._closed:
+                    self._spawn(worker)
+
+        if fast_crash:
+            threading.Timer(_RESTART_DELAY, respawn).start()
+        else:
+            respawn()
+
+    def finish(self, output, tracker=None) -> Dict:
+        boxes, faces, scores, spans = output
+        # Os estágios foram medidos no worker; registra aqui para o /metrics e o trace
+        for stage, seconds in spans.items():
+            observe_stage(stage, seconds)
+        FACES_PER_FRAME.observe(len(boxes))
+        return finish_result(boxes, faces, scores, tracker)
+
+    async def analyze(self, frame: np.ndarray, color: str = "bgr", tracker=None,
+                      max_side: int = DETECTION_MAX_SIDE, classifier: str = "full") -> Dict:
+        future = self.submit(frame, color, block=False, max_side=max_side, classifier=classifier)
+        if future is None:
+            # Anéis cheios: espera um slot sem travar o event loop. O frame
+            # costuma ser o buffer reutilizável do decode_frame, compartilhado
+            # pelas requisições do event loop; copia antes do await para outra
+            # requisição não sobrescrevê-lo antes da cópia para o anel
+            fitted = self._fit(frame)
+            future = await asyncio.to_thread(
+                self._submit, fitted.copy() if fitted is frame else fitted, frame.shape, color,
+                True, None, max_side, classifier
+            )
+        return self.finish(await asyncio.wrap_future(future), tracker)
+
+    def analyze_sync(self, frame: np.ndarray, color: str = "bgr", tracker=None,
+                     max_side: int = DETECTION_MAX_SIDE, classifier: str = "full") -> Dict:
+        future = self.submit(frame, color, max_side=max_side, classifier=classifier)
+        return self.finish(future.result(), tracker)
+
+
+def create_pool(detector: str = "haar", workers: int = INFERENCE_WORKERS) -> Optional[InferencePool]:
+    # None quando INFERENCE_WORKERS=0 (inferência no próprio processo)
+    if workers <= 0:
+        return None
+    pool = InferencePool(workers, detector).start()
+    INFERENCE_WORKERS_ALIVE.set_function(pool.alive_workers)
+    atexit.register(pool.stop)
+    print(f"Pool de inferência com {workers} workers ({detector})")
+    return pool
@@ -0,0 +1,131 @@
+import json
+import os
+import re
+import unicodedata
+from collections import deque
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto: str) -> str:
+    # Minúsculas e sem acentos: "Exausta" -> "exausta", "ódio" -> "odio"
+    return unicodedata.normalize("NFKD", texto.casefold()).encode("ascii", "ignore").decode("ascii")
+
+
+@lru_cache(maxsize=65536)
+def radical(palavra: str) -> str:
+    # Stemmer leve para português: remove plural e flexão de gênero
+    # (esgotados, esgotadas, esgotada -> esgotad; emoções -> emocao)
+    if len(palavra) > 4 and palavra.endswith(("oes", "aes")):
+        palavra = palavra[:-3] + "ao"
+    elif len(palavra) > 4 and palavra.endswith(("ais", "eis", "ois")):
+        palavra = palavra[:-2] + "l"
+    elif len(palavra) > 4 and palavra.endswith("res"):
+        palavra = palavra[:-2]
+    elif len(palavra) > 3 and palavra.endswith("s") and not palavra.endswith(("ss", "is", "us")):
+        palavra = palavra[:-1]
+    if len(palavra) > 3 and palavra[-1] in "aoe":
+        palavra = palavra[:-1]
+    return palavra
+
+
+def radicais(texto: str) -> List[str]:
+    return [radical(t) for t in _TOKEN.findall(normalizar(texto))]
+
+
+class KeywordMatcher:
+    """Autômato Aho-Corasick sobre radicais de palavras.
+
+    Cada termo do léxico (uma palavra ou uma expressão) vira uma sequência de
+    radicais; uma mensagem é classificada em uma única passada pelos seus
+    tokens, independentemente do tamanho do léxico.
+    """
+
+    def __init__(self, lexico: Dict[str, List[str]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, str, int]]] = [[]]
+        self.categorias = list(lexico)
+        for categoria, termos in lexico.items():
+            for termo in termos:
+                tokens = radicais(termo)
+                if tokens:
+                    self._adicionar(tokens, categoria, termo)
+        self._construir_falhas()
+
+    @classmethod
+    def from_file(cls, caminho: str) -> "KeywordMatcher":
+        with open(caminho, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def _adicionar(self, tokens: List[str], categoria: str, termo: str):
+        estado = 0
+        for token in tokens:
+            proximo = self._goto[estado].get(token)
+            if proximo is None:
+                proximo = len(self._goto)
+                self._goto[estado][token] = proximo
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            estado = proximo
+        if all(c != categoria for c, _, _ in self._out[estado]):
+            self._out[estado].append((categoria, termo, len(tokens)))
+
+    def _construir_falhas(self):
+        # Busca em largura: o link de falha de cada nó aponta para o maior sufixo que também é prefixo
+        fila = deque(self._goto[0].values())
+        while fila:
+            estado = fila.popleft()
+            for token, proximo in self._goto[estado].items():
+                fila.append(proximo)
+                falha = self._fail[estado]
+                while falha and token not in self._goto[falha]:
+                    falha = self._fail[falha]
+                self._fail[proximo] = self._goto[falha].get(token, 0)
+                # Herda as ocorrências do sufixo, mas só de categorias que o termo mais longo
+                # não cobre ("com raiva" e "raiva" contam uma vez só)
+                proprias = {c for c, _, _ in self._out[proximo]}
+                self._out[proximo] = self._out[proximo] + [
+                    o for o in self._out[self._fail[proximo]] if o[0] not in proprias
+                ]
+
+    def avancar(self, estado: int, token: str) -> Tuple[int, List[Tuple[str, str, int]]]:
+        # Uma transição do autômato para um radical; permite casar token a token (digitação)
+        while estado and token not in self._goto[estado]:
+            estado = self._fail[estado]
+        estado = self._goto[estado].get(token, 0)
+        return estado, self._out[estado]
+
+    def encontrar(self, texto: str) -> Iterator[Tuple[str, str, int]]:
+        # Gera (categoria, termo do léxico, posição do primeiro token) para cada ocorrência
+        estado = 0
+        for i, token in enumerate(radicais(texto)):
+            estado, saidas = self.avancar(estado, token)
+            for categoria, termo, n in saidas:
+                yield categoria, termo, i - n + 1
+
+    def contar(self, texto: str) -> Dict[str, int]:
+        contagem: Dict[str, int] = {}
+        for categoria, _, _ in self.encontrar(texto):
+            contagem[categoria] = contagem.get(categoria, 0) + 1
+        return contagem
+
+    @property
+    def tamanho(self) -> int:
+        return sum(len(out) for out in self._out)
+
+
+LEXICO_PADRAO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "lexico_comportamento.json")
+
+_matcher = None
+
+
+def get_matcher() -> KeywordMatcher:
+    # Compilado uma única vez a partir do léxico configurado
+    global _matcher
+    if _matcher is None:
+        _matcher = KeywordMatcher.from_file(os.getenv("LEXICO_COMPORTAMENTO", LEXICO_PADRAO))
+    return _matcher
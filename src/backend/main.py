@@ -1,15 +1,11 @@
 import base64
 import uuid
-import cv2
-from deepface import DeepFace
-from fastapi import FastAPI, File, HTTPException, Response, WebSocket, WebSocketDisconnect, status, Request, Query, UploadFile
+from fastapi import Depends, FastAPI, File, Header, HTTPException, Response, WebSocket, WebSocketDisconnect, status, Request, Query, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse, JSONResponse
-import numpy as np
+from fastapi.responses import RedirectResponse, JSONResponse, StreamingResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
 from pydantic import BaseModel, EmailStr, validator
 from typing import List, Optional, Dict, Any
-import psycopg2
-from psycopg2.extras import RealDictCursor
 import os
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
@@ -18,6 +14,19 @@ import httpx
 import jwt
 import secrets
 import asyncio
+import json
+import tempfile
+import shutil
+import time
+import threading
+from db import close_pool, get_db_connection
+from metrics import CONTENT_TYPE, MetricsMiddleware, observe_stage, render_latest
+from connections import registry
+from responses import CompressionMiddleware, FastJSONResponse, dumps
+from state_backend import StateError, get_state
+import maintenance
+from tracing import TracingMiddleware, span, traced
+import profiling
 
 # Carrega variáveis de ambiente
 
@@ -25,7 +34,7 @@ continuous_analysis_data = {}
 
 load_dotenv()
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 # Configura CORS
 app.add_middleware(
@@ -35,13 +44,59 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.include_router(profiling.router)
 
 # Configurações OAuth
 NEXT_PUBLIC_GOOGLE_CLIENT_ID = os.getenv("NEXT_PUBLIC_GOOGLE_CLIENT_ID")
 NEXT_PUBLIC_GOOGLE_CLIENT_SECRET = os.getenv("NEXT_PUBLIC_GOOGLE_CLIENT_SECRET")
 BASE_URL = os.getenv("BASE_URL", "http://localhost:3000")
-JWT_SECRET = os.getenv("JWT_SECRET", secrets.token_hex(32))
+# Sem JWT_SECRET, o primeiro worker gera o segredo e os demais (de todos os nós
+# com o mesmo STATE_BACKEND) usam o dele; em produção, configure JWT_SECRET.
+# Lido no primeiro uso: com o estado fora do ar a aplicação sobe e responde 503
+JWT_SECRET = os.getenv("JWT_SECRET") or None
 JWT_ALGORITHM = "HS256"
+_jwt_secret_lock = threading.Lock()
+
+def jwt_secret() -> str:
+    global JWT_SECRET
+    if JWT_SECRET is None:
+        with _jwt_secret_lock:
+            if JWT_SECRET is None:
+                try:
+                    JWT_SECRET = get_state().get_or_set("config:jwt_secret", lambda: secrets.token_hex(32))
+                except StateError as e:
+                    raise StateError(
+                        f"Segredo do JWT indisponível: configure JWT_SECRET ou verifique o servidor de estado ({str(e)})"
+                    ) from e
+    return JWT_SECRET
+
+@app.exception_handler(StateError)
+async def state_unavailable(request: Request, exc: StateError):
+    # Servidor de estado lento ou fora do ar: erro temporário, não falha da rota
+    print(f"Erro no estado compartilhado em {request.url.path}: {str(exc)}")
+    return JSONResponse(status_code=503, content={"message": "Estado compartilhado indisponível, tente novamente"})
+
+# Limites da análise de texto
+TEXT_BATCH_MAX = int(os.getenv("TEXT_BATCH_MAX", "1000"))
+TEXT_STREAM_CHUNK = int(os.getenv("TEXT_STREAM_CHUNK", "256"))
+TEXT_STREAM_SPOOL = int(os.getenv("TEXT_STREAM_SPOOL", str(8 * 1024 * 1024)))
+# Limites do corpo inteiro do /analyze/text/stream
+TEXT_STREAM_MAX_BYTES = int(os.getenv("TEXT_STREAM_MAX_BYTES", str(64 * 1024 * 1024)))
+TEXT_STREAM_MAX_LINES = int(os.getenv("TEXT_STREAM_MAX_LINES", "200000"))
+# Tamanho máximo do vídeo enviado ao /videos/analyze
+VIDEO_MAX_UPLOAD_BYTES = int(float(os.getenv("VIDEO_MAX_UPLOAD_MB", "500")) * 1024 * 1024)
+# Quem pode criar equipes (e-mails separados por vírgula); vazio desabilita as equipes
+TEAM_MANAGER_EMAILS = {e.strip().lower() for e in os.getenv("TEAM_MANAGER_EMAILS", "").split(",") if e.strip()}
+# Tempo sem mensagens até o /ws/text ser fechado (o /ws/analyze usa WS_IDLE_TIMEOUT)
+WS_TEXT_IDLE_TIMEOUT = float(os.getenv("WS_TEXT_IDLE_TIMEOUT", "600"))
+
+# A pilha de ML (OpenCV, TextBlob, DeepFace/TensorFlow) é importada só na
+# primeira rota de inferência; com PRELOAD_INFERENCE=true ela é carregada em
+# segundo plano logo na subida, sem atrasar as rotas de autenticação
+PRELOAD_INFERENCE = os.getenv("PRELOAD_INFERENCE", "false").lower() == "true"
 
 class EmotionAnalysisResult(BaseModel):
     emotions: Dict[str, float]
@@ -66,79 +121,93 @@ class PasswordChangeRequest(BaseModel):
             raise ValueError("As novas senhas não coincidem")
         return v
 
+def require_user(authorization: str = Header(None)) -> Dict[str, Any]:
+    # Payload do JWT em "Authorization: Bearer <token>"; rotas que gastam
+    # recursos do servidor ou expõem dados de usuários dependem dele
+    token = (authorization or "").replace("Bearer ", "")
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de autenticação não fornecido"
+        )
+    try:
+        return jwt.decode(token, jwt_secret(), algorithms=[JWT_ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token expirado"
+        )
+    except jwt.InvalidTokenError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token inválido"
+        )
 
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: list[WebSocket] = []
+def websocket_user(websocket: WebSocket) -> str:
+    # Dono da conexão no registro: o usuário do JWT em ?token= (o Dashboard
+    # envia) ou, sem token válido, o endereço do cliente, que só aparece nas
+    # estatísticas e não entra no limite por usuário
+    token = websocket.query_params.get("token")
+    if token:
+        try:
+            payload = jwt.decode(token, jwt_secret(), algorithms=[JWT_ALGORITHM])
+            return f"user:{payload['sub']}"
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    return f"ip:{websocket.client.host if websocket.client else 'desconhecido'}"
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+# Limpeza e compactação periódicas (maintenance.py), iniciadas com a aplicação
+maintenance.scheduler.add("reset_tokens", 3600, maintenance.purge_reset_tokens)
+maintenance.scheduler.add("stale_video_jobs", 600, maintenance.expire_stale_video_jobs)
+maintenance.scheduler.add("video_rollups", 3600, maintenance.rollup_video_timelines)
+maintenance.scheduler.add("video_timeline_cleanup", 3600, maintenance.purge_rolled_up_timelines)
+maintenance.scheduler.add("old_videos", 24 * 3600, maintenance.purge_old_videos)
+maintenance.scheduler.add("user_emotions_retention", 24 * 3600, maintenance.purge_old_user_emotions)
 
-    def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+def flush_user_emotions() -> int:
+    # Contagens por usuário do /ws/analyze acumuladas em memória (team_analytics.py)
+    from team_analytics import recorder
+    return recorder.flush()
 
-    async def send_json(self, data: dict, websocket: WebSocket):
-        try:
-            await websocket.send_json(data)
-        except Exception as e:
-            print(f"Erro ao enviar mensagem: {e}")
-            self.disconnect(websocket)
+maintenance.scheduler.add("user_emotions", float(os.getenv("EMOTION_FLUSH_SECONDS", "30")), flush_user_emotions)
 
-manager = ConnectionManager()
+@app.on_event("startup")
+async def start_maintenance():
+    maintenance.scheduler.start()
+    # Lê o segredo já na subida, fora do event loop; se o estado estiver fora
+    # do ar, as rotas com JWT respondem 503 até ele voltar
+    try:
+        await asyncio.to_thread(jwt_secret)
+    except StateError as e:
+        print(str(e))
 
-# Função para análise de emoções em uma imagem
-async def analyze_emotions(image_data: bytes) -> Dict:
-    await asyncio.sleep(0.1)  # Delay de 100ms
+@app.on_event("shutdown")
+async def stop_maintenance():
+    await maintenance.scheduler.stop()
     try:
-        # Converter bytes para numpy array
-        nparr = np.frombuffer(image_data, np.uint8)
-        
-        # Decodificar a imagem
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        if img is None:
-            return {
-                "emotions": {},
-                "dominant_emotion": "none",
-                "face_detected": False
-            }
-        
-        # Converter BGR para RGB (que o DeepFace espera)
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        
-        # Analisar emoções - forma correta de chamar o DeepFace
-        result = DeepFace.analyze(
-            img_path=img_rgb, 
-            actions=['emotion'],
-            enforce_detection=False,
-            detector_backend='opencv',
-            silent=True
-        )
-        
-        # Se múltiplos rostos, pegar o primeiro
-        if isinstance(result, list):
-            result = result[0]
-        
-        return {
-            "emotions": result["emotion"],
-            "dominant_emotion": result["dominant_emotion"],
-            "face_detected": True
-        }
-        
+        await asyncio.to_thread(flush_user_emotions)
     except Exception as e:
-        print(f"Erro na análise: {str(e)}")
-        return {
-            "emotions": {},
-            "dominant_emotion": "none",
-            "face_detected": False
-        }
+        print(f"Erro ao gravar contagens de emoção: {str(e)}")
+    close_pool()
+    get_state().close()
+
+def _preload_inference():
+    import inference
+    import text_analysis
+    inference.warm_up()
+
+if PRELOAD_INFERENCE:
+    threading.Thread(target=_preload_inference, daemon=True).start()
+
+async def analyze_emotions(image_data: bytes) -> Dict:
+    from inference import analyze_emotions as run_analysis
+    return await run_analysis(image_data)
 
 @app.post("/analyze/image")
 async def analyze_image(file: UploadFile = File(...)):
     try:
-        contents = await file.read()
+        with span("upload"):
+            contents = await file.read()
         result = await analyze_emotions(contents)
         
         if not result["face_detected"]:
@@ -152,6 +221,8 @@ async def analyze_image(file: UploadFile = File(...)):
             "result": result
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -160,62 +231,121 @@ async def analyze_image(file: UploadFile = File(...)):
     
 # Rota WebSocket para análise contínua
 @app.websocket("/ws/analyze")
-async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
+async def websocket_endpoint(websocket: WebSocket, track: bool = Query(False), trace: bool = Query(False),
+                             scene_threshold: float = Query(None, ge=0)):
+    from face_tracker import FaceTracker
+    from frame_decoder import FrameDecoder
+    from inference import analyze_frame_async
+    from overload import controller as overload
+    from scene_gate import SCENE_CHANGE_THRESHOLD, SceneChangeGate, jpeg_thumbnail
+    from ws_protocol import carry_forward, encode_result, negotiated_subprotocol, wants_binary
+
+    # O registro controla limites, heartbeat e conexões ociosas (connections.py)
+    conn = await registry.connect(
+        websocket, "/ws/analyze", websocket_user(websocket), subprotocol=negotiated_subprotocol(websocket)
+    )
+    if conn is None:
+        return
+    # Resultados em frames binários compactos quando o cliente negocia; JSON é o padrão
+    binary = wants_binary(websocket)
+    float16 = websocket.query_params.get("precision") == "float16"
+    decoder = FrameDecoder("bgr")
+    # Reidentificação entre frames só quando o cliente pede (?track=true)
+    tracker = FaceTracker() if track else None
+    last_analyzed = 0.0
+    # Frames sem mudança de cena repetem o último resultado (?scene_threshold=0 desliga)
+    gate = SceneChangeGate("/ws/analyze", SCENE_CHANGE_THRESHOLD if scene_threshold is None else scene_threshold)
+    last_sent = None
+    # Usuário autenticado: a emoção dominante de cada frame entra nas análises por equipe
+    recorder, user_id, last_dominant = None, None, None
+    if conn.user.startswith("user:") and conn.user[5:].isdigit():
+        from team_analytics import recorder
+        user_id = int(conn.user[5:])
     try:
         while True:
             try:
-                data = await asyncio.wait_for(websocket.receive_bytes(), timeout=10.0)
-                # Receber imagem como blob
-                image_data = await websocket.receive_bytes()
-                
-                # Converter para formato OpenCV
-                nparr = np.frombuffer(image_data, np.uint8)
-                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if img is None:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": "Não foi possível decodificar a imagem"
-                    })
+                # Receber imagem como blob; mensagens de texto (exceto pong) são ignoradas
+                message = await conn.receive()
+                image_data = message.get("bytes")
+                if image_data is None:
                     continue
+                received_at = time.perf_counter()
 
-                # Analisar emoções
-                try:
-                    results = DeepFace.analyze(
-                        img_path=img,
-                        actions=['emotion'],
-                        enforce_detection=False,
-                        detector_backend='opencv',
-                        silent=True
-                    )
-                    
-                    if isinstance(results, list):
-                        result = results[0]
+                # Sob carga cada sessão é analisada com menos frequência; o frame
+                # pulado recebe uma resposta própria para o cliente seguir enviando
+                level = overload.current()
+                if received_at - last_analyzed < level.min_interval:
+                    await conn.send_json({"type": "skipped", "degradation": level.level})
+                    continue
+                last_analyzed = received_at
+
+                thumb = jpeg_thumbnail(image_data) if gate.active else None
+                if last_sent is not None and not gate.check(thumb):
+                    if user_id is not None and last_dominant is not None:
+                        recorder.record(user_id, last_dominant)
+                    if binary:
+                        await conn.send_bytes(carry_forward(last_sent, level.level))
                     else:
-                        result = results
+                        await conn.send_text(dumps({"type": "analysis_result", "data": {
+                            **last_sent, "scene_unchanged": True, "degradation": level.level,
+                            "timestamp": datetime.now().isoformat()
+                        }}).decode())
+                    continue
+                
+                # Com ?trace=true cada resultado leva o tempo de cada estágio do frame
+                with traced(trace) as frame_trace:
+                    # Decodificar direto para o buffer reutilizável da conexão
+                    img = decoder.decode(image_data, level.decode_max_side)
+                    
+                    if img is None:
+                        await conn.send_json({
+                            "type": "error",
+                            "message": "Não foi possível decodificar a imagem"
+                        })
+                        continue
+
+                    # Analisar emoções; só um frame analisado com sucesso vira referência da cena
+                    try:
+                        result = await analyze_frame_async(img, tracker, level)
+                        gate.mark_analyzed(thumb)
+                        overload.observe(time.perf_counter() - received_at)
+                        result["degradation"] = level.level
+                        if user_id is not None and result['face_detected']:
+                            last_dominant = result['dominant_emotion']
+                            recorder.record(user_id, last_dominant)
+
+                        start = time.perf_counter()
+                        if binary:
+                            payload = encode_result(result, float16=float16)
+                            observe_stage("serialize", time.perf_counter() - start)
+                            await conn.send_bytes(payload)
+                            last_sent = payload
+                            if frame_trace is not None:
+                                # O formato binário é fixo: tempos vão numa mensagem de controle
+                                await conn.send_json({"type": "timings", "data": frame_trace.timings_ms()})
+                            continue
 
-                    await websocket.send_json({
-                        "type": "analysis_result",
-                        "data": {
-                            "emotions": result['emotion'],
+                        data = {
+                            "emotions": result['emotions'],
                             "dominant_emotion": result['dominant_emotion'],
+                            "face_detected": result['face_detected'],
+                            "faces": result['faces'],
+                            "degradation": level.level,
                             "timestamp": datetime.now().isoformat()
                         }
-                    })
-                    
-                except Exception as analysis_error:
-                    await websocket.send_json({
-                        "type": "error",
-                        "message": f"Erro na análise: {str(analysis_error)}"
-                    })
-            except asyncio.TimeoutError:
-                # Envia ping para verificar se a conexão está ativa
-                try:
-                    await websocket.send_json({"type": "ping"})
-                    continue
-                except:
-                    break
+                        if frame_trace is not None:
+                            data["timings"] = frame_trace.timings_ms()
+                        payload = dumps({"type": "analysis_result", "data": data}).decode()
+                        observe_stage("serialize", time.perf_counter() - start)
+                        await conn.send_text(payload)
+                        data.pop("timings", None)
+                        last_sent = data
+                        
+                    except Exception as analysis_error:
+                        await conn.send_json({
+                            "type": "error",
+                            "message": f"Erro na análise: {str(analysis_error)}"
+                        })
 
             except Exception as recv_error:
                 if isinstance(recv_error, WebSocketDisconnect):
@@ -227,12 +357,351 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         print(f"Erro na conexão WebSocket: {str(e)}")
     finally:
+        registry.disconnect(conn)
         try:
             await websocket.close(code=1000)
         except:
             pass
         print("Conexão WebSocket finalizada")
 
+class TextBatchRequest(BaseModel):
+    messages: List[str]
+
+    @validator('messages')
+    def batch_size_limit(cls, v):
+        if len(v) > TEXT_BATCH_MAX:
+            raise ValueError(f"Envie no máximo {TEXT_BATCH_MAX} mensagens por lote (use /analyze/text/stream)")
+        return v
+
+# Análise de texto em lote (ex.: histórico do ChatBot)
+@app.post("/analyze/text")
+async def analyze_text(batch: TextBatchRequest):
+    from text_analysis import analisar_lote, resumir
+    # TextBlob é CPU-bound: roda fora do event loop
+    results = await asyncio.to_thread(analisar_lote, batch.messages)
+    # Instância direta: até TEXT_BATCH_MAX resultados sem passar pelo jsonable_encoder
+    return FastJSONResponse({
+        "success": True,
+        "results": results,
+        "summary": resumir(results)
+    })
+
+def _parse_ndjson_message(line: bytes) -> Optional[str]:
+    # Cada linha é uma string JSON, um objeto {"text": "..."} ou texto puro;
+    # null, números e outros valores que não são texto são ignorados
+    try:
+        item = json.loads(line)
+    except json.JSONDecodeError:
+        return line.decode("utf-8", "replace").strip()
+    if isinstance(item, dict):
+        item = item.get("text")
+    return item if isinstance(item, str) else None
+
+# Versão em streaming para logs grandes: NDJSON na entrada e na saída
+@app.post("/analyze/text/stream")
+async def analyze_text_stream(request: Request):
+    from text_analysis import analisar_lote
+    # O corpo vai para um arquivo temporário (em memória até TEXT_STREAM_SPOOL bytes):
+    # o StreamingResponse não pode ler o corpo da requisição enquanto responde
+    spool = tempfile.SpooledTemporaryFile(max_size=TEXT_STREAM_SPOOL)
+    size = lines = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        lines += chunk.count(b"\n")
+        if size > TEXT_STREAM_MAX_BYTES or lines > TEXT_STREAM_MAX_LINES:
+            spool.close()
+            raise HTTPException(
+                status_code=413,
+                detail=f"Envie no máximo {TEXT_STREAM_MAX_LINES} linhas e {TEXT_STREAM_MAX_BYTES} bytes por requisição"
+            )
+        spool.write(chunk)
+    spool.seek(0)
+
+    async def ndjson_results():
+        try:
+            batch: List[str] = []
+            for line in spool:
+                text = _parse_ndjson_message(line) if line.strip() else None
+                if text is not None:
+                    batch.append(text)
+                if len(batch) >= TEXT_STREAM_CHUNK:
+                    for result in await asyncio.to_thread(analisar_lote, batch):
+                        yield json.dumps(result, ensure_ascii=False) + "\n"
+                    batch = []
+            if batch:
+                for result in await asyncio.to_thread(analisar_lote, batch):
+                    yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            spool.close()
+
+    return StreamingResponse(ndjson_results(), media_type="application/x-ndjson")
+
+# Análise incremental enquanto o usuário digita no ChatBot.
+# Mensagens: {"type": "input", "text": "..."}, {"type": "backspace", "count": 1} (count inteiro >= 1) e {"type": "reset"}
+@app.websocket("/ws/text")
+async def text_websocket(websocket: WebSocket):
+    from text_analysis import IncrementalTextAnalyzer
+    # Quem está só lendo a resposta pode ficar mais tempo sem digitar
+    conn = await registry.connect(websocket, "/ws/text", websocket_user(websocket), idle_timeout=WS_TEXT_IDLE_TIMEOUT)
+    if conn is None:
+        return
+    analyzer = IncrementalTextAnalyzer()
+    try:
+        while True:
+            try:
+                message = await conn.receive_json(timeout=analyzer.idle_timeout)
+            except asyncio.TimeoutError:
+                # Usuário parou de digitar: pontua a sentença pendente
+                events = await asyncio.to_thread(analyzer.tick)
+            else:
+                kind = message.get("type")
+                if kind == "input":
+                    events = await asyncio.to_thread(analyzer.feed, message.get("text", ""))
+                elif kind == "backspace":
+                    count = message.get("count")
+                    if isinstance(count, int) and not isinstance(count, bool) and count >= 1:
+                        events = analyzer.backspace(count)
+                    else:
+                        events = [{"type": "error", "message": "backspace exige 'count' inteiro maior que zero"}]
+                elif kind == "reset":
+                    analyzer.reset()
+                    events = [{"type": "estimate", **analyzer.estimate()}]
+                else:
+                    events = [{"type": "error", "message": f"Tipo de mensagem desconhecido: {kind}"}]
+
+            # Só a estimativa mais recente interessa ao cliente; sentenças vão todas
+            estimates = [e for e in events if e["type"] == "estimate"]
+            for event in events:
+                if event["type"] != "estimate":
+                    await conn.send_json(event)
+            if estimates:
+                await conn.send_json(estimates[-1])
+    except WebSocketDisconnect:
+        print("Cliente de texto desconectado")
+    except Exception as e:
+        print(f"Erro no WebSocket de texto: {str(e)}")
+    finally:
+        registry.disconnect(conn)
+
+# Análise offline de vídeos gravados: o arquivo vai para o disco e é processado
+# em segundo plano (video_analysis.py); o progresso e a linha do tempo por
+# segundo ficam no banco (emotion_store.py)
+def _copy_upload(src, dst, limit: int) -> bool:
+    # Copia em blocos de 1 MiB; False quando o arquivo passa do limite
+    copied = 0
+    while True:
+        block = src.read(1024 * 1024)
+        if not block:
+            return True
+        copied += len(block)
+        if copied > limit:
+            return False
+        dst.write(block)
+
+@app.post("/videos/analyze", status_code=status.HTTP_202_ACCEPTED)
+async def analyze_video_upload(request: Request, fps: Optional[float] = Query(None, gt=0, le=30),
+                               user: Dict[str, Any] = Depends(require_user)):
+    # O formulário é lido aqui, e não como parâmetro File: assim o token e o
+    # Content-Length são conferidos antes de o upload ir para o disco
+    from video_analysis import VIDEO_SAMPLE_FPS, start_video_job
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Vídeo maior que {VIDEO_MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+    )
+    declared = request.headers.get("content-length", "")
+    # Folga para os cabeçalhos do multipart
+    if declared.isdigit() and int(declared) > VIDEO_MAX_UPLOAD_BYTES + 64 * 1024:
+        raise too_large
+    form = await request.form(max_files=1)
+    try:
+        file = form.get("file")
+        if not isinstance(file, StarletteUploadFile):
+            raise HTTPException(status_code=422, detail="Envie o vídeo no campo 'file'")
+        suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
+        tmp = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        try:
+            with tmp:
+                # Sem Content-Length (upload em chunks) o limite vale na cópia
+                if not await asyncio.to_thread(_copy_upload, file.file, tmp, VIDEO_MAX_UPLOAD_BYTES):
+                    raise too_large
+            analysis_id = await asyncio.to_thread(
+                start_video_job, tmp.name, file.filename or "video", fps or VIDEO_SAMPLE_FPS, user_id=int(user["sub"])
+            )
+        except HTTPException:
+            os.remove(tmp.name)
+            raise
+        except ValueError as e:
+            os.remove(tmp.name)
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            os.remove(tmp.name)
+            print(f"Erro ao iniciar a análise de vídeo: {str(e)}")
+            raise HTTPException(status_code=500, detail="Erro ao iniciar a análise do vídeo")
+    finally:
+        await form.close()
+    return {"success": True, "analysis_id": analysis_id}
+
+async def load_own_video(analysis_id: int, user: Dict[str, Any]) -> Dict:
+    # Cada usuário só vê as próprias análises; as dos outros respondem 404
+    from emotion_store import get_video_analysis as load_analysis
+    analysis = await asyncio.to_thread(load_analysis, analysis_id)
+    if analysis is None or analysis["user_id"] != int(user["sub"]):
+        raise HTTPException(status_code=404, detail="Análise de vídeo não encontrada")
+    return analysis
+
+@app.get("/videos/{analysis_id}")
+async def get_video_analysis(analysis_id: int, user: Dict[str, Any] = Depends(require_user)):
+    return await load_own_video(analysis_id, user)
+
+@app.get("/videos/{analysis_id}/timeline")
+async def get_video_timeline(analysis_id: int, user: Dict[str, Any] = Depends(require_user)):
+    from emotion_store import get_video_rollups as load_rollups, get_video_timeline as load_timeline
+    analysis = await load_own_video(analysis_id, user)
+    response = {
+        "status": analysis["status"],
+        "progress": analysis["progress"],
+        "timeline": await asyncio.to_thread(load_timeline, analysis_id)
+    }
+    # Análises antigas têm a linha do tempo compactada por minuto (maintenance.py)
+    if analysis["rolled_up_at"] is not None:
+        response["rollups"] = await asyncio.to_thread(load_rollups, analysis_id)
+    # Até uma linha por segundo de vídeo: serializa direto com orjson
+    return FastJSONResponse(response)
+
+class ReportRequest(BaseModel):
+    # Contagens enviadas pelo Dashboard ou o id de uma análise de vídeo gravada
+    emotions: Optional[Dict[str, float]] = None
+    dominant_emotion: Optional[str] = None
+    total_frames: Optional[int] = None
+    video_id: Optional[int] = None
+
+    # O prompt é montado com estes campos: só as emoções conhecidas, já com o
+    # rótulo em português, entram nele
+    @validator('emotions')
+    def known_emotions(cls, v):
+        from emotion_model import canonical_emotion
+        if v is None:
+            return v
+        emotions = {}
+        for name, value in v.items():
+            label = canonical_emotion(name)
+            if label is None:
+                raise ValueError(f"Emoção desconhecida: '{name[:40]}'")
+            if not 0 <= value < float("inf"):
+                raise ValueError(f"Valor inválido para '{label}'")
+            emotions[label] = emotions.get(label, 0) + value
+        return emotions
+
+    # Placeholders do Dashboard ("Nenhuma", "none" de frames sem rosto) e
+    # valores desconhecidos viram None: a dominante sai das contagens
+    @validator('dominant_emotion')
+    def known_dominant(cls, v):
+        from emotion_model import canonical_emotion
+        return None if v is None else canonical_emotion(v)
+
+    @validator('total_frames')
+    def non_negative_total(cls, v):
+        if v is not None and v < 0:
+            raise ValueError("total_frames não pode ser negativo")
+        return v
+
+    @validator('video_id', always=True)
+    def source_required(cls, v, values):
+        if v is None and not values.get('emotions'):
+            raise ValueError("Informe 'emotions' ou 'video_id'")
+        return v
+
+# Relatório de IA gerado no servidor, em markdown, enviado à medida que é gerado.
+# Relatórios dos mesmos agregados saem do cache (X-Report-Cache: hit)
+@app.post("/reports")
+async def generate_report(request: ReportRequest, user: Dict[str, Any] = Depends(require_user)):
+    # Autenticado: cada relatório que não sai do cache gasta a chave do provedor
+    from reports import ReportError, normalize_aggregates, service
+
+    if request.video_id is not None:
+        from emotion_store import video_emotion_counts
+        await load_own_video(request.video_id, user)
+        counts = await asyncio.to_thread(video_emotion_counts, request.video_id)
+        if not counts:
+            raise HTTPException(status_code=404, detail="Análise de vídeo sem linha do tempo")
+        aggregates = normalize_aggregates(counts)
+    else:
+        aggregates = normalize_aggregates(request.emotions, request.dominant_emotion, request.total_frames)
+
+    # O primeiro pedaço sai antes da resposta: falha do provedor (ou
+    # REPORT_PROVIDER inválido, ao criá-lo) ainda vira 502
+    try:
+        cache_status = "hit" if service.cached(aggregates) is not None else "miss"
+        chunks = service.stream(aggregates)
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = ""
+    except (ReportError, httpx.HTTPError, ValueError) as e:
+        print(f"Erro ao gerar relatório: {str(e)}")
+        raise HTTPException(status_code=502, detail="Falha ao gerar o relatório")
+
+    async def markdown():
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(
+        markdown(),
+        media_type="text/markdown; charset=utf-8",
+        headers={"X-Report-Cache": cache_status, "Cache-Control": "no-store"}
+    )
+
+class TeamRequest(BaseModel):
+    name: str
+    user_ids: List[int] = []
+
+class TeamMembersRequest(BaseModel):
+    user_ids: List[int]
+
+async def load_managed_team(team_id: int, user: Dict[str, Any]) -> Dict:
+    # As análises expõem dados de cada membro: só o gestor da equipe acessa;
+    # para os outros a equipe não existe
+    from emotion_store import get_team
+    team = await asyncio.to_thread(get_team, team_id)
+    if team is None or team["manager_id"] != int(user["sub"]):
+        raise HTTPException(status_code=404, detail="Equipe não encontrada")
+    return team
+
+@app.post("/teams")
+async def create_team(request: TeamRequest, user: Dict[str, Any] = Depends(require_user)):
+    from emotion_store import create_team as store_team
+    if user.get("email", "").lower() not in TEAM_MANAGER_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Usuário sem permissão para criar equipes (veja TEAM_MANAGER_EMAILS)"
+        )
+    team_id = await asyncio.to_thread(store_team, request.name, request.user_ids, int(user["sub"]))
+    return {"id": team_id, "name": request.name, "members": len(set(request.user_ids))}
+
+@app.put("/teams/{team_id}/members")
+async def update_team_members(team_id: int, request: TeamMembersRequest,
+                              user: Dict[str, Any] = Depends(require_user)):
+    from emotion_store import set_team_members
+    from team_analytics import analytics
+    await load_managed_team(team_id, user)
+    if not await asyncio.to_thread(set_team_members, team_id, request.user_ids):
+        raise HTTPException(status_code=404, detail="Equipe não encontrada")
+    analytics.invalidate_team(team_id)
+    return {"id": team_id, "members": len(set(request.user_ids))}
+
+# Comparação entre os membros de uma equipe: participação e tendência de
+# estresse e membros fora da curva (z-score), por dia ou semana
+@app.get("/teams/{team_id}/analytics")
+async def team_analytics(team_id: int, days: int = Query(30, ge=1, le=365),
+                         bucket: str = Query("day", pattern="^(day|week)$"),
+                         user: Dict[str, Any] = Depends(require_user)):
+    from team_analytics import analytics
+    await load_managed_team(team_id, user)
+    result = await asyncio.to_thread(analytics.get, team_id, days, bucket)
+    if result is None:
+        raise HTTPException(status_code=404, detail="Equipe não encontrada")
+    return FastJSONResponse(result)
+
 class UserLogin(BaseModel):
     email: str
     password: str
@@ -273,20 +742,6 @@ def generate_image_hash(file: UploadFile) -> str:
     file.file.seek(0)  # Reset para reutilizar o conteúdo depois
     return hashlib.md5(content).hexdigest()    
 
-def get_db_connection():
-    try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            database=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            cursor_factory=RealDictCursor
-        )
-        return conn
-    except Exception as e:
-        print("Erro ao conectar ao banco de dados:", e)
-        raise
-
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
@@ -298,7 +753,7 @@ def create_jwt_token(user_data: Dict[str, Any]) -> str:
         "name": user_data["name"],
         "exp": expiration
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return jwt.encode(payload, jwt_secret(), algorithm=JWT_ALGORITHM)
 
 async def find_or_create_oauth_user(user_data: OAuthUser):
     conn = None
@@ -763,27 +1218,8 @@ async def handle_google_auth(request: Request):
         )
 
 @app.get("/auth/me")
-async def get_current_user(request: Request):
-    token = request.headers.get("Authorization", "").replace("Bearer ", "")
-    if not token:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token de autenticação não fornecido"
-        )
-    
-    try:
-        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return {"user": payload}
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token expirado"
-        )
-    except jwt.InvalidTokenError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token inválido"
-        )
+async def get_current_user(user: Dict[str, Any] = Depends(require_user)):
+    return {"user": user}
 
 @app.get("/users/")
 async def list_users():
@@ -795,7 +1231,7 @@ async def list_users():
         cur.execute("SELECT id, name, email, created_at FROM users ORDER BY created_at DESC")
         users = cur.fetchall()
         
-        return {"users": users}
+        return FastJSONResponse({"users": users})
         
     except Exception as e:
         print("Erro ao listar usuários:", e)
@@ -807,11 +1243,26 @@ async def list_users():
         if conn is not None:
             conn.close()
 
+
+# Conexões WebSocket abertas: usuário, tempo ocioso e bytes de cada uma
+@app.get("/admin/connections")
+async def list_connections(x_admin_token: str = Header(None)):
+    profiling.check_admin_token(x_admin_token)
+    return await asyncio.to_thread(registry.stats)
+
+@app.get("/admin/maintenance")
+async def maintenance_status(x_admin_token: str = Header(None)):
+    profiling.check_admin_token(x_admin_token)
+    return {"enabled": maintenance.MAINTENANCE_ENABLED, "jobs": maintenance.scheduler.status()}
     
 @app.get("/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", dependencies=[Depends(profiling.require_metrics_token)])
+async def metrics():
+    return Response(content=render_latest(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,297 @@
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from metrics import MAINTENANCE_ROWS, MAINTENANCE_RUNS
+
+# Manutenção em segundo plano dentro do processo da API: limpeza de tokens
+# vencidos, sessões paradas e dados antigos, e compactação da linha do tempo
+# dos vídeos em resumos por minuto. Tudo em lotes pequenos, cada um na sua
+# transação curta e com lock_timeout, para não segurar locks nas tabelas
+# usadas pelas rotas.
+
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "true").lower() == "true"
+# Linhas por lote e pausa entre lotes (limita a carga gerada no banco)
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", "500"))
+MAINTENANCE_BATCH_PAUSE = float(os.getenv("MAINTENANCE_BATCH_PAUSE", "0.2"))
+# Máximo de lotes por execução; o resto fica para a próxima
+MAINTENANCE_MAX_BATCHES = int(os.getenv("MAINTENANCE_MAX_BATCHES", "200"))
+# Lote que espera mais que isso por um lock desiste (e tenta na próxima execução)
+MAINTENANCE_LOCK_TIMEOUT_MS = int(os.getenv("MAINTENANCE_LOCK_TIMEOUT_MS", "2000"))
+MAINTENANCE_STATEMENT_TIMEOUT_MS = int(os.getenv("MAINTENANCE_STATEMENT_TIMEOUT_MS", "15000"))
+# Retenção
+RESET_TOKEN_GRACE_HOURS = float(os.getenv("RESET_TOKEN_GRACE_HOURS", "24"))
+VIDEO_STALE_HOURS = float(os.getenv("VIDEO_STALE_HOURS", "6"))
+# Na fila há tanto tempo, a análise foi perdida num reinício do processo
+VIDEO_QUEUED_STALE_HOURS = float(os.getenv("VIDEO_QUEUED_STALE_HOURS", "48"))
+VIDEO_RAW_RETENTION_DAYS = float(os.getenv("VIDEO_RAW_RETENTION_DAYS", "30"))
+VIDEO_RETENTION_DAYS = float(os.getenv("VIDEO_RETENTION_DAYS", "365"))
+USER_EMOTION_RETENTION_DAYS = float(os.getenv("USER_EMOTION_RETENTION_DAYS", "730"))
+
+
+class Job:
+    __slots__ = ("name", "interval", "fn", "next_run", "last_run", "last_rows", "last_error")
+
+    def __init__(self, name: str, interval: float, fn: Callable[[], int]):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        # Primeira execução espalhada: vários processos não começam juntos
+        self.next_run = time.monotonic() + random.uniform(5, min(60, interval))
+        self.last_run = None
+        self.last_rows = 0
+        self.last_error = None
+
+
+class MaintenanceScheduler:
+    """Executa tarefas periódicas, uma de cada vez, numa thread fora do event loop.
+
+    Cada tarefa devolve o número de linhas afetadas. Falhas são registradas
+    e a tarefa volta a rodar no próximo intervalo.
+    """
+
+    def __init__(self):
+        self.jobs: List[Job] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, name: str, interval: float, fn: Callable[[], int]):
+        self.jobs.append(Job(name, interval, fn))
+
+    def start(self):
+        if not MAINTENANCE_ENABLED or not self.jobs or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+        print(f"Manutenção agendada: {', '.join(job.name for job in self.jobs)}")
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            job = min(self.jobs, key=lambda j: j.next_run)
+            await asyncio.sleep(max(0.0, job.next_run - time.monotonic()))
+            await self.run_job(job)
+
+    async def run_job(self, job: Job):
+        start = time.perf_counter()
+        try:
+            rows = await asyncio.to_thread(job.fn)
+            job.last_rows, job.last_error = rows, None
+            MAINTENANCE_RUNS.labels(job=job.name, result="ok").inc()
+            MAINTENANCE_ROWS.labels(job=job.name).inc(rows)
+            if rows:
+                print(f"Manutenção {job.name}: {rows} linhas em {time.perf_counter() - start:.1f} s")
+        except Exception as e:
+            job.last_error = str(e)
+            MAINTENANCE_RUNS.labels(job=job.name, result="error").inc()
+            print(f"Erro na manutenção {job.name}: {str(e)}")
+        job.last_run = datetime.now()
+        job.next_run = time.monotonic() + job.interval
+
+    def status(self) -> List[Dict]:
+        now = time.monotonic()
+        return [
+            {
+                "job": job.name,
+                "interval_seconds": job.interval,
+                "last_run": job.last_run.isoformat() if job.last_run else None,
+                "last_rows": job.last_rows,
+                "last_error": job.last_error,
+                "next_run_in_seconds": round(max(0.0, job.next_run - now), 1)
+            }
+            for job in self.jobs
+        ]
+
+
+def _short_transaction(cur):
+    # Vale só para a transação atual: o pool devolve a conexão sem os limites
+    cur.execute("SET LOCAL lock_timeout = %s", (f"{MAINTENANCE_LOCK_TIMEOUT_MS}ms",))
+    cur.execute("SET LOCAL statement_timeout = %s", (f"{MAINTENANCE_STATEMENT_TIMEOUT_MS}ms",))
+
+
+def _try_job_lock(cur, name: str) -> bool:
+    # Com vários processos da API só um executa cada lote da mesma tarefa
+    cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked", (f"maintenance:{name}",))
+    return cur.fetchone()["locked"]
+
+
+def delete_in_batches(name: str, table: str, where: str, params: tuple = (),
+                      batch_size: int = MAINTENANCE_BATCH_SIZE) -> int:
+    # DELETE por ctid em lotes: cada lote trava poucas linhas por pouco tempo.
+    # `table` e `where` vêm só do código desta aplicação, nunca do usuário
+    from psycopg2 import errors
+    from db import get_db_connection
+
+    query = f"""
+        DELETE FROM {table}
+        WHERE ctid IN (SELECT ctid FROM {table} WHERE {where} LIMIT %s)
+    """
+    total = 0
+    for _ in range(MAINTENANCE_MAX_BATCHES):
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            _short_transaction(cur)
+            if not _try_job_lock(cur, name):
+                conn.rollback()
+                break
+            cur.execute(query, params + (batch_size,))
+            deleted = cur.rowcount
+            conn.commit()
+        except (errors.LockNotAvailable, errors.QueryCanceled):
+            conn.rollback()
+            print(f"Manutenção {name}: lote adiado (tabela {table} ocupada)")
+            break
+        finally:
+            conn.close()
+        total += deleted
+        if deleted < batch_size:
+            break
+        time.sleep(MAINTENANCE_BATCH_PAUSE)
+    return total
+
+
+def purge_reset_tokens() -> int:
+    # Tokens de redefinição vencidos (só eram apagados ao usar ou pedir outro)
+    cutoff = datetime.now() - timedelta(hours=RESET_TOKEN_GRACE_HOURS)
+    return delete_in_batches("reset_tokens", "password_reset_tokens", "expires_at < %s", (cutoff,))
+
+
+def expire_stale_video_jobs() -> int:
+    # Análises que ficaram em 'processing' (processo reiniciado no meio) viram erro.
+    # O prazo conta de quando a análise saiu da fila, não do envio
+    from db import get_db_connection
+    import emotion_store
+
+    emotion_store.ensure_schema()
+    now = datetime.now()
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        _short_transaction(cur)
+        cur.execute(
+            """
+            UPDATE video_analyses
+            SET status = 'error', error = 'Análise interrompida', finished_at = %s
+            WHERE (status = 'processing' AND COALESCE(started_at, created_at) < %s)
+               OR (status = 'queued' AND created_at < %s)
+            """,
+            (now, now - timedelta(hours=VIDEO_STALE_HOURS), now - timedelta(hours=VIDEO_QUEUED_STALE_HOURS))
+        )
+        updated = cur.rowcount
+        conn.commit()
+        return updated
+    finally:
+        conn.close()
+
+
+def _rollup_rows(rows: List[Dict]) -> List[tuple]:
+    # Segundos -> minutos; as médias são ponderadas pelo número de rostos
+    minutes: Dict[int, Dict] = {}
+    for row in rows:
+        m = minutes.setdefault(row["second"] // 60, {"seconds": 0, "samples": 0, "faces": 0, "sums": {}})
+        m["seconds"] += 1
+        m["samples"] += row["samples"]
+        m["faces"] += row["faces"]
+        for emotion, value in (row["emotions"] or {}).items():
+            m["sums"][emotion] = m["sums"].get(emotion, 0.0) + value * row["faces"]
+    result = []
+    for minute, m in sorted(minutes.items()):
+        emotions = {e: round(v / m["faces"], 2) for e, v in m["sums"].items()} if m["faces"] else {}
+        dominant = max(emotions, key=emotions.get) if emotions else None
+        result.append((minute, m["seconds"], m["samples"], m["faces"], dominant, emotions))
+    return result
+
+
+def rollup_video_timelines() -> int:
+    # Linhas por segundo de análises antigas viram resumos por minuto, uma
+    # análise por vez; devolve quantas análises foram compactadas. As linhas
+    # saem depois, em lotes (purge_rolled_up_timelines); até lá as leituras
+    # as ignoram pelo rolled_up_at, gravado na mesma transação dos resumos
+    from psycopg2.extras import Json, execute_values
+    from db import get_db_connection
+    import emotion_store
+
+    emotion_store.ensure_schema()
+    cutoff = datetime.now() - timedelta(days=VIDEO_RAW_RETENTION_DAYS)
+    conn = get_db_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id FROM video_analyses
+            WHERE status = 'done' AND rolled_up_at IS NULL AND finished_at < %s
+            ORDER BY id LIMIT 20
+            """,
+            (cutoff,)
+        )
+        pending = [row["id"] for row in cur.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+
+    total = 0
+    for analysis_id in pending:
+        rows = emotion_store.get_video_timeline(analysis_id)
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            _short_transaction(cur)
+            execute_values(
+                cur,
+                """
+                INSERT INTO video_emotion_rollups (analysis_id, minute, seconds, samples, faces, dominant_emotion, emotions)
+                VALUES %s
+                ON CONFLICT (analysis_id, minute) DO NOTHING
+                """,
+                [(analysis_id, *r[:5], Json(r[5])) for r in _rollup_rows(rows)]
+            )
+            cur.execute("UPDATE video_analyses SET rolled_up_at = %s WHERE id = %s", (datetime.now(), analysis_id))
+            conn.commit()
+        finally:
+            conn.close()
+        total += 1
+    return total
+
+
+def purge_rolled_up_timelines() -> int:
+    # Linhas por segundo de análises já compactadas; o que sobrar de uma
+    # execução interrompida sai na próxima
+    import emotion_store
+
+    emotion_store.ensure_schema()
+    return delete_in_batches(
+        "video_timeline", "video_emotion_timeline",
+        "analysis_id IN (SELECT id FROM video_analyses WHERE rolled_up_at IS NOT NULL)"
+    )
+
+
+def purge_old_videos() -> int:
+    # Análises (e, em cascata, linhas e resumos) além da retenção total; lotes
+    # menores porque cada análise leva junto as linhas dela
+    import emotion_store
+
+    emotion_store.ensure_schema()
+    cutoff = datetime.now() - timedelta(days=VIDEO_RETENTION_DAYS)
+    return delete_in_batches("video_analyses", "video_analyses", "created_at < %s", (cutoff,), batch_size=10)
+
+
+def purge_old_user_emotions() -> int:
+    # Contagens diárias por usuário (análises por equipe) além da retenção
+    import emotion_store
+
+    emotion_store.ensure_schema()
+    cutoff = datetime.now().date() - timedelta(days=USER_EMOTION_RETENTION_DAYS)
+    return delete_in_batches("user_emotions", "user_emotion_daily", "day < %s", (cutoff,))
+
+
+scheduler = MaintenanceScheduler()
@@ -0,0 +1,366 @@
+import contextvars
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import tracing
+
+# Métricas no formato de texto do Prometheus, sem dependências externas.
+# Registrar uma observação custa um bisect e duas somas sob um lock sem
+# disputa, barato o bastante para ficar ligado em produção.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Buckets (em segundos) pensados para estágios de 0,1 ms a alguns segundos
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(v: float) -> str:
+    v = float(v)
+    if v != v:
+        return "NaN"
+    if v in (float("inf"), float("-inf")):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(v) if not v.is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self._new_child()
+        REGISTRY.register(self)
+
+    def labels(self, *values, **kwargs):
+        key = tuple(str(kwargs[n]) for n in self.labelnames) if kwargs else tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _series(self):
+        if not self.labelnames:
+            return [((), self._default)]
+        return list(self._children.items())
+
+    def collect(self) -> List[str]:
+        help_text = self.documentation.replace("\\", "\\\\").replace("\n", "\\n")
+        lines = [f"# HELP {self.name} {help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self._series():
+            lines.extend(self._render(values, child))
+        return lines
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def _render(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "_lock", "_fn")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+        self._fn: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+
+    def set_function(self, fn: Callable[[], float]):
+        # Valor lido só na coleta (p.ex. uso do pool, taxa de acerto de cache)
+        self._fn = fn
+
+    def get(self) -> float:
+        if self._fn is not None:
+            try:
+                return float(self._fn())
+            except Exception:
+                return float("nan")
+        return self.value
+
+    @contextmanager
+    def track_inprogress(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def set(self, value: float):
+        self._default.set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default.dec(amount)
+
+    def set_function(self, fn: Callable[[], float]):
+        self._default.set_function(fn)
+
+    def track_inprogress(self):
+        return self._default.track_inprogress()
+
+    def _render(self, values, child):
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def _render(self, values, child):
+        lines = []
+        with child._lock:
+            counts = list(child.counts)
+            total_sum = child.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total_sum)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Métrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# Métricas compartilhadas pelo main.py e pelo emotion_server.py
+
+FRAME_STAGE_SECONDS = Histogram(
+    "emotion_frame_stage_seconds", "Tempo por frame em cada estágio do pipeline", ["stage"]
+)
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "emotion_inference_queue_depth", "Frames aguardando ou em análise"
+)
+INFERENCE_WORKERS_ALIVE = Gauge(
+    "emotion_inference_workers_alive", "Processos do pool de inferência em execução"
+)
+INFERENCE_WORKER_RESTARTS = Counter(
+    "emotion_inference_worker_restarts_total", "Reinícios de workers de inferência que caíram"
+)
+FACES_PER_FRAME = Histogram(
+    "emotion_faces_per_frame", "Rostos detectados por frame", buckets=(0, 1, 2, 4, 8, 16, 32)
+)
+WEBSOCKET_SESSIONS = Gauge(
+    "websocket_active_sessions", "Sessões WebSocket abertas", ["endpoint"]
+)
+WEBSOCKET_BYTES = Counter(
+    "websocket_bytes_total", "Bytes trafegados nas sessões WebSocket", ["endpoint", "direction"]
+)
+WEBSOCKET_CLOSED = Counter(
+    "websocket_server_closes_total", "Conexões WebSocket recusadas ou fechadas pelo servidor", ["endpoint", "reason"]
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds", "Latência das consultas ao banco por rota", ["route"]
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections", "Conexões do pool do banco", ["state"]
+)
+CACHE_HIT_RATIO = Gauge(
+    "cache_hit_ratio", "Taxa de acerto dos caches em memória", ["cache"]
+)
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Consultas aos caches da aplicação", ["cache", "result"]
+)
+DEGRADATION_LEVEL = Gauge(
+    "emotion_degradation_level", "Nível de degradação por sobrecarga (0 = normal, 3 = máximo)"
+)
+MAINTENANCE_RUNS = Counter(
+    "maintenance_runs_total", "Execuções das tarefas de manutenção", ["job", "result"]
+)
+MAINTENANCE_ROWS = Counter(
+    "maintenance_rows_total", "Linhas apagadas, atualizadas ou compactadas pela manutenção", ["job"]
+)
+SCENE_GATE_FRAMES = Counter(
+    "emotion_scene_gate_frames_total", "Frames analisados ou pulados pelo filtro de mudança de cena",
+    ["endpoint", "result"]
+)
+CONTINUOUS_ANALYSIS_ACTIVE = Gauge(
+    "emotion_continuous_analysis_active", "1 quando a captura contínua da câmera está ativa"
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds", "Latência das requisições HTTP por rota", ["route", "method"]
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    FRAME_STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    # Também entra no trace da requisição/frame atual, se houver
+    tracing.record(stage, seconds)
+
+
+def register_lru_cache(name: str, cached_fn):
+    # Expõe a taxa de acerto de uma função decorada com functools.lru_cache
+    def ratio():
+        info = cached_fn.cache_info()
+        total = info.hits + info.misses
+        return info.hits / total if total else 0.0
+    CACHE_HIT_RATIO.labels(cache=name).set_function(ratio)
+
+
+def record_cache(name: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=name, result="hit" if hit else "miss").inc()
+
+
+def counter_hit_ratio(name: str):
+    # Taxa de acerto calculada a partir de CACHE_REQUESTS, para caches próprios
+    hits = CACHE_REQUESTS.labels(cache=name, result="hit")
+    misses = CACHE_REQUESTS.labels(cache=name, result="miss")
+
+    def ratio():
+        total = hits.value + misses.value
+        return hits.value / total if total else 0.0
+    CACHE_HIT_RATIO.labels(cache=name).set_function(ratio)
+
+
+# Escopo ASGI da requisição atual (rótulo de rota para métricas do banco e traces)
+current_scope = contextvars.ContextVar("current_scope", default=None)
+
+
+def route_label(scope) -> str:
+    # Usa o template da rota (/teams/{team_id}) em vez do caminho concreto,
+    # para não criar uma série por URL
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    # Middleware ASGI puro (sem o custo do BaseHTTPMiddleware)
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if scope["type"] == "http":
+                HTTP_REQUEST_SECONDS.labels(route=route_label(scope), method=scope["method"]).observe(
+                    time.perf_counter() - start
+                )
+            current_scope.reset(token)
+
+
+def render_latest() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+from typing import Callable, List, NamedTuple
+
+from frame_decoder import MAX_DECODE_SIDE
+from metrics import DEGRADATION_LEVEL
+from preprocessing import DETECTION_MAX_SIDE
+
+# Latência de fila (chegada do frame até o resultado), em ms, acima da qual
+# o controlador sobe do nível i para o i+1
+OVERLOAD_THRESHOLDS_MS = [float(v) for v in os.getenv("OVERLOAD_THRESHOLDS_MS", "300,600,1200").split(",")]
+# Só desce de nível quando a latência fica abaixo desta fração do limiar do nível anterior
+OVERLOAD_RECOVER_RATIO = float(os.getenv("OVERLOAD_RECOVER_RATIO", "0.5"))
+# Tempo mínimo em um nível antes de subir / antes de descer
+OVERLOAD_STEP_UP_SECONDS = float(os.getenv("OVERLOAD_STEP_UP_SECONDS", "1"))
+OVERLOAD_COOLDOWN_SECONDS = float(os.getenv("OVERLOAD_COOLDOWN_SECONDS", "10"))
+# Parâmetros dos níveis degradados
+OVERLOAD_MIN_INTERVAL = float(os.getenv("OVERLOAD_MIN_INTERVAL", "0.5"))
+OVERLOAD_DECODE_SIDE = int(os.getenv("OVERLOAD_DECODE_SIDE", "640"))
+OVERLOAD_DETECTION_SIDE = int(os.getenv("OVERLOAD_DETECTION_SIDE", "320"))
+
+
+class Degradation(NamedTuple):
+    level: int
+    # Intervalo mínimo entre análises da mesma sessão (frames no meio são pulados)
+    min_interval: float
+    decode_max_side: int
+    detection_max_side: int
+    # "full", "light" (modelo leve, se configurado) ou "none" (só detecção)
+    classifier: str
+
+
+LEVELS = [
+    Degradation(0, 0.0, MAX_DECODE_SIDE, DETECTION_MAX_SIDE, "full"),
+    Degradation(1, OVERLOAD_MIN_INTERVAL, MAX_DECODE_SIDE, DETECTION_MAX_SIDE, "full"),
+    Degradation(2, OVERLOAD_MIN_INTERVAL, OVERLOAD_DECODE_SIDE, OVERLOAD_DETECTION_SIDE, "full"),
+    Degradation(3, OVERLOAD_MIN_INTERVAL * 2, OVERLOAD_DECODE_SIDE, OVERLOAD_DETECTION_SIDE, "light"),
+]
+
+
+class OverloadController:
+    """Escolhe o nível de degradação a partir da latência de fila dos frames.
+
+    A latência é suavizada por média móvel exponencial; o nível sobe um
+    degrau quando ela passa do limiar do nível atual e desce um degrau
+    quando fica bem abaixo do limiar anterior por OVERLOAD_COOLDOWN_SECONDS.
+    Sem frames por um cooldown inteiro, a carga é considerada zerada.
+    """
+
+    def __init__(self, thresholds_ms: List[float] = OVERLOAD_THRESHOLDS_MS,
+                 clock: Callable[[], float] = time.monotonic, alpha: float = 0.2):
+        self.thresholds = [t / 1000.0 for t in thresholds_ms][:len(LEVELS) - 1]
+        self.clock = clock
+        self.alpha = alpha
+        self.level = 0
+        self.latency = 0.0
+        self._changed_at = clock()
+        self._observed_at = clock()
+        self._lock = threading.Lock()
+        DEGRADATION_LEVEL.set_function(lambda: self.current().level)
+
+    def observe(self, seconds: float):
+        with self._lock:
+            now = self.clock()
+            self._observed_at = now
+            self.latency += self.alpha * (seconds - self.latency)
+            self._adjust(now)
+
+    def current(self) -> Degradation:
+        with self._lock:
+            now = self.clock()
+            if self.level and now - self._observed_at >= OVERLOAD_COOLDOWN_SECONDS:
+                # Ninguém enviando frames: zera a média para o nível poder descer
+                self.latency = 0.0
+                self._adjust(now)
+            return LEVELS[self.level]
+
+    def _adjust(self, now: float):
+        dwell = now - self._changed_at
+        if self.level < len(self.thresholds) and self.latency > self.thresholds[self.level]:
+            if dwell >= OVERLOAD_STEP_UP_SECONDS:
+                self._set_level(self.level + 1, now)
+        elif self.level > 0 and self.latency < self.thresholds[self.level - 1] * OVERLOAD_RECOVER_RATIO:
+            if dwell >= OVERLOAD_COOLDOWN_SECONDS:
+                self._set_level(self.level - 1, now)
+
+    def _set_level(self, level: int, now: float):
+        print(f"Degradação: nível {self.level} -> {level} (latência de fila {self.latency * 1000:.0f} ms)")
+        self.level = level
+        self._changed_at = now
+
+
+# Um controlador por processo, compartilhado por todas as sessões e rotas
+controller = OverloadController()
@@ -0,0 +1,103 @@
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from emotion_model import EMOTION_LABELS, classify_faces, get_light_classifier
+from face_tracker import FaceTracker
+from metrics import FACES_PER_FRAME, observe_stage
+from preprocessing import DETECTION_MAX_SIDE, Detector, FaceBox, crop_faces, detect_faces
+
+
+def empty_result() -> Dict:
+    return {
+        "emotions": {},
+        "dominant_emotion": "none",
+        "face_detected": False,
+        "faces": []
+    }
+
+
+def build_result(boxes: List[FaceBox], scores: np.ndarray, track_ids: Optional[List[int]] = None) -> Dict:
+    if not boxes:
+        return empty_result()
+
+    dominant = np.argmax(scores, axis=1)
+    faces = []
+    for i, box in enumerate(boxes):
+        face = {
+            "box": {"x": box.x, "y": box.y, "w": box.w, "h": box.h},
+            "emotions": dict(zip(EMOTION_LABELS, scores[i].tolist())),
+            "dominant_emotion": EMOTION_LABELS[dominant[i]]
+        }
+        if track_ids:
+            face["track_id"] = track_ids[i]
+        faces.append(face)
+
+    # Os campos do nível de cima descrevem o maior rosto, como antes do suporte a vários rostos
+    primary = max(range(len(boxes)), key=lambda i: boxes[i].w * boxes[i].h)
+    return {
+        "emotions": faces[primary]["emotions"],
+        "dominant_emotion": faces[primary]["dominant_emotion"],
+        "face_detected": True,
+        "faces": faces
+    }
+
+
+def detect_and_classify(detector: Detector, frame: np.ndarray, color: str = "bgr",
+                        max_side: int = DETECTION_MAX_SIDE,
+                        classifier: str = "full") -> Tuple[List[FaceBox], np.ndarray, Optional[np.ndarray]]:
+    # Detecção, recorte e classificação, sem montar o resultado: usado também
+    # pelos workers do inference_pool, que devolvem só caixas, recortes e scores.
+    # classifier: "full", "light" (modelo leve, se configurado) ou "none"
+    # (só detecção, scores None), conforme o nível de degradação
+    t0 = time.perf_counter()
+    boxes = [b for b in detect_faces(detector, frame, max_side) if b.w > 0 and b.h > 0]
+    t1 = time.perf_counter()
+    observe_stage("detect", t1 - t0)
+    FACES_PER_FRAME.observe(len(boxes))
+    if not boxes:
+        return boxes, np.empty((0, 0, 0), dtype=np.uint8), np.empty((0, len(EMOTION_LABELS)), dtype=np.float32)
+
+    faces = crop_faces(frame, boxes, color)
+    t2 = time.perf_counter()
+    observe_stage("crop", t2 - t1)
+
+    model = get_light_classifier() if classifier == "light" else None
+    if classifier == "none" or (classifier == "light" and model is None):
+        return boxes, faces, None
+
+    # Um único forward pass para todos os rostos do frame
+    scores = classify_faces(faces, model)
+    observe_stage("classify", time.perf_counter() - t2)
+    return boxes, faces, scores
+
+
+def finish_result(boxes: List[FaceBox], faces: np.ndarray, scores: Optional[np.ndarray],
+                  tracker: Optional[FaceTracker] = None) -> Dict:
+    if not boxes:
+        if tracker is not None:
+            tracker.update([])
+        return empty_result()
+    track_ids = tracker.update(boxes, faces) if tracker is not None else None
+    if scores is None:
+        return detection_only_result(boxes, track_ids)
+    return build_result(boxes, scores, track_ids)
+
+
+def detection_only_result(boxes: List[FaceBox], track_ids: Optional[List[int]] = None) -> Dict:
+    # Degradação máxima sem modelo leve: rostos localizados, emoções não classificadas
+    faces = []
+    for i, box in enumerate(boxes):
+        face = {"box": {"x": box.x, "y": box.y, "w": box.w, "h": box.h}, "emotions": {}, "dominant_emotion": "none"}
+        if track_ids:
+            face["track_id"] = track_ids[i]
+        faces.append(face)
+    return {"emotions": {}, "dominant_emotion": "none", "face_detected": True, "faces": faces}
+
+
+def analyze_faces(detector: Detector, frame: np.ndarray, color: str = "bgr",
+                  tracker: Optional[FaceTracker] = None, max_side: int = DETECTION_MAX_SIDE,
+                  classifier: str = "full") -> Dict:
+    boxes, faces, scores = detect_and_classify(detector, frame, color, max_side, classifier)
+    return finish_result(boxes, faces, scores, tracker)
@@ -0,0 +1,119 @@
+import os
+from typing import Callable, List, NamedTuple
+
+import cv2
+import numpy as np
+
+# Maior lado do frame usado na detecção; 0 desativa a redução
+DETECTION_MAX_SIDE = int(os.getenv("DETECTION_MAX_SIDE", "480"))
+# Lado da entrada do classificador de emoções (o modelo do DeepFace usa 48x48 em tons de cinza)
+CLASSIFIER_INPUT_SIZE = int(os.getenv("CLASSIFIER_INPUT_SIZE", "48"))
+# Margem extra em volta da caixa detectada, em fração do tamanho do rosto
+FACE_MARGIN = float(os.getenv("FACE_MARGIN", "0.1"))
+
+
+class FaceBox(NamedTuple):
+    x: int
+    y: int
+    w: int
+    h: int
+    score: float = 1.0
+
+
+# Um detector recebe o frame reduzido e devolve caixas em pixels desse frame
+Detector = Callable[[np.ndarray], List[FaceBox]]
+
+
+def mediapipe_detector(face_detector, color: str = "rgb") -> Detector:
+    # O MediaPipe espera RGB; frames BGR são convertidos já reduzidos
+    def detect(frame: np.ndarray) -> List[FaceBox]:
+        if color == "bgr":
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = face_detector.process(frame)
+        if not results.detections:
+            return []
+        h, w = frame.shape[:2]
+        boxes = []
+        for detection in results.detections:
+            bbox = detection.location_data.relative_bounding_box
+            boxes.append(FaceBox(
+                int(bbox.xmin * w), int(bbox.ymin * h),
+                int(bbox.width * w), int(bbox.height * h),
+                float(detection.score[0]) if detection.score else 1.0
+            ))
+        return boxes
+    return detect
+
+
+def haar_detector(cascade=None, color: str = "bgr") -> Detector:
+    # Mesmo classificador Haar usado pelo backend 'opencv' do DeepFace
+    if cascade is None:
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+    gray_code = cv2.COLOR_RGB2GRAY if color == "rgb" else cv2.COLOR_BGR2GRAY
+
+    def detect(frame: np.ndarray) -> List[FaceBox]:
+        gray = cv2.cvtColor(frame, gray_code)
+        faces = cascade.detectMultiScale(gray, 1.1, 10)
+        return [FaceBox(int(x), int(y), int(w), int(h)) for (x, y, w, h) in faces]
+    return detect
+
+
+def build_detector(name: str, color: str = "bgr") -> Detector:
+    # "mediapipe" (o mesmo do emotion_server.py) ou "haar"; usado pelos
+    # processos filhos, que montam o próprio detector
+    if name == "mediapipe":
+        import mediapipe as mp
+        face_detection = mp.solutions.face_detection.FaceDetection(min_detection_confidence=0.5)
+        return mediapipe_detector(face_detection, color)
+    return haar_detector(color=color)
+
+
+def downscale_for_detection(frame: np.ndarray, max_side: int = DETECTION_MAX_SIDE):
+    # Retorna o frame reduzido e a escala aplicada (1.0 quando já é pequeno)
+    h, w = frame.shape[:2]
+    side = max(h, w)
+    if max_side <= 0 or side <= max_side:
+        return frame, 1.0
+    scale = max_side / side
+    small = cv2.resize(frame, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_AREA)
+    return small, scale
+
+
+def detect_faces(detector: Detector, frame: np.ndarray, max_side: int = DETECTION_MAX_SIDE) -> List[FaceBox]:
+    # Detecta no frame reduzido e devolve as caixas nas coordenadas do frame original
+    small, scale = downscale_for_detection(frame, max_side)
+    boxes = detector(small)
+    if scale == 1.0:
+        return [clip_box(b, frame.shape) for b in boxes]
+    inv = 1.0 / scale
+    return [
+        clip_box(FaceBox(int(b.x * inv), int(b.y * inv), int(b.w * inv), int(b.h * inv), b.score), frame.shape)
+        for b in boxes
+    ]
+
+
+def clip_box(box: FaceBox, shape, margin: float = FACE_MARGIN) -> FaceBox:
+    h, w = shape[:2]
+    dx, dy = int(box.w * margin), int(box.h * margin)
+    x0, y0 = max(0, box.x - dx), max(0, box.y - dy)
+    x1, y1 = min(w, box.x + box.w + dx), min(h, box.y + box.h + dy)
+    return FaceBox(x0, y0, max(0, x1 - x0), max(0, y1 - y0), box.score)
+
+
+def crop_faces(frame: np.ndarray, boxes: List[FaceBox], color: str = "bgr",
+               size: int = CLASSIFIER_INPUT_SIZE) -> np.ndarray:
+    # Recorta cada rosto do frame em resolução cheia e redimensiona direto
+    # para a entrada do classificador: (N, size, size) em tons de cinza
+    gray_code = cv2.COLOR_RGB2GRAY if color == "rgb" else cv2.COLOR_BGR2GRAY
+    out = np.empty((len(boxes), size, size), dtype=np.uint8)
+    for i, b in enumerate(boxes):
+        # Reduz primeiro (recorte é só uma view) e converte para cinza depois, já pequeno
+        face = cv2.resize(frame[b.y:b.y + b.h, b.x:b.x + b.w], (size, size), interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(face, gray_code, dst=out[i])
+    return out
+
+
+def prepare_faces(detector: Detector, frame: np.ndarray, color: str = "bgr",
+                  max_side: int = DETECTION_MAX_SIDE, size: int = CLASSIFIER_INPUT_SIZE):
+    boxes = [b for b in detect_faces(detector, frame, max_side) if b.w > 0 and b.h > 0]
+    return boxes, crop_faces(frame, boxes, color, size)
@@ -0,0 +1,136 @@
+import asyncio
+import collections
+import cProfile
+import io
+import marshal
+import os
+import secrets
+import sys
+import threading
+import time
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+
+# Perfilamento sob demanda em produção, protegido por ADMIN_TOKEN (que também
+# protege as outras rotas /admin e o /metrics). Sem o token configurado essas
+# rotas ficam desligadas.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+_profile_lock = asyncio.Lock()
+
+
+class StackSampler:
+    """Amostra as pilhas de todas as threads em intervalo fixo.
+
+    O resultado sai no formato "folded" (uma pilha por linha, frames
+    separados por ';' e a contagem no fim), aceito direto pelo
+    flamegraph.pl, speedscope e inferno.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.counts = collections.Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, str(ident)))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.counts.most_common())
+
+
+def check_admin_token(token):
+    # Também usado pelas outras rotas /admin
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Rotas de administração desabilitadas (defina ADMIN_TOKEN)")
+    if not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token de administrador inválido")
+
+
+def require_metrics_token(x_admin_token: str = Header(None), authorization: str = Header(None)):
+    # Dependência do /metrics: o mesmo ADMIN_TOKEN, em X-Admin-Token ou como
+    # Authorization: Bearer (o "authorization" do scrape_config do Prometheus)
+    bearer = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    check_admin_token(x_admin_token or bearer)
+
+
+router = APIRouter()
+
+
+@router.post("/admin/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0),
+    mode: str = Query("sample"),
+    x_admin_token: str = Header(None)
+):
+    check_admin_token(x_admin_token)
+    if mode not in ("sample", "cprofile"):
+        raise HTTPException(status_code=400, detail="mode deve ser 'sample' ou 'cprofile'")
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="Já existe um perfilamento em andamento")
+
+    async with _profile_lock:
+        started = time.strftime("%Y%m%d-%H%M%S")
+        if mode == "sample":
+            # Todas as threads (event loop, to_thread, câmera contínua)
+            sampler = StackSampler()
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                await asyncio.to_thread(sampler.stop)
+            return Response(
+                content=sampler.folded(),
+                media_type="text/plain; charset=utf-8",
+                headers={
+                    "Content-Disposition": f'attachment; filename="profile-{started}.folded"',
+                    "X-Profile-Samples": str(sampler.samples)
+                }
+            )
+
+        # cProfile só enxerga a thread do event loop: útil para custo de
+        # serialização, validação e handlers síncronos
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.disable()
+        profiler.create_stats()
+        buffer = io.BytesIO()
+        # Mesmo formato do Profile.dump_stats (abre com pstats, snakeviz ou flameprof)
+        marshal.dump(profiler.stats, buffer)
+        return Response(
+            content=buffer.getvalue(),
+            media_type="application/octet-stream",
+            headers={"Content-Disposition": f'attachment; filename="profile-{started}.prof"'}
+        )
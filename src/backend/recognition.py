@@ -1,11 +1,9 @@
 from fastapi import FastAPI, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-import cv2
 import mediapipe as mp
-from deepface import DeepFace
-from io import BytesIO
-import numpy as np
-from PIL import Image
+from frame_decoder import decode_frame
+from pipeline import analyze_faces
+from preprocessing import mediapipe_detector
 
 app = FastAPI()
 
@@ -23,45 +21,29 @@ app.add_middleware(
 solucao_reconhecimento_rosto = mp.solutions.face_detection
 reconhecedor_rostos = solucao_reconhecimento_rosto.FaceDetection(min_detection_confidence=0.5)
 desenho = mp.solutions.drawing_utils
+detectar_rostos = mediapipe_detector(reconhecedor_rostos, "rgb")
 
 @app.post("/analyze-emotion/")
 async def analyze_emotion(file: UploadFile = File(...)):
     # Receber a imagem enviada
     img_bytes = await file.read()
-    img = Image.open(BytesIO(img_bytes))
-    frame = np.array(img)
 
-    # Converter para RGB (o OpenCV usa BGR)
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    # Detectar rostos
-    resultados = reconhecedor_rostos.process(rgb_frame)
+    # Decodificar uma única vez, já em RGB (ordem que o MediaPipe espera)
+    frame = decode_frame(img_bytes, "rgb")
     emotions = {}
-
-    if resultados.detections:
-        for rosto in resultados.detections:
-            # Extrair coordenadas do rosto detectado
-            bboxC = rosto.location_data.relative_bounding_box
-            h, w, _ = frame.shape
-            x, y, w_box, h_box = int(bboxC.xmin * w), int(bboxC.ymin * h), int(bboxC.width * w), int(bboxC.height * h)
-
-            # Cortar a região do rosto
-            if x >= 0 and y >= 0 and x + w_box <= w and y + h_box <= h:
-                rosto_cortado = frame[y:y + h_box, x:x + w_box]
-
-                try:
-                    # Usar DeepFace para detectar emoções
-                    analise = DeepFace.analyze(rosto_cortado, actions=['emotion'], enforce_detection=False)
-
-                    if isinstance(analise, list):
-                        emocao = analise[0]['dominant_emotion']
-                    else:
-                        emocao = analise['dominant_emotion']
-
-                    emotions[emocao] = emotions.get(emocao, 0) + 1  # Contar emoções detectadas
-
-                except Exception as e:
-                    print(f"Erro ao analisar o rosto: {str(e)}")
+    if frame is None:
+        return emotions
+
+    try:
+        # Detecção, recorte e classificação em lote pelo backend configurado
+        # (EMOTION_BACKEND), em vez de um DeepFace.analyze por rosto
+        resultado = analyze_faces(detectar_rostos, frame, "rgb")
+        for rosto in resultado["faces"]:
+            emocao = rosto["dominant_emotion"]
+            emotions[emocao] = emotions.get(emocao, 0) + 1  # Contar emoções detectadas
+
+    except Exception as e:
+        print(f"Erro ao analisar o rosto: {str(e)}")
 
     # Tradução de emoções para português
     traducao = {
@@ -1,31 +1,8 @@
-from pynput import keyboard
 from pynput.keyboard import Listener, Key
-from textblob import TextBlob
+from keyword_matcher import get_matcher
+from text_analysis import classificar_sentimento
 
 arrayOfPhrases = []
-palavras_chave = {
-    "agressivo": ["raiva", "ódio", "explodir"],
-    "burnout": ["cansado", "exausto", "esgotado"],
-    "triste": ["triste", "deprimido", "sozinho"]
-}
-
-def classificar_comportamento(palavra):
-    for comportamento, palavras in palavras_chave.items():
-        if palavra in palavras:
-            return comportamento
-    return "Comportamento não identificado"
-
-def classificar_sentimento(texto):
-    blob = TextBlob(texto)
-    sentimento = blob.sentiment.polarity
-    if sentimento < -0.5:
-        return "Agressivo"
-    elif -0.5 <= sentimento < 0:
-        return "Triste"
-    elif sentimento > 0.5:
-        return "Positivo"
-    else:
-        return "Neutro"
 
 def on_press(key):
     try:
@@ -34,11 +11,9 @@ def on_press(key):
             frase_completa = ''.join(arrayOfPhrases)
             print(f"Frase capturada: {frase_completa}")
             
-            # Classificação de comportamento
-            for palavra in frase_completa.split():
-                comportamento = classificar_comportamento(palavra)
-                if comportamento != "Comportamento não identificado":
-                    print(f"Comportamento identificado: {comportamento}")
+            # Classificação de comportamento (palavras e expressões do léxico)
+            for comportamento, termo, _ in get_matcher().encontrar(frase_completa):
+                print(f"Comportamento identificado: {comportamento} ({termo})")
             
             # Classificação de sentimento
             sentimento = classificar_sentimento(frase_completa)
@@ -58,6 +33,7 @@ def on_press(key):
         print("Encerrando o listener...")
         return False  # Encerra o listener
 
-# Inicia o listener para capturar as teclas pressionadas
-with Listener(on_press=on_press) as listener:
-    listener.join()
+if __name__ == "__main__":
+    # Inicia o listener para capturar as teclas pressionadas
+    with Listener(on_press=on_press) as listener:
+        listener.join()
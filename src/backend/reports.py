@@ -0,0 +1,253 @@
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+
+from metrics import counter_hit_ratio, record_cache
+
+# Relatórios de IA gerados no servidor a partir dos agregados de emoção.
+# O relatório é guardado por um digest dos agregados: o mesmo conjunto de
+# dados não gera uma nova chamada ao LLM enquanto o TTL não vence.
+
+# "openrouter" ou "local" (stub determinístico, sem rede, para testes)
+REPORT_PROVIDER = os.getenv("REPORT_PROVIDER", "openrouter").lower()
+REPORT_MODEL = os.getenv("REPORT_MODEL", "deepseek/deepseek-r1-0528:free")
+OPENROUTER_URL = os.getenv("OPENROUTER_URL", "https://openrouter.ai/api/v1/chat/completions")
+# A chave que antes ia no bundle do navegador vale como padrão
+OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY") or os.getenv("NEXT_PUBLIC_DEEPSEEK_API_KEY")
+REPORT_TIMEOUT = float(os.getenv("REPORT_TIMEOUT", "120"))
+REPORT_CACHE_TTL = float(os.getenv("REPORT_CACHE_TTL", "3600"))
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", "256"))
+# Pausa entre os pedaços do stub, para simular o streaming de um LLM
+REPORT_STUB_DELAY = float(os.getenv("REPORT_STUB_DELAY", "0.02"))
+
+PROMPT_TEMPLATE = """Com base nos seguintes dados de análise emocional:
+{emotions}
+
+Dominant emotion: {dominant}
+Total frames analyzed: {total}
+
+Por favor, gere um relatório detalhado em português com:
+1. Uma análise geral do estado emocional
+2. Insights sobre possíveis causas para as emoções predominantes
+3. Recomendações para melhorar o bem-estar emocional
+4. Observações relevantes sobre padrões detectados
+
+Formate a resposta em markdown com títulos e parágrafos bem estruturados."""
+
+
+class ReportError(RuntimeError):
+    pass
+
+
+def normalize_aggregates(emotions: Dict[str, float], dominant: Optional[str] = None,
+                         total: Optional[int] = None) -> Dict:
+    # Forma canônica: o digest não depende da ordem das chaves nem de 3 vs 3.0
+    emotions = {k: round(float(v), 4) for k, v in sorted(emotions.items())}
+    if dominant is None and emotions:
+        dominant = max(emotions, key=emotions.get)
+    if total is None:
+        total = int(sum(emotions.values()))
+    return {"emotions": emotions, "dominant_emotion": dominant, "total": total}
+
+
+def build_prompt(aggregates: Dict) -> str:
+    # Mesmo prompt que o Dashboard montava no navegador
+    return PROMPT_TEMPLATE.format(
+        emotions=json.dumps(aggregates["emotions"], indent=2, ensure_ascii=False),
+        dominant=aggregates["dominant_emotion"],
+        total=aggregates["total"]
+    )
+
+
+def report_digest(aggregates: Dict, provider: str, model: str) -> str:
+    payload = json.dumps([aggregates, provider, model], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ReportProvider(ABC):
+    name = "base"
+    model = ""
+
+    @abstractmethod
+    def stream(self, prompt: str, aggregates: Dict) -> AsyncIterator[str]:
+        ...
+
+
+class OpenRouterProvider(ReportProvider):
+    name = "openrouter"
+
+    def __init__(self, api_key: Optional[str] = OPENROUTER_API_KEY, model: str = REPORT_MODEL,
+                 url: str = OPENROUTER_URL, timeout: float = REPORT_TIMEOUT):
+        self.api_key = api_key
+        self.model = model
+        self.url = url
+        self.timeout = timeout
+
+    async def stream(self, prompt: str, aggregates: Dict) -> AsyncIterator[str]:
+        if not self.api_key:
+            raise ReportError("OPENROUTER_API_KEY não configurada")
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "X-Title": "EmotionTrack",
+            "Content-Type": "application/json"
+        }
+        body = {"model": self.model, "messages": [{"role": "user", "content": prompt}], "stream": True}
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            async with client.stream("POST", self.url, headers=headers, json=body) as response:
+                if response.status_code != 200:
+                    detail = (await response.aread()).decode("utf-8", "replace")[:200]
+                    raise ReportError(f"OpenRouter respondeu {response.status_code}: {detail}")
+                # Server-sent events: "data: {json}" por linha, terminando em "data: [DONE]"
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    try:
+                        chunk = json.loads(data)
+                    except json.JSONDecodeError:
+                        continue
+                    if "error" in chunk:
+                        raise ReportError(f"OpenRouter: {chunk['error']}")
+                    content = (chunk.get("choices") or [{}])[0].get("delta", {}).get("content")
+                    if content:
+                        yield content
+
+
+class LocalStubProvider(ReportProvider):
+    # Relatório montado só com os números, sem LLM: para desenvolvimento offline e testes
+    name = "local"
+    model = "stub"
+
+    def __init__(self, delay: float = REPORT_STUB_DELAY):
+        self.delay = delay
+
+    async def stream(self, prompt: str, aggregates: Dict) -> AsyncIterator[str]:
+        emotions = aggregates["emotions"]
+        total = sum(emotions.values()) or 1
+        ranking = sorted(emotions.items(), key=lambda item: item[1], reverse=True)
+        parts = [
+            "# Relatório de Análise Emocional\n\n",
+            "## Análise geral\n\n",
+            f"Foram analisados {aggregates['total']} frames. A emoção predominante foi "
+            f"**{aggregates['dominant_emotion']}**.\n\n",
+            "## Distribuição\n\n",
+        ]
+        parts += [f"- {emotion}: {count / total * 100:.1f}%\n" for emotion, count in ranking]
+        parts += [
+            "\n## Recomendações\n\n",
+            "Relatório gerado pelo provedor local (sem LLM); configure REPORT_PROVIDER=openrouter "
+            "para a análise completa.\n",
+        ]
+        for part in parts:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield part
+
+
+def create_provider(name: str = REPORT_PROVIDER) -> ReportProvider:
+    if name == "local":
+        return LocalStubProvider()
+    if name == "openrouter":
+        return OpenRouterProvider()
+    raise ValueError(f"Provedor de relatórios desconhecido: {name}")
+
+
+class TTLCache:
+    # LRU com validade por entrada; só é usado no event loop, sem lock
+    def __init__(self, maxsize: int = REPORT_CACHE_SIZE, ttl: float = REPORT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "collections.OrderedDict[str, Tuple[float, str]]" = collections.OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._items.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._items[key]
+            return None
+        self._items.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ReportService:
+    """Gera relatórios em streaming, com cache por digest dos agregados.
+
+    Pedidos iguais simultâneos não disparam duas gerações: o segundo espera
+    o primeiro terminar e recebe o texto completo de uma vez.
+    """
+
+    def __init__(self, provider: Optional[ReportProvider] = None, cache: Optional[TTLCache] = None):
+        self._provider = provider
+        self.cache = cache or TTLCache()
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    @property
+    def provider(self) -> ReportProvider:
+        if self._provider is None:
+            self._provider = create_provider()
+        return self._provider
+
+    def digest(self, aggregates: Dict) -> str:
+        return report_digest(aggregates, self.provider.name, self.provider.model)
+
+    def cached(self, aggregates: Dict) -> Optional[str]:
+        return self.cache.get(self.digest(aggregates))
+
+    async def stream(self, aggregates: Dict) -> AsyncIterator[str]:
+        key = self.digest(aggregates)
+        report = self.cache.get(key)
+        record_cache("report", report is not None)
+        if report is not None:
+            yield report
+            return
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            try:
+                yield await asyncio.shield(pending)
+                return
+            except Exception:
+                pass  # a geração original falhou: tenta de novo abaixo
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        parts = []
+        try:
+            async for chunk in self.provider.stream(build_prompt(aggregates), aggregates):
+                parts.append(chunk)
+                yield chunk
+            report = "".join(parts)
+            self.cache.set(key, report)
+            future.set_result(report)
+        except BaseException as e:
+            # Inclui o cliente desconectando no meio (GeneratorExit): nada vai para o cache
+            future.set_exception(ReportError(f"Geração interrompida: {e.__class__.__name__}"))
+            future.exception()  # marca como lida caso ninguém esteja esperando
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+
+counter_hit_ratio("report")
+service = ReportService()
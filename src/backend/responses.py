@@ -0,0 +1,200 @@
+import asyncio
+import decimal
+import gzip
+import os
+import zlib
+from typing import Any, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # sem orjson, o JSON padrão do FastAPI continua valendo
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Respostas JSON com orjson (classe padrão das apps) e compressão negociada
+# pelo Accept-Encoding (br ou gzip) para respostas acima de um tamanho mínimo.
+
+# Corpo menor que isso vai sem compressão (o cabeçalho gzip já custa ~20 bytes)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+# Qualidade baixa do brotli: respostas dinâmicas, comprimidas a cada requisição
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Corpos maiores que isso são comprimidos numa thread (linha do tempo de 1 h leva ~20 ms)
+COMPRESSION_THREAD_SIZE = int(os.getenv("COMPRESSION_THREAD_SIZE", str(256 * 1024)))
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                      "application/xml", "image/svg+xml")
+
+
+def _orjson_default(value: Any):
+    # Tipos que o orjson não conhece e que aparecem nas rotas (NUMERIC do Postgres, etc.)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    if hasattr(value, "dict"):
+        return value.dict()
+    raise TypeError(f"Tipo não serializável em JSON: {type(value).__name__}")
+
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_orjson_default, option=_ORJSON_OPTIONS)
+
+    class FastJSONResponse(JSONResponse):
+        """JSONResponse serializado com orjson (datetime, UUID e NumPy nativos).
+
+        Como classe padrão da app ela só troca o json.dumps final; rotas com
+        respostas grandes devolvem a instância diretamente para pular também
+        o jsonable_encoder do FastAPI.
+        """
+
+        def render(self, content: Any) -> bytes:
+            return dumps(content)
+else:
+    import json
+
+    def dumps(content: Any) -> bytes:
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+    FastJSONResponse = JSONResponse
+
+
+def parse_accept_encoding(header: str) -> List[Tuple[str, float]]:
+    encodings = []
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            encodings.append((name.strip().lower(), q))
+    return encodings
+
+
+def choose_encoding(header: Optional[str]) -> Optional[str]:
+    # br quando o cliente aceita e o módulo está instalado; senão gzip
+    if not header:
+        return None
+    listed = dict(parse_accept_encoding(header))
+    # "*" vale só para as codificações não listadas (RFC 9110): br;q=0 continua recusado
+    wildcard = listed.get("*", 0.0)
+    if brotli is not None and listed.get("br", wildcard) > 0:
+        return "br"
+    if listed.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        else:
+            # wbits 31 = container gzip
+            self._z = zlib.compressobj(COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        if self.encoding == "br":
+            out = self._br.process(data)
+            return out + (self._br.finish() if final else self._br.flush())
+        out = self._z.compress(data)
+        # Em streaming cada pedaço sai inteiro (sync flush), sem esperar o próximo
+        return out + self._z.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """Compressão br/gzip das respostas HTTP conforme o Accept-Encoding.
+
+    Respostas de um só corpo abaixo de COMPRESSION_MIN_SIZE, tipos não
+    compressíveis e respostas já codificadas passam direto. Respostas em
+    streaming (NDJSON, relatórios) são comprimidas pedaço a pedaço.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for name, value in scope.get("headers", []):
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        state = {"start": None, "compressor": None, "passthrough": False}
+
+        async def wrapped_send(message):
+            if message["type"] == "http.response.start":
+                # Segura o início até saber o tamanho do primeiro corpo
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            start = state["start"]
+            if start is not None:
+                state["start"] = None
+                headers = dict((k.lower(), v) for k, v in start.get("headers", []))
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                if (b"content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES)
+                        or (not more and len(body) < self.minimum_size)):
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                raw_headers = [(k, v) for k, v in start.get("headers", [])
+                               if k.lower() not in (b"content-length", b"vary")]
+                vary = headers.get(b"vary")
+                raw_headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+                raw_headers.append((b"content-encoding", encoding.encode()))
+                if not more:
+                    if len(body) >= COMPRESSION_THREAD_SIZE:
+                        body = await asyncio.to_thread(compress, body, encoding)
+                    else:
+                        body = compress(body, encoding)
+                    raw_headers.append((b"content-length", str(len(body)).encode()))
+                    await send({**start, "headers": raw_headers})
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                state["compressor"] = _Compressor(encoding)
+                await send({**start, "headers": raw_headers})
+
+            await send({
+                "type": "http.response.body",
+                "body": state["compressor"].compress(body, final=not more),
+                "more_body": more
+            })
+
+        await self.app(scope, receive, wrapped_send)
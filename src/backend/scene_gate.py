@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import cv2
+import numpy as np
+
+from metrics import SCENE_GATE_FRAMES
+
+# Filtro barato antes da análise contínua: compara uma miniatura em tons de
+# cinza do frame com a do último frame analisado. Detecção e classificação só
+# rodam quando a cena mudou o bastante ou passou o intervalo máximo; nos
+# outros frames o último resultado é repetido.
+
+SCENE_GATE_ENABLED = os.getenv("SCENE_GATE_ENABLED", "true").lower() == "true"
+# Diferença média absoluta de luminância (0-255) na miniatura que conta como mudança
+SCENE_CHANGE_THRESHOLD = float(os.getenv("SCENE_CHANGE_THRESHOLD", "3.0"))
+# Mesmo sem mudança, um frame é analisado a cada intervalo (segundos)
+SCENE_MAX_INTERVAL = float(os.getenv("SCENE_MAX_INTERVAL", "2.0"))
+# Largura da miniatura; a altura segue a proporção do frame
+SCENE_THUMB_WIDTH = int(os.getenv("SCENE_THUMB_WIDTH", "32"))
+
+_GRAY_CODES = {"bgr": cv2.COLOR_BGR2GRAY, "rgb": cv2.COLOR_RGB2GRAY}
+
+
+def _thumb_size(width: int, height: int, thumb_width: int):
+    return thumb_width, max(1, round(thumb_width * height / max(1, width)))
+
+
+def luminance_thumbnail(frame: np.ndarray, color: str = "bgr",
+                        thumb_width: int = SCENE_THUMB_WIDTH) -> np.ndarray:
+    # Reduz antes de converter: a conversão de cor roda em ~800 pixels, não no frame inteiro
+    small = cv2.resize(frame, _thumb_size(frame.shape[1], frame.shape[0], thumb_width),
+                       interpolation=cv2.INTER_AREA)
+    if small.ndim == 2:
+        return small
+    return cv2.cvtColor(small, _GRAY_CODES[color])
+
+
+def jpeg_thumbnail(data, thumb_width: int = SCENE_THUMB_WIDTH) -> Optional[np.ndarray]:
+    # Direto do JPEG em cinza e 1/8 da escala (só os coeficientes DC da DCT),
+    # sem a decodificação completa que só acontece se o frame for analisado
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if gray is None:
+        return None
+    return cv2.resize(gray, _thumb_size(gray.shape[1], gray.shape[0], thumb_width),
+                      interpolation=cv2.INTER_AREA)
+
+
+class SceneChangeGate:
+    """Decide, frame a frame, se a análise completa precisa rodar.
+
+    check() compara a miniatura com a referência (a do último frame
+    analisado) e conta o frame como pulado quando a cena não mudou;
+    mark_analyzed() troca a referência e só deve ser chamado depois que a
+    análise do frame terminou sem erro. threshold <= 0 desliga o filtro.
+    """
+
+    def __init__(self, endpoint: str, threshold: float = SCENE_CHANGE_THRESHOLD,
+                 max_interval: float = SCENE_MAX_INTERVAL, enabled: bool = SCENE_GATE_ENABLED):
+        self.endpoint = endpoint
+        self.threshold = threshold
+        self.max_interval = max_interval
+        self.enabled = enabled
+        self.reference: Optional[np.ndarray] = None
+        self.reference_at = 0.0
+        self.last_score: Optional[float] = None
+        self.frames = 0
+        self.analyzed = 0
+        self.skipped = 0
+        # A thread da câmera checa e o callback do pool marca
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        return self.enabled and self.threshold > 0
+
+    def check(self, thumb: Optional[np.ndarray], now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.frames += 1
+            reference = self.reference
+            if (not self.active or thumb is None or reference is None or reference.shape != thumb.shape
+                    or now - self.reference_at >= self.max_interval):
+                self.last_score = None
+                return True
+            self.last_score = float(cv2.absdiff(thumb, reference).mean())
+            if self.last_score >= self.threshold:
+                return True
+            self.skipped += 1
+        SCENE_GATE_FRAMES.labels(endpoint=self.endpoint, result="skipped").inc()
+        return False
+
+    def mark_analyzed(self, thumb: Optional[np.ndarray], now: Optional[float] = None):
+        with self._lock:
+            self.analyzed += 1
+            if thumb is not None:
+                self.reference = thumb
+                self.reference_at = time.monotonic() if now is None else now
+        SCENE_GATE_FRAMES.labels(endpoint=self.endpoint, result="analyzed").inc()
+
+    def reset(self):
+        with self._lock:
+            self.reference = None
+            self.last_score = None
+            self.frames = self.analyzed = self.skipped = 0
+
+    def configure(self, threshold: Optional[float] = None, max_interval: Optional[float] = None):
+        with self._lock:
+            if threshold is not None:
+                self.threshold = threshold
+            if max_interval is not None:
+                self.max_interval = max_interval
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": self.active,
+                "threshold": self.threshold,
+                "max_interval_seconds": self.max_interval,
+                "frames": self.frames,
+                "analyzed": self.analyzed,
+                "skipped": self.skipped,
+                # Frames sem análise nem pulo foram descartados (pool ocupado)
+                "skip_ratio": round(self.skipped / self.frames, 4) if self.frames else 0.0,
+                "last_score": None if self.last_score is None else round(self.last_score, 3)
+            }
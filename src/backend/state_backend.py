@@ -0,0 +1,499 @@
+import json
+import os
+import queue
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Estado compartilhado entre processos e máquinas: configuração que precisa
+# ser igual em todos (segredo do JWT), contadores de sessão e pub/sub para
+# avisos entre workers. "memory" mantém tudo no processo (um worker só, o
+# comportamento de antes); "redis" usa qualquer servidor que fale o
+# protocolo do Redis (Redis, Valkey ou o tools/kv_standin.py para testes).
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_URL = os.getenv("STATE_URL", "redis://localhost:6379/0")
+# Prefixo das chaves: várias instâncias da aplicação no mesmo servidor
+STATE_PREFIX = os.getenv("STATE_PREFIX", "emotiontrack:")
+STATE_TIMEOUT = float(os.getenv("STATE_TIMEOUT", "2"))
+STATE_POOL_SIZE = int(os.getenv("STATE_POOL_SIZE", "8"))
+
+# Identifica este processo nas chaves por worker (leases, snapshots)
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+Subscriber = Callable[[Dict], None]
+
+
+class StateError(RuntimeError):
+    pass
+
+
+class StateBackend(ABC):
+    """Operações de estado compartilhado usadas pela aplicação.
+
+    Valores e campos de hash são strings; contadores são campos de hash
+    inteiros. As mensagens de pub/sub são dicts (JSON no transporte) e os
+    callbacks rodam numa thread do backend, não no event loop.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None, only_if_absent: bool = False) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def set_if_equal(self, key: str, expected: str, value: str, ttl: Optional[float] = None) -> bool:
+        # Grava só se o valor atual ainda for `expected`, numa operação atômica
+        ...
+
+    @abstractmethod
+    def delete_if_equal(self, key: str, expected: str) -> bool:
+        ...
+
+    @abstractmethod
+    def incr(self, key: str, fields: Dict[str, int]) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    def hgetall(self, key: str) -> Dict[str, str]:
+        ...
+
+    @abstractmethod
+    def hset(self, key: str, fields: Dict[str, str]):
+        ...
+
+    @abstractmethod
+    def hdel(self, key: str, *fields: str):
+        ...
+
+    @abstractmethod
+    def publish(self, channel: str, message: Dict):
+        ...
+
+    @abstractmethod
+    def subscribe(self, channel: str, callback: Subscriber):
+        ...
+
+    def close(self):
+        pass
+
+    # Operações compostas, iguais para todos os backends
+
+    def get_or_set(self, key: str, factory: Callable[[], str]) -> str:
+        # O primeiro processo a gravar define o valor; os outros leem o dele
+        value = self.get(key)
+        if value is None:
+            self.set(key, factory(), only_if_absent=True)
+            value = self.get(key)
+        return value
+
+    def counters(self, key: str) -> Dict[str, int]:
+        return {field: int(value) for field, value in self.hgetall(key).items()}
+
+    def reset_counters(self, key: str, fields: Dict[str, int]):
+        self.delete(key)
+        if fields:
+            self.hset(key, {field: str(n) for field, n in fields.items()})
+
+    def get_json(self, key: str):
+        value = self.get(key)
+        return None if value is None else json.loads(value)
+
+    def set_json(self, key: str, value, ttl: Optional[float] = None):
+        self.set(key, json.dumps(value, separators=(",", ":")), ttl)
+
+
+class MemoryBackend(StateBackend):
+    # Tudo no processo; pub/sub entrega na hora, na thread de quem publica
+    name = "memory"
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self._values: Dict[str, Tuple[str, Optional[float]]] = {}
+        self._hashes: Dict[str, Dict[str, str]] = {}
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+        self._lock = threading.Lock()
+
+    def _current(self, key):
+        # Chamar com self._lock
+        item = self._values.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= self.clock():
+            del self._values[key]
+            return None
+        return value
+
+    def get(self, key):
+        with self._lock:
+            return self._current(key)
+
+    def set(self, key, value, ttl=None, only_if_absent=False):
+        with self._lock:
+            item = self._values.get(key)
+            if only_if_absent and item is not None and (item[1] is None or item[1] > self.clock()):
+                return False
+            self._values[key] = (value, None if ttl is None else self.clock() + ttl)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+            self._hashes.pop(key, None)
+
+    def set_if_equal(self, key, expected, value, ttl=None):
+        with self._lock:
+            if self._current(key) != expected:
+                return False
+            self._values[key] = (value, None if ttl is None else self.clock() + ttl)
+            return True
+
+    def delete_if_equal(self, key, expected):
+        with self._lock:
+            if self._current(key) != expected:
+                return False
+            del self._values[key]
+            return True
+
+    def incr(self, key, fields):
+        with self._lock:
+            h = self._hashes.setdefault(key, {})
+            result = {}
+            for field, amount in fields.items():
+                result[field] = int(h.get(field, "0")) + amount
+                h[field] = str(result[field])
+            return result
+
+    def hgetall(self, key):
+        with self._lock:
+            return dict(self._hashes.get(key, {}))
+
+    def hset(self, key, fields):
+        with self._lock:
+            self._hashes.setdefault(key, {}).update(fields)
+
+    def hdel(self, key, *fields):
+        with self._lock:
+            h = self._hashes.get(key, {})
+            for field in fields:
+                h.pop(field, None)
+
+    def publish(self, channel, message):
+        with self._lock:
+            callbacks = list(self._subscribers.get(channel, ()))
+        for callback in callbacks:
+            _deliver(channel, callback, message)
+
+    def subscribe(self, channel, callback):
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+
+def _deliver(channel: str, callback: Subscriber, message: Dict):
+    try:
+        callback(message)
+    except Exception as e:
+        print(f"Erro ao processar mensagem do canal {channel}: {str(e)}")
+
+
+class RespConnection:
+    # Uma conexão com o protocolo RESP2 (comandos como arrays de bulk strings)
+
+    def __init__(self, host: str, port: int, timeout: float, password: Optional[str] = None, db: int = 0):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.call("AUTH", password)
+        if db:
+            self.call("SELECT", db)
+
+    @staticmethod
+    def encode(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode("utf-8")
+            parts.append(b"$%d\r\n%s\r\n" % (len(data), data))
+        return b"".join(parts)
+
+    def read_reply(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Conexão com o servidor de estado fechada")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode("utf-8")
+        if kind == b"-":
+            raise StateError(rest.decode("utf-8"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            size = int(rest)
+            if size < 0:
+                return None
+            data = self.reader.read(size + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            size = int(rest)
+            return None if size < 0 else [self.read_reply() for _ in range(size)]
+        raise StateError(f"Resposta RESP inválida: {line[:20]!r}")
+
+    def call(self, *args):
+        self.sock.sendall(self.encode(*args))
+        return self.read_reply()
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        # Todos os comandos num envio só e as respostas na mesma ordem
+        self.sock.sendall(b"".join(self.encode(*c) for c in commands))
+        replies, error = [], None
+        for _ in commands:
+            # Lê todas as respostas mesmo com erro, para a conexão voltar ao pool em ordem
+            try:
+                replies.append(self.read_reply())
+            except StateError as e:
+                error = error or e
+                replies.append(None)
+        if error is not None:
+            raise error
+        return replies
+
+    def close(self):
+        try:
+            # shutdown acorda uma thread bloqueada na leitura (pub/sub); fechar
+            # o reader antes esperaria pelo lock que ela segura
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.reader.close()
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class RedisBackend(StateBackend):
+    """Backend em rede sobre o protocolo do Redis, sem dependências extras.
+
+    Comandos usam um pool pequeno de conexões (uma por thread em uso);
+    pub/sub usa uma conexão dedicada lida por uma thread que reconecta e
+    volta a assinar os canais se a conexão cair.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str = STATE_URL, prefix: str = STATE_PREFIX, timeout: float = STATE_TIMEOUT,
+                 pool_size: int = STATE_POOL_SIZE):
+        parsed = urlparse(url)
+        if parsed.scheme not in ("redis", "tcp"):
+            raise ValueError(f"URL de estado não suportada: {url}")
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.prefix = prefix
+        self.timeout = timeout
+        self._pool: "queue.LifoQueue[RespConnection]" = queue.LifoQueue(maxsize=pool_size)
+        self._subscribers: Dict[str, List[Subscriber]] = {}
+        self._sub_lock = threading.Lock()
+        self._sub_conn: Optional[RespConnection] = None
+        self._sub_thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _connect(self) -> RespConnection:
+        return RespConnection(self.host, self.port, self.timeout, self.password, self.db)
+
+    def _acquire(self) -> RespConnection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def _execute(self, commands: List[tuple]) -> list:
+        conn = None
+        try:
+            conn = self._acquire()
+            replies = conn.pipeline(commands)
+        except (OSError, ConnectionError) as e:
+            if conn is not None:
+                conn.close()
+            raise StateError(f"Servidor de estado indisponível: {str(e)}") from e
+        except StateError:
+            # Erro do comando: a conexão continua utilizável
+            self._release(conn)
+            raise
+        self._release(conn)
+        return replies
+
+    def _release(self, conn: RespConnection):
+        try:
+            self._pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def _call(self, *args):
+        return self._execute([args])[0]
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key):
+        return self._call("GET", self._key(key))
+
+    def set(self, key, value, ttl=None, only_if_absent=False):
+        args = ["SET", self._key(key), value]
+        if ttl is not None:
+            args += ["PX", max(1, int(ttl * 1000))]
+        if only_if_absent:
+            args.append("NX")
+        return self._call(*args) == "OK"
+
+    def delete(self, key):
+        self._call("DEL", self._key(key))
+
+    def _if_equal(self, key: str, expected: str, command: tuple) -> bool:
+        # WATCH + MULTI/EXEC: o EXEC não roda se outro processo mexer na chave depois do GET
+        full = self._key(key)
+        conn = None
+        try:
+            conn = self._acquire()
+            current = conn.pipeline([("WATCH", full), ("GET", full)])[1]
+            if current != expected:
+                conn.call("UNWATCH")
+                done = False
+            else:
+                done = conn.pipeline([("MULTI",), (command[0], full) + command[1:], ("EXEC",)])[2] is not None
+        except (OSError, ConnectionError) as e:
+            if conn is not None:
+                conn.close()
+            raise StateError(f"Servidor de estado indisponível: {str(e)}") from e
+        except StateError:
+            # Pode ter ficado um WATCH ou MULTI pendente: a conexão não volta ao pool
+            if conn is not None:
+                conn.close()
+            raise
+        self._release(conn)
+        return done
+
+    def set_if_equal(self, key, expected, value, ttl=None):
+        command = ("SET", value) if ttl is None else ("SET", value, "PX", max(1, int(ttl * 1000)))
+        return self._if_equal(key, expected, command)
+
+    def delete_if_equal(self, key, expected):
+        return self._if_equal(key, expected, ("DEL",))
+
+    def incr(self, key, fields):
+        full = self._key(key)
+        replies = self._execute([("HINCRBY", full, field, amount) for field, amount in fields.items()])
+        return dict(zip(fields, replies))
+
+    def hgetall(self, key):
+        flat = self._call("HGETALL", self._key(key)) or []
+        return dict(zip(flat[::2], flat[1::2]))
+
+    def hset(self, key, fields):
+        args = ["HSET", self._key(key)]
+        for field, value in fields.items():
+            args += [field, value]
+        self._call(*args)
+
+    def hdel(self, key, *fields):
+        if fields:
+            self._call("HDEL", self._key(key), *fields)
+
+    def publish(self, channel, message):
+        self._call("PUBLISH", self._key(channel), json.dumps(message, separators=(",", ":")))
+
+    def subscribe(self, channel, callback):
+        with self._sub_lock:
+            new_channel = channel not in self._subscribers
+            self._subscribers.setdefault(channel, []).append(callback)
+            if self._sub_thread is None:
+                self._sub_thread = threading.Thread(target=self._listen, name="state-pubsub", daemon=True)
+                self._sub_thread.start()
+            elif new_channel and self._sub_conn is not None:
+                try:
+                    self._sub_conn.sock.sendall(RespConnection.encode("SUBSCRIBE", self._key(channel)))
+                except OSError:
+                    pass  # a thread reconecta e assina todos os canais de novo
+
+    def _listen(self):
+        delay = 0.5
+        while not self._closed:
+            try:
+                conn = self._connect()
+                conn.sock.settimeout(None)
+                with self._sub_lock:
+                    self._sub_conn = conn
+                    channels = [self._key(c) for c in self._subscribers]
+                conn.sock.sendall(RespConnection.encode("SUBSCRIBE", *channels))
+                delay = 0.5
+                while True:
+                    reply = conn.read_reply()
+                    if not isinstance(reply, list) or len(reply) != 3 or reply[0] != "message":
+                        continue
+                    channel = reply[1][len(self.prefix):]
+                    try:
+                        message = json.loads(reply[2])
+                    except ValueError:
+                        continue
+                    with self._sub_lock:
+                        callbacks = list(self._subscribers.get(channel, ()))
+                    for callback in callbacks:
+                        _deliver(channel, callback, message)
+            except (OSError, ConnectionError, StateError) as e:
+                if self._closed:
+                    return
+                print(f"Pub/sub do estado desconectado ({str(e)}); reconectando em {delay:.1f} s")
+                time.sleep(delay)
+                delay = min(delay * 2, 10.0)
+            finally:
+                with self._sub_lock:
+                    if self._sub_conn is not None:
+                        self._sub_conn.close()
+                        self._sub_conn = None
+
+    def close(self):
+        self._closed = True
+        with self._sub_lock:
+            if self._sub_conn is not None:
+                self._sub_conn.close()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def create_backend(name: str = STATE_BACKEND) -> StateBackend:
+    if name == "memory":
+        return MemoryBackend()
+    if name == "redis":
+        return RedisBackend()
+    raise ValueError(f"Backend de estado desconhecido: {name}")
+
+
+_state: Optional[StateBackend] = None
+_state_lock = threading.Lock()
+
+
+def get_state() -> StateBackend:
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = create_backend()
+                print(f"Estado compartilhado: {_state.name} (worker {WORKER_ID})")
+    return _state
@@ -0,0 +1,385 @@
+import collections
+import os
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from emotion_model import EMOTION_TRANSLATION
+from metrics import counter_hit_ratio, record_cache
+from state_backend import StateError, get_state
+
+# Análises por equipe (participação de estresse, tendência e membros fora
+# da curva) calculadas com NumPy sobre as contagens diárias de cada usuário
+# (user_emotion_daily). A matriz de cada dia fica em cache por equipe; quando
+# chegam dados novos só os dias afetados são recarregados do banco, em todos
+# os workers (aviso por pub/sub do state_backend.py).
+
+EMOTION_ORDER = list(EMOTION_TRANSLATION)
+EMOTION_LABELS = [EMOTION_TRANSLATION[e] for e in EMOTION_ORDER]
+STRESS = EMOTION_ORDER.index("fear")
+_EMOTION_INDEX = {e: i for i, e in enumerate(EMOTION_ORDER)}
+
+TEAM_ANALYTICS_MAX_DAYS = int(os.getenv("TEAM_ANALYTICS_MAX_DAYS", "365"))
+# |z| a partir do qual um membro aparece como fora da curva
+TEAM_OUTLIER_Z = float(os.getenv("TEAM_OUTLIER_Z", "2.5"))
+TEAM_MAX_OUTLIERS = int(os.getenv("TEAM_MAX_OUTLIERS", "50"))
+# Membros com menos frames na janela ficam fora dos z-scores e das tendências
+TEAM_MIN_FRAMES = int(os.getenv("TEAM_MIN_FRAMES", "30"))
+# Equipes mantidas em cache (LRU)
+TEAM_CACHE_TEAMS = int(os.getenv("TEAM_CACHE_TEAMS", "32"))
+# Limite para dados que chegarem sem aviso (estado compartilhado fora do ar,
+# carga direta no banco): resultados e o dia corrente são recalculados, e os
+# membros relidos
+TEAM_RESULT_TTL = float(os.getenv("TEAM_RESULT_TTL", "60"))
+TEAM_MEMBERS_TTL = float(os.getenv("TEAM_MEMBERS_TTL", "300"))
+# Intervalo de gravação das contagens acumuladas em memória
+EMOTION_FLUSH_SECONDS = float(os.getenv("EMOTION_FLUSH_SECONDS", "30"))
+# Pares (usuário, dia) acumulados à espera do banco; com o banco fora do ar,
+# os pares novos além disso são descartados em vez de crescer sem limite
+EMOTION_PENDING_MAX_KEYS = int(os.getenv("EMOTION_PENDING_MAX_KEYS", "50000"))
+INVALIDATE_CHANNEL = "analytics:invalidate"
+
+
+def _round(value, digits=4):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def fold_weeks(days: List[date], counts: np.ndarray) -> Tuple[List[date], np.ndarray]:
+    # (U, D, E) por dia -> (U, W, E) por semana (segunda a domingo)
+    mondays = np.array([d.toordinal() - d.weekday() for d in days])
+    starts = np.flatnonzero(np.r_[True, mondays[1:] != mondays[:-1]])
+    return [date.fromordinal(int(mondays[i])) for i in starts], np.add.reduceat(counts, starts, axis=1)
+
+
+def trend_slopes(shares: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # Inclinação por mínimos quadrados de cada linha (N, B), por balde, usando
+    # só os baldes com peso > 0; NaN com menos de 3 pontos
+    mask = weights > 0
+    x = np.arange(shares.shape[1], dtype=np.float64)
+    n = mask.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        y = np.where(mask, shares, 0.0)
+        x_mean = (mask * x).sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        var = (dx * dx).sum(axis=1)
+        slopes = (dx * (y - y_mean[:, None])).sum(axis=1) / var
+    slopes[(n < 3) | (var == 0)] = np.nan
+    return slopes
+
+
+def zscores(values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    sample = values[valid]
+    if sample.size >= 3:
+        std = sample.std()
+        if std > 0:
+            out[valid] = (sample - sample.mean()) / std
+    return out
+
+
+def compute_analytics(user_ids: np.ndarray, days: List[date], counts: np.ndarray, bucket: str = "day",
+                      z_threshold: float = TEAM_OUTLIER_Z, min_frames: int = TEAM_MIN_FRAMES) -> Dict:
+    """Agregados da equipe a partir de counts (usuários, dias, emoções).
+
+    Participação de cada emoção, série e tendência da participação de
+    estresse (inclinação por balde) e membros fora da curva por z-score
+    da participação de estresse e da tendência individual.
+    """
+    if bucket == "week":
+        starts, counts = fold_weeks(days, counts)
+    else:
+        starts = days
+    user_bucket_frames = counts.sum(axis=2)
+    user_totals = counts.sum(axis=1)
+    user_frames = user_totals.sum(axis=1)
+    team_bucket = counts.sum(axis=0)
+    team_bucket_frames = team_bucket.sum(axis=1)
+    team_totals = team_bucket.sum(axis=0)
+    total = int(team_totals.sum())
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        user_stress = user_totals[:, STRESS] / user_frames
+        user_bucket_stress = counts[:, :, STRESS] / user_bucket_frames
+        team_bucket_stress = team_bucket[:, STRESS] / team_bucket_frames
+
+    active = user_frames >= min_frames
+    user_trend = trend_slopes(user_bucket_stress, user_bucket_frames * active[:, None])
+    team_trend = trend_slopes(team_bucket_stress[None, :], team_bucket_frames[None, :])[0]
+
+    outliers = []
+    for metric, values, z in (
+        ("stress_share", user_stress, zscores(user_stress, active)),
+        ("stress_trend", user_trend, zscores(user_trend, active & ~np.isnan(user_trend))),
+    ):
+        for i in np.flatnonzero(np.abs(np.nan_to_num(z)) >= z_threshold):
+            outliers.append({"user_id": int(user_ids[i]), "metric": metric,
+                             "value": _round(values[i]), "z": _round(z[i], 2)})
+    outliers.sort(key=lambda o: abs(o["z"]), reverse=True)
+
+    active_stress = user_stress[active]
+    return {
+        "bucket": bucket,
+        "start": days[0].isoformat(),
+        "end": days[-1].isoformat(),
+        "members": int(len(user_ids)),
+        "active_members": int(active.sum()),
+        "frames": total,
+        "emotions": {label: _round(team_totals[i] / total) if total else 0.0
+                     for i, label in enumerate(EMOTION_LABELS)},
+        "stress_share": _round(team_totals[STRESS] / total) if total else None,
+        "stress_trend": _round(team_trend, 6),
+        "member_stress": {
+            "mean": _round(active_stress.mean()),
+            "std": _round(active_stress.std()),
+            "p50": _round(np.percentile(active_stress, 50)),
+            "p90": _round(np.percentile(active_stress, 90)),
+        } if active_stress.size else None,
+        "series": [
+            {"start": start.isoformat(), "frames": int(frames), "stress_share": _round(share)}
+            for start, frames, share in zip(starts, team_bucket_frames.tolist(), team_bucket_stress)
+        ],
+        "outliers": outliers[:TEAM_MAX_OUTLIERS],
+    }
+
+
+class TeamSeries:
+    __slots__ = ("user_ids", "days", "dirty", "results", "version", "loaded_at", "today_loaded_at", "lock")
+
+    def __init__(self, user_ids: List[int], loaded_at: float):
+        self.user_ids = np.asarray(sorted(user_ids), dtype=np.int64)
+        # dia -> matriz (usuários, emoções) de contagens
+        self.days: Dict[date, np.ndarray] = {}
+        # Dias com dados novos desde a carga
+        self.dirty: Set[date] = set()
+        # (dias, balde, fim) -> (calculado em, resultado)
+        self.results: Dict[tuple, Tuple[float, Dict]] = {}
+        self.version = 0
+        self.loaded_at = loaded_at
+        self.today_loaded_at = 0.0
+        # Uma carga/cálculo por equipe de cada vez
+        self.lock = threading.Lock()
+
+
+class TeamAnalytics:
+    """Cache por equipe e por dia das contagens, com invalidação incremental.
+
+    invalidate_user() marca só os dias em que o usuário recebeu dados novos,
+    nas equipes dele que estão em cache; a próxima consulta recarrega esses
+    dias do banco e refaz o cálculo vetorizado. As funções de carga podem
+    ser trocadas (testes e benchmarks sem banco).
+    """
+
+    def __init__(self, load_members: Optional[Callable[[int], Optional[List[int]]]] = None,
+                 load_days: Optional[Callable[[int, List[date]], List[Dict]]] = None,
+                 max_teams: int = TEAM_CACHE_TEAMS, clock: Callable[[], float] = time.monotonic):
+        self._load_members = load_members
+        self._load_days = load_days
+        self.max_teams = max_teams
+        self.clock = clock
+        self._teams: "collections.OrderedDict[int, TeamSeries]" = collections.OrderedDict()
+        self._user_teams: Dict[int, Set[int]] = {}
+        self._lock = threading.Lock()
+
+    def _members(self, team_id: int) -> Optional[List[int]]:
+        if self._load_members is not None:
+            return self._load_members(team_id)
+        from emotion_store import get_team_members
+        return get_team_members(team_id)
+
+    def _rows(self, team_id: int, days: List[date]) -> List[Dict]:
+        if self._load_days is not None:
+            return self._load_days(team_id, days)
+        from emotion_store import load_team_daily
+        return load_team_daily(team_id, days)
+
+    def _series(self, team_id: int) -> Optional[TeamSeries]:
+        with self._lock:
+            series = self._teams.get(team_id)
+            if series is not None and self.clock() - series.loaded_at < TEAM_MEMBERS_TTL:
+                self._teams.move_to_end(team_id)
+                return series
+        members = self._members(team_id)
+        with self._lock:
+            if series is not None and members is not None and sorted(members) == series.user_ids.tolist():
+                # Mesmos membros: mantém os dias já carregados
+                series.loaded_at = self.clock()
+                return series
+            self._drop(team_id)
+            if members is None:
+                return None
+            series = TeamSeries(members, self.clock())
+            self._teams[team_id] = series
+            for user_id in members:
+                self._user_teams.setdefault(user_id, set()).add(team_id)
+            while len(self._teams) > self.max_teams:
+                self._drop(next(iter(self._teams)))
+            return series
+
+    def _drop(self, team_id: int):
+        series = self._teams.pop(team_id, None)
+        if series is None:
+            return
+        for user_id in series.user_ids.tolist():
+            teams = self._user_teams.get(user_id)
+            if teams is not None:
+                teams.discard(team_id)
+                if not teams:
+                    del self._user_teams[user_id]
+
+    def invalidate_user(self, user_id: int, day: date):
+        with self._lock:
+            for team_id in self._user_teams.get(user_id, ()):
+                series = self._teams[team_id]
+                series.dirty.add(day)
+                series.results.clear()
+                series.version += 1
+
+    def invalidate_team(self, team_id: int):
+        # Membros alterados: a equipe sai do cache e é recarregada na próxima consulta
+        with self._lock:
+            self._drop(team_id)
+
+    def _load(self, team_id: int, series: TeamSeries, days: List[date]):
+        rows = self._rows(team_id, days)
+        n_users, n_emotions = len(series.user_ids), len(EMOTION_ORDER)
+        stacked = np.zeros((len(days), n_users, n_emotions), dtype=np.int32)
+        if rows and n_users:
+            user_ids = np.fromiter((r["user_id"] for r in rows), np.int64, len(rows))
+            positions = np.searchsorted(series.user_ids, user_ids)
+            clipped = np.minimum(positions, n_users - 1)
+            # Usuários que entraram na equipe depois da carga dos membros ficam de fora
+            known = series.user_ids[clipped] == user_ids
+            day_index = {d: i for i, d in enumerate(days)}
+            day_positions = np.fromiter((day_index[r["day"]] for r in rows), np.int64, len(rows))
+            counts = np.array([r["counts"] for r in rows], dtype=np.int32).reshape(len(rows), n_emotions)
+            stacked[day_positions[known], clipped[known]] = counts[known]
+        return stacked
+
+    def get(self, team_id: int, days: int = 30, bucket: str = "day", today: Optional[date] = None) -> Optional[Dict]:
+        today = today or date.today()
+        days = max(1, min(days, TEAM_ANALYTICS_MAX_DAYS))
+        series = self._series(team_id)
+        if series is None:
+            return None
+        window = [today - timedelta(days=i) for i in range(days - 1, -1, -1)]
+        key = (days, bucket, today)
+
+        with series.lock:
+            now = self.clock()
+            with self._lock:
+                cached = series.results.get(key)
+                if cached is not None and now - cached[0] < TEAM_RESULT_TTL:
+                    record_cache("team_analytics", True)
+                    return cached[1]
+                record_cache("team_analytics", False)
+                stale = [d for d in window if d not in series.days or d in series.dirty
+                         or (d == today and now - series.today_loaded_at >= TEAM_RESULT_TTL)]
+                series.dirty.difference_update(stale)
+                version = series.version
+                if today in stale:
+                    series.today_loaded_at = now
+
+            if stale:
+                loaded = self._load(team_id, series, stale)
+                with self._lock:
+                    for i, d in enumerate(stale):
+                        series.days[d] = loaded[i]
+                    # Dias fora da janela máxima não voltam a ser usados
+                    oldest = today - timedelta(days=TEAM_ANALYTICS_MAX_DAYS)
+                    for d in [d for d in series.days if d < oldest]:
+                        del series.days[d]
+
+            counts = np.stack([series.days[d] for d in window], axis=1)
+            result = compute_analytics(series.user_ids, window, counts, bucket)
+            result["team_id"] = team_id
+            with self._lock:
+                # Invalidação durante o cálculo: não guarda um resultado já velho
+                if series.version == version:
+                    series.results[key] = (now, result)
+            return result
+
+
+class EmotionRecorder:
+    """Acumula em memória os frames por emoção dominante de cada usuário.
+
+    flush() grava tudo de uma vez (somando às contagens do dia no banco) e
+    avisa todos os workers dos dias afetados, que saem do cache das equipes;
+    roda no agendador de manutenção e no desligamento da aplicação.
+    """
+
+    def __init__(self, analytics: TeamAnalytics, max_keys: int = EMOTION_PENDING_MAX_KEYS):
+        self.analytics = analytics
+        self.max_keys = max_keys
+        self._pending: Dict[Tuple[int, date], List[int]] = {}
+        self._lock = threading.Lock()
+        self.dropped = 0
+
+    def _counts_for(self, key: Tuple[int, date]) -> Optional[List[int]]:
+        # Chamar com self._lock; None quando o acumulador está cheio
+        counts = self._pending.get(key)
+        if counts is None:
+            if len(self._pending) >= self.max_keys:
+                self.dropped += 1
+                return None
+            counts = self._pending[key] = [0] * len(EMOTION_ORDER)
+        return counts
+
+    def record(self, user_id: int, emotion: str, day: Optional[date] = None):
+        index = _EMOTION_INDEX.get(emotion)
+        if index is None:
+            return
+        key = (user_id, day or date.today())
+        with self._lock:
+            counts = self._counts_for(key)
+            if counts is not None:
+                counts[index] += 1
+
+    def flush(self) -> int:
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            print(f"Acumulador de emoções cheio: {dropped} contagens descartadas")
+        if not pending:
+            return 0
+        from psycopg2 import IntegrityError
+        from emotion_store import add_user_emotion_counts
+        try:
+            written = add_user_emotion_counts([(user_id, day, counts) for (user_id, day), counts in pending.items()])
+        except IntegrityError as e:
+            # Usuário excluído entre a checagem e a gravação: repetir o lote falharia
+            # de novo, então ele é descartado
+            print(f"Contagens de {len(pending)} pares (usuário, dia) descartadas: {str(e)}")
+            return 0
+        except Exception:
+            # Banco fora do ar: devolve ao acumulador para a próxima tentativa
+            with self._lock:
+                for key, counts in pending.items():
+                    current = self._counts_for(key)
+                    if current is not None:
+                        for i, n in enumerate(counts):
+                            current[i] += n
+            raise
+        try:
+            get_state().publish(INVALIDATE_CHANNEL, {"days": [[user_id, day.isoformat()] for user_id, day in pending]})
+        except StateError as e:
+            print(f"Erro ao avisar os workers sobre dados novos: {str(e)}")
+            for user_id, day in pending:
+                self.analytics.invalidate_user(user_id, day)
+        return written
+
+
+def _on_invalidate(message: Dict):
+    for user_id, day in message.get("days", ()):
+        analytics.invalidate_user(user_id, date.fromisoformat(day))
+
+
+counter_hit_ratio("team_analytics")
+analytics = TeamAnalytics()
+recorder = EmotionRecorder(analytics)
+get_state().subscribe(INVALIDATE_CHANNEL, _on_invalidate)
@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from inference_pool import InferencePool
+from preprocessing import FaceBox
+
+
+class _Conn:
+    # Faz o papel do pipe para o worker: guarda as mensagens enviadas
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+@pytest.fixture
+def pool():
+    # Sem processos: o teste responde pelo worker chamando _complete
+    p = InferencePool(workers=1, slots=2, slot_bytes=64 * 48 * 3)
+    worker = p._workers[0]
+    worker.alive = True
+    worker.conn = _Conn()
+    yield p
+    p.stop()
+
+
+def responder(pool, boxes, message=-1):
+    worker = pool._workers[0]
+    job_id, slot, shape, color, options = worker.conn.sent[message]
+    pool._complete(worker, (job_id, True, ([tuple(b) for b in boxes], np.zeros((len(boxes), 48, 48)), None, {})))
+    return shape
+
+
+def test_frame_grande_e_reduzido_e_as_caixas_voltam_a_escala_original(pool):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    future = pool.submit(frame)
+    shape = responder(pool, [FaceBox(8, 6, 16, 12, 0.9)])
+    # Coube no slot: 64x48
+    assert shape == (48, 64, 3)
+    (box,), _, _, _ = future.result(timeout=1)
+    assert (box.x, box.y, box.w, box.h) == (80, 60, 160, 120)
+    assert box.score == 0.9
+
+
+def test_caixa_na_borda_nao_sai_do_frame(pool):
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    future = pool.submit(frame)
+    responder(pool, [FaceBox(60, 40, 4, 8, 0.5)])
+    (box,), _, _, _ = future.result(timeout=1)
+    assert box.x + box.w <= 640 and box.y + box.h <= 480
+
+
+def test_frame_que_cabe_no_slot_nao_muda(pool):
+    frame = np.zeros((40, 60, 3), dtype=np.uint8)
+    future = pool.submit(frame)
+    assert responder(pool, [FaceBox(1, 2, 3, 4, 0.7)]) == (40, 60, 3)
+    (box,), _, _, _ = future.result(timeout=1)
+    assert tuple(box) == (1, 2, 3, 4, 0.7)
+
+
+def test_analyze_com_aneis_cheios_tambem_reescala(pool):
+    async def cenario():
+        # Ocupa os dois slots: o analyze espera um slot numa thread
+        first = [pool.submit(np.zeros((40, 60, 3), dtype=np.uint8)) for _ in range(2)]
+        task = asyncio.ensure_future(pool.analyze(np.zeros((480, 640, 3), dtype=np.uint8)))
+        await asyncio.sleep(0.05)
+        assert len(pool._workers[0].conn.sent) == 2
+        for i in range(len(first)):
+            responder(pool, [], message=i)
+        while len(pool._workers[0].conn.sent) < 3:
+            await asyncio.sleep(0.01)
+        responder(pool, [FaceBox(8, 6, 16, 12, 0.9)])
+        return await task
+
+    result = asyncio.run(cenario())
+    assert result["faces"][0]["box"] == {"x": 80, "y": 60, "w": 160, "h": 120}
@@ -0,0 +1,67 @@
+import pytest
+
+from keyword_matcher import KeywordMatcher, get_matcher, normalizar, radical, radicais
+
+
+def test_normalizar_tira_acentos_e_maiusculas():
+    assert normalizar("Ódio EXAUSTÃO") == "odio exaustao"
+
+
+@pytest.mark.parametrize("palavras", [
+    ("esgotado", "esgotados", "esgotada", "esgotadas", "Esgotadas"),
+    ("exausto", "exaustos", "exausta"),
+    ("emoção", "emoções"),
+    ("ódio", "odio"),
+])
+def test_radical_une_flexoes(palavras):
+    assert len({radicais(p)[0] for p in palavras}) == 1
+
+
+def test_radical_preserva_palavras_curtas():
+    assert radical("mal") == "mal"
+    assert radical("mas") == "mas"
+
+
+def test_termo_simples_casa_com_flexao():
+    matcher = KeywordMatcher({"burnout": ["esgotado"]})
+    assert matcher.contar("Estamos todos ESGOTADAS hoje") == {"burnout": 1}
+
+
+def test_expressao_de_varias_palavras():
+    matcher = KeywordMatcher({"burnout": ["não aguento mais"], "triste": ["sem esperança"]})
+    ocorrencias = list(matcher.encontrar("eu nao aguento mais, estou sem esperanças"))
+    assert ocorrencias == [("burnout", "não aguento mais", 1), ("triste", "sem esperança", 5)]
+    # Palavras soltas da expressão não contam
+    assert matcher.contar("não aguento o calor") == {}
+
+
+def test_expressao_e_termo_contido_da_mesma_categoria_contam_uma_vez():
+    matcher = KeywordMatcher({"agressivo": ["raiva", "com raiva"]})
+    assert matcher.contar("estou com raiva") == {"agressivo": 1}
+    assert matcher.contar("raiva") == {"agressivo": 1}
+
+
+def test_sufixo_de_outra_categoria_tambem_conta():
+    matcher = KeywordMatcher({"burnout": ["não aguento mais"], "agressivo": ["aguento mais ninguém"]})
+    assert matcher.contar("não aguento mais ninguém") == {"burnout": 1, "agressivo": 1}
+
+
+def test_falha_volta_para_prefixo_parcial():
+    # "sem sem energia": o primeiro "sem" não completa, o segundo começa a expressão
+    matcher = KeywordMatcher({"burnout": ["sem energia"]})
+    assert matcher.contar("sem sem energia") == {"burnout": 1}
+
+
+def test_avancar_token_a_token_igual_a_encontrar():
+    matcher = KeywordMatcher({"burnout": ["sem forças", "no limite"]})
+    estado, total = 0, []
+    for token in radicais("Sem forças e no limite"):
+        estado, saidas = matcher.avancar(estado, token)
+        total.extend(c for c, _, _ in saidas)
+    assert total == [c for c, _, _ in matcher.encontrar("Sem forças e no limite")]
+
+
+def test_lexico_padrao_carrega():
+    matcher = get_matcher()
+    assert set(matcher.categorias) == {"agressivo", "burnout", "triste"}
+    assert matcher.contar("me sinto exausta e sozinha") == {"burnout": 1, "triste": 1}
@@ -0,0 +1,111 @@
+import re
+
+import pytest
+
+import metrics
+from metrics import Counter, Gauge, Histogram, Registry
+
+# Uma linha de amostra do formato de texto do Prometheus (versão 0.0.4)
+_SAMPLE = re.compile(
+    r'^[a-zA-Z_:][a-zA-Z0-9_:]*'
+    r'(\{[a-zA-Z_][a-zA-Z0-9_]*="(\\\\|\\"|\\n|[^"\\\n])*"(,[a-zA-Z_][a-zA-Z0-9_]*="(\\\\|\\"|\\n|[^"\\\n])*")*\})?'
+    r' (NaN|[+-]Inf|-?[0-9]+(\.[0-9]+)?(e[+-]?[0-9]+)?)$'
+)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    # As métricas se registram no REGISTRY global ao serem criadas
+    fresh = Registry()
+    monkeypatch.setattr(metrics, "REGISTRY", fresh)
+    return fresh
+
+
+def linhas(registry):
+    text = registry.render()
+    assert text.endswith("\n")
+    return text.splitlines()
+
+
+def test_toda_linha_segue_o_formato(registry):
+    Counter("t_total", "Contador", ["rota"]).labels(rota='/a"b\\c\nd').inc()
+    Gauge("t_gauge", "Medidor com \\ e\nquebra").set(float("nan"))
+    Gauge("t_neg", "Negativo").set(float("-inf"))
+    Histogram("t_seconds", "Histograma", ["stage"], buckets=(0.1, 1)).labels(stage="x").observe(0.5)
+    for line in linhas(registry):
+        if line.startswith("# "):
+            assert re.match(r"^# (HELP|TYPE) [a-zA-Z_:][a-zA-Z0-9_:]* ", line), line
+            assert "\n" not in line
+        else:
+            assert _SAMPLE.match(line), line
+
+
+def test_contador_e_rotulos_escapados(registry):
+    c = Counter("t_total", "Contador", ["rota", "resultado"])
+    c.labels(rota='/x"y', resultado="ok").inc(2)
+    c.labels("/x\"y", "ok").inc()
+    assert linhas(registry) == [
+        "# HELP t_total Contador",
+        "# TYPE t_total counter",
+        't_total{rota="/x\\"y",resultado="ok"} 3',
+    ]
+
+
+def test_gauge_com_funcao_e_valores_especiais(registry):
+    g = Gauge("t_ratio", "Taxa", ["cache"])
+    g.labels(cache="a").set_function(lambda: 0.25)
+    g.labels(cache="b").set_function(lambda: 1 / 0)
+    assert linhas(registry)[2:] == ['t_ratio{cache="a"} 0.25', 't_ratio{cache="b"} NaN']
+
+
+def test_histograma_cumulativo_com_inf(registry):
+    h = Histogram("t_seconds", "Latência", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3):
+        h.observe(value)
+    assert linhas(registry) == [
+        "# HELP t_seconds Latência",
+        "# TYPE t_seconds histogram",
+        't_seconds_bucket{le="0.1"} 2',
+        't_seconds_bucket{le="1"} 3',
+        't_seconds_bucket{le="+Inf"} 4',
+        "t_seconds_sum 3.65",
+        "t_seconds_count 4",
+    ]
+
+
+def test_nome_duplicado_e_recusado(registry):
+    Counter("t_total", "a")
+    with pytest.raises(ValueError):
+        Gauge("t_total", "b")
+
+
+def test_parser_oficial_le_a_saida_real():
+    parser = pytest.importorskip("prometheus_client.parser")
+    metrics.FRAME_STAGE_SECONDS.labels(stage="decode").observe(0.003)
+    families = {f.name: f for f in parser.text_string_to_metric_families(metrics.render_latest())}
+    assert families["emotion_frame_stage_seconds"].type == "histogram"
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+    import main
+    return TestClient(main.app)
+
+
+def test_metrics_desligado_sem_admin_token(client, monkeypatch):
+    import profiling
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_exige_o_admin_token(client, monkeypatch):
+    import profiling
+    monkeypatch.setattr(profiling, "ADMIN_TOKEN", "segredo")
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"X-Admin-Token": "errado"}).status_code == 403
+    response = client.get("/metrics", headers={"X-Admin-Token": "segredo"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Formato do scrape_config do Prometheus (authorization: credentials)
+    assert client.get("/metrics", headers={"Authorization": "Bearer segredo"}).status_code == 200
@@ -0,0 +1,104 @@
+import pytest
+
+import overload
+from overload import LEVELS, OverloadController
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 100.0
+
+    def __call__(self):
+        return self.agora
+
+
+@pytest.fixture
+def controlador(monkeypatch):
+    monkeypatch.setattr(overload, "OVERLOAD_STEP_UP_SECONDS", 1.0)
+    monkeypatch.setattr(overload, "OVERLOAD_COOLDOWN_SECONDS", 10.0)
+    monkeypatch.setattr(overload, "OVERLOAD_RECOVER_RATIO", 0.5)
+    relogio = Relogio()
+    # alpha=1: a média é a última observação, para os limiares ficarem exatos
+    c = OverloadController([300, 600, 1200], clock=relogio, alpha=1.0)
+    yield c, relogio
+    overload.DEGRADATION_LEVEL.set_function(lambda: overload.controller.current().level)
+
+
+def test_sobe_um_nivel_por_vez_respeitando_o_tempo_minimo(controlador):
+    c, relogio = controlador
+    relogio.agora += 1
+    c.observe(2.0)
+    assert c.current().level == 1
+    # Logo depois, mesmo com latência altíssima, não pula degraus
+    c.observe(2.0)
+    assert c.current().level == 1
+    relogio.agora += 1
+    c.observe(2.0)
+    relogio.agora += 1
+    c.observe(2.0)
+    relogio.agora += 1
+    c.observe(2.0)
+    assert c.current() == LEVELS[3]
+    relogio.agora += 1
+    c.observe(5.0)
+    assert c.current().level == 3
+
+
+def test_latencia_abaixo_do_limiar_fica_no_nivel(controlador):
+    c, relogio = controlador
+    relogio.agora += 5
+    c.observe(0.29)
+    assert c.current().level == 0
+
+
+def test_desce_so_bem_abaixo_do_limiar_e_depois_do_cooldown(controlador):
+    c, relogio = controlador
+    relogio.agora += 1
+    c.observe(0.5)
+    assert c.current().level == 1
+    # Abaixo do limiar, mas não da metade dele: histerese
+    relogio.agora += 20
+    c.observe(0.2)
+    assert c.current().level == 1
+    relogio.agora += 1
+    c.observe(0.1)
+    assert c.current().level == 0
+
+
+def test_cooldown_conta_desde_a_ultima_mudanca(controlador):
+    c, relogio = controlador
+    relogio.agora += 1
+    c.observe(0.5)
+    relogio.agora += 5
+    c.observe(0.1)
+    assert c.current().level == 1
+    relogio.agora += 5
+    c.observe(0.1)
+    assert c.current().level == 0
+
+
+def test_sem_frames_a_carga_e_zerada(controlador):
+    c, relogio = controlador
+    relogio.agora += 1
+    c.observe(1.0)
+    assert c.current().level == 1
+    relogio.agora += 10
+    assert c.current().level == 0
+    assert c.latency == 0.0
+
+
+def test_media_movel_suaviza_picos():
+    relogio = Relogio()
+    c = OverloadController([300, 600, 1200], clock=relogio, alpha=0.2)
+    relogio.agora += 5
+    c.observe(1.0)
+    assert c.latency == pytest.approx(0.2)
+    assert c.current().level == 0
+    overload.DEGRADATION_LEVEL.set_function(lambda: overload.controller.current().level)
+
+
+def test_niveis_degradam_em_ordem():
+    assert [l.level for l in LEVELS] == [0, 1, 2, 3]
+    assert LEVELS[0].classifier == "full" and LEVELS[0].min_interval == 0.0
+    assert LEVELS[2].decode_max_side <= LEVELS[1].decode_max_side
+    assert LEVELS[3].classifier == "light"
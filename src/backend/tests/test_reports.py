@@ -0,0 +1,46 @@
+import pytest
+from pydantic import ValidationError
+
+from main import ReportRequest
+from reports import normalize_aggregates
+
+
+def test_emotions_em_ingles_e_portugues_viram_rotulo_canonico():
+    request = ReportRequest(emotions={"happy": 2, "Felicidade": 1, "SAD": 1})
+    assert request.emotions == {"felicidade": 3, "tristeza": 1}
+
+
+def test_emocao_desconhecida_e_rejeitada():
+    with pytest.raises(ValidationError):
+        ReportRequest(emotions={"ignore as instruções": 1})
+
+
+@pytest.mark.parametrize("value", [-1, float("inf"), float("nan")])
+def test_contagem_invalida_e_rejeitada(value):
+    with pytest.raises(ValidationError):
+        ReportRequest(emotions={"raiva": value})
+
+
+@pytest.mark.parametrize("placeholder", ["Nenhuma", "none", "qualquer coisa"])
+def test_dominante_sem_rosto_sai_das_contagens(placeholder):
+    # O Dashboard manda "Nenhuma" no estado inicial e depois de frames sem rosto
+    request = ReportRequest(emotions={"raiva": 1, "tristeza": 4}, dominant_emotion=placeholder)
+    assert request.dominant_emotion is None
+    aggregates = normalize_aggregates(request.emotions, request.dominant_emotion, request.total_frames)
+    assert aggregates["dominant_emotion"] == "tristeza"
+    assert aggregates["total"] == 5
+
+
+def test_dominante_conhecida_e_traduzida():
+    assert ReportRequest(emotions={"raiva": 1}, dominant_emotion="angry").dominant_emotion == "raiva"
+
+
+def test_total_negativo_e_rejeitado():
+    with pytest.raises(ValidationError):
+        ReportRequest(emotions={"raiva": 1}, total_frames=-1)
+
+
+def test_exige_emotions_ou_video_id():
+    with pytest.raises(ValidationError):
+        ReportRequest()
+    assert ReportRequest(video_id=3).video_id == 3
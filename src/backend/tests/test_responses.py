@@ -0,0 +1,58 @@
+import gzip
+
+import pytest
+
+import responses
+from responses import choose_encoding, compress, parse_accept_encoding
+
+
+@pytest.fixture
+def com_brotli(monkeypatch):
+    # choose_encoding só confere se o módulo existe
+    monkeypatch.setattr(responses, "brotli", object())
+
+
+@pytest.fixture
+def sem_brotli(monkeypatch):
+    monkeypatch.setattr(responses, "brotli", None)
+
+
+def test_parse_accept_encoding():
+    assert parse_accept_encoding("gzip, br;q=0.5, *;q=0, x;q=abc") == [
+        ("gzip", 1.0), ("br", 0.5), ("*", 0.0), ("x", 0.0)
+    ]
+
+
+@pytest.mark.parametrize("header, esperado", [
+    (None, None),
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip, deflate, br", "br"),
+    ("br;q=0.1, gzip", "br"),
+    ("*", "br"),
+    # Codificações listadas com q=0 não são aceitas nem pelo curinga
+    ("br;q=0, *", "gzip"),
+    ("br;q=0, gzip;q=0, *", None),
+    ("gzip;q=0, *;q=0.5", "br"),
+    ("*;q=0, gzip", "gzip"),
+    ("br;q=0", None),
+])
+def test_choose_encoding_com_brotli(com_brotli, header, esperado):
+    assert choose_encoding(header) == esperado
+
+
+@pytest.mark.parametrize("header, esperado", [
+    ("br", None),
+    ("br, gzip", "gzip"),
+    ("*", "gzip"),
+    ("gzip;q=0, *", None),
+])
+def test_choose_encoding_sem_brotli(sem_brotli, header, esperado):
+    assert choose_encoding(header) == esperado
+
+
+def test_gzip_deterministico():
+    data = b'{"felicidade": 1}' * 100
+    assert compress(data, "gzip") == compress(data, "gzip")
+    assert gzip.decompress(compress(data, "gzip")) == data
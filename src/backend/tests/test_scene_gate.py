@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+
+from pipeline import empty_result
+from scene_gate import SceneChangeGate, jpeg_thumbnail, luminance_thumbnail
+from ws_protocol import carry_forward, decode_result, encode_result
+
+
+def cena(valor, shape=(48, 64)):
+    return np.full(shape, valor, dtype=np.uint8)
+
+
+def gate(**kwargs):
+    kwargs.setdefault("threshold", 3.0)
+    kwargs.setdefault("max_interval", 2.0)
+    return SceneChangeGate("teste", enabled=True, **kwargs)
+
+
+def test_sem_referencia_analisa():
+    g = gate()
+    assert g.check(cena(100), now=0.0)
+
+
+def test_cena_parada_e_pulada_ate_o_intervalo_maximo():
+    g = gate()
+    g.mark_analyzed(cena(100), now=0.0)
+    assert not g.check(cena(101), now=0.5)
+    assert not g.check(cena(100), now=1.9)
+    assert g.check(cena(100), now=2.0)
+    assert (g.frames, g.skipped, g.analyzed) == (3, 2, 1)
+
+
+def test_mudanca_de_cena_analisa():
+    g = gate()
+    g.mark_analyzed(cena(100), now=0.0)
+    assert g.check(cena(110), now=0.1)
+    assert g.last_score == 10.0
+
+
+def test_referencia_so_muda_quando_a_analise_termina():
+    # Análise que falhou não chama mark_analyzed: o frame seguinte compara
+    # com a referência antiga e é analisado de novo
+    g = gate()
+    g.mark_analyzed(cena(100), now=0.0)
+    assert g.check(cena(150), now=0.1)
+    assert g.check(cena(150), now=0.2)
+    g.mark_analyzed(cena(150), now=0.2)
+    assert not g.check(cena(150), now=0.3)
+
+
+def test_threshold_zero_ou_desligado_analisa_tudo():
+    for g in (gate(threshold=0), SceneChangeGate("teste", threshold=3.0, enabled=False)):
+        g.mark_analyzed(cena(100), now=0.0)
+        assert g.check(cena(100), now=0.1)
+        assert not g.stats()["enabled"]
+
+
+def test_resolucao_diferente_analisa():
+    g = gate()
+    g.mark_analyzed(cena(100), now=0.0)
+    assert g.check(cena(100, shape=(24, 32)), now=0.1)
+
+
+def test_configure_e_reset():
+    g = gate()
+    g.configure(threshold=50.0, max_interval=10.0)
+    g.mark_analyzed(cena(100), now=0.0)
+    assert not g.check(cena(140), now=5.0)
+    g.reset()
+    assert g.check(cena(140), now=5.1)
+    assert (g.frames, g.skipped, g.analyzed) == (1, 0, 0)
+
+
+def test_miniaturas_do_frame_e_do_jpeg_sao_parecidas():
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    frame[:, 320:] = 200
+    ok, data = cv2.imencode(".jpg", frame)
+    from_frame = luminance_thumbnail(frame, "bgr")
+    from_jpeg = jpeg_thumbnail(data.tobytes())
+    assert from_frame.shape == from_jpeg.shape == (24, 32)
+    assert cv2.absdiff(from_frame, from_jpeg).mean() < 3.0
+    assert jpeg_thumbnail(b"nao e jpeg") is None
+
+
+def test_carry_forward_marca_cena_sem_mudanca():
+    face = {"box": {"x": 1, "y": 2, "w": 3, "h": 4}, "emotions": {"happy": 100.0}, "dominant_emotion": "happy"}
+    payload = encode_result({"face_detected": True, "faces": [face], "degradation": 0}, timestamp=10.0)
+    repeated = decode_result(carry_forward(payload, degradation=3, timestamp=11.0))
+    original = decode_result(payload)
+    assert repeated["scene_unchanged"] is True
+    assert repeated["degradation"] == 3
+    assert repeated["timestamp"] == 11.0
+    assert repeated["faces"] == original["faces"]
+    assert repeated["face_detected"] is True
+    # Repetir de novo troca o nível sem acumular bits
+    again = decode_result(carry_forward(carry_forward(payload, 3, 11.0), 1, 12.0))
+    assert again["degradation"] == 1 and again["scene_unchanged"] is True
+
+
+def test_carry_forward_sem_rosto():
+    payload = encode_result(empty_result(), timestamp=1.0)
+    decoded = decode_result(carry_forward(payload, degradation=0, timestamp=2.0))
+    assert decoded["faces"] == [] and decoded["scene_unchanged"] is True
@@ -0,0 +1,152 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from state_backend import MemoryBackend, RedisBackend, RespConnection, StateError
+
+STANDIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tools", "kv_standin.py")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def standin_url():
+    # O cliente RESP é testado contra o tools/kv_standin.py num processo à parte
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, STANDIN, "--port", str(port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                proc.kill()
+                pytest.fail("kv_standin não subiu")
+            time.sleep(0.05)
+    yield f"redis://127.0.0.1:{port}/0"
+    proc.kill()
+    proc.wait()
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        b = MemoryBackend()
+    else:
+        b = RedisBackend(url=request.getfixturevalue("standin_url"), prefix=f"t{time.monotonic_ns()}:")
+    yield b
+    b.close()
+
+
+def test_set_get_delete(backend):
+    assert backend.get("k") is None
+    assert backend.set("k", "a")
+    assert backend.get("k") == "a"
+    assert not backend.set("k", "b", only_if_absent=True)
+    backend.delete("k")
+    assert backend.get("k") is None
+
+
+def test_ttl_expira(backend):
+    backend.set("k", "a", ttl=0.05)
+    time.sleep(0.1)
+    assert backend.get("k") is None
+    assert backend.set("k", "b", only_if_absent=True)
+
+
+def test_contadores(backend):
+    assert backend.incr("c", {"raiva": 2, "medo": 1}) == {"raiva": 2, "medo": 1}
+    backend.incr("c", {"raiva": 1})
+    assert backend.counters("c") == {"raiva": 3, "medo": 1}
+    backend.hdel("c", "medo")
+    assert backend.counters("c") == {"raiva": 3}
+    backend.reset_counters("c", {"raiva": 0})
+    assert backend.counters("c") == {"raiva": 0}
+
+
+def test_set_if_equal_renova_so_o_proprio_lease(backend):
+    assert not backend.set_if_equal("lease", "w1", "w1", ttl=5)
+    backend.set("lease", "w1", ttl=0.1)
+    assert backend.set_if_equal("lease", "w1", "w1", ttl=5)
+    time.sleep(0.15)
+    # Renovado: não venceu
+    assert backend.get("lease") == "w1"
+    assert not backend.set_if_equal("lease", "w2", "w2", ttl=5)
+    assert backend.get("lease") == "w1"
+
+
+def test_lease_vencido_e_pego_por_outro_nao_e_sobrescrito(backend):
+    backend.set("lease", "w1", ttl=0.05)
+    time.sleep(0.1)
+    assert backend.set("lease", "w2", ttl=5, only_if_absent=True)
+    assert not backend.set_if_equal("lease", "w1", "w1", ttl=5)
+    assert not backend.delete_if_equal("lease", "w1")
+    assert backend.get("lease") == "w2"
+    assert backend.delete_if_equal("lease", "w2")
+    assert backend.get("lease") is None
+
+
+def test_set_if_equal_concorrente_tem_um_vencedor(backend):
+    backend.set("k", "0")
+    vencedores = []
+
+    def tentar(valor):
+        if backend.set_if_equal("k", "0", valor):
+            vencedores.append(valor)
+
+    threads = [threading.Thread(target=tentar, args=(str(i),)) for i in range(1, 9)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(vencedores) == 1
+    assert backend.get("k") == vencedores[0]
+
+
+def test_pubsub(backend):
+    recebidas = []
+    evento = threading.Event()
+
+    def callback(message):
+        recebidas.append(message)
+        evento.set()
+
+    backend.subscribe("canal", callback)
+    # A assinatura em rede é assíncrona: publica até a primeira mensagem chegar
+    deadline = time.monotonic() + 5
+    while not evento.wait(0.05) and time.monotonic() < deadline:
+        backend.publish("canal", {"action": "stop"})
+    assert recebidas and recebidas[0] == {"action": "stop"}
+
+
+def test_escrita_entre_watch_e_exec_aborta(standin_url):
+    backend = RedisBackend(url=standin_url, prefix="watch:")
+    backend.set("k", "a")
+    conn = RespConnection("127.0.0.1", int(standin_url.rsplit(":", 1)[1].split("/")[0]), 2)
+    try:
+        assert conn.pipeline([("WATCH", "watch:k"), ("GET", "watch:k")]) == ["OK", "a"]
+        backend.set("k", "b")
+        assert conn.pipeline([("MULTI",), ("SET", "watch:k", "c"), ("EXEC",)])[2] is None
+        assert backend.get("k") == "b"
+    finally:
+        conn.close()
+        backend.close()
+
+
+def test_servidor_fora_do_ar_vira_state_error():
+    backend = RedisBackend(url=f"redis://127.0.0.1:{_free_port()}/0", timeout=0.2)
+    with pytest.raises(StateError):
+        backend.get("k")
+    with pytest.raises(StateError):
+        backend.set_if_equal("k", "a", "b")
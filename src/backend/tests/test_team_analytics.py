@@ -0,0 +1,75 @@
+from datetime import date
+
+import psycopg2
+import pytest
+
+import emotion_store
+from team_analytics import EMOTION_ORDER, EmotionRecorder, TeamAnalytics
+
+DIA = date(2026, 1, 5)
+
+
+def gravador(monkeypatch, max_keys=100):
+    gravado = []
+
+    def add_user_emotion_counts(rows):
+        gravado.extend(rows)
+        return len(rows)
+
+    monkeypatch.setattr(emotion_store, "add_user_emotion_counts", add_user_emotion_counts)
+    return EmotionRecorder(TeamAnalytics(), max_keys=max_keys), gravado
+
+
+def test_flush_soma_por_usuario_e_dia(monkeypatch):
+    recorder, gravado = gravador(monkeypatch)
+    recorder.record(1, "happy", DIA)
+    recorder.record(1, "happy", DIA)
+    recorder.record(1, "fear", DIA)
+    recorder.record(2, "desconhecida", DIA)
+    assert recorder.flush() == 1
+    (user_id, day, counts), = gravado
+    assert (user_id, day) == (1, DIA)
+    assert counts[EMOTION_ORDER.index("happy")] == 2
+    assert counts[EMOTION_ORDER.index("fear")] == 1
+    assert recorder.flush() == 0
+
+
+def test_acumulador_tem_limite_de_pares(monkeypatch):
+    recorder, gravado = gravador(monkeypatch, max_keys=2)
+    for user_id in range(5):
+        recorder.record(user_id, "sad", DIA)
+    # Pares já acumulados continuam contando
+    recorder.record(0, "sad", DIA)
+    assert recorder.flush() == 2
+    assert sorted(u for u, _, _ in gravado) == [0, 1]
+    assert sum(sum(c) for _, _, c in gravado) == 3
+
+
+def test_banco_fora_do_ar_devolve_ao_acumulador(monkeypatch):
+    recorder, gravado = gravador(monkeypatch)
+    recorder.record(1, "angry", DIA)
+
+    def fora_do_ar(rows):
+        raise psycopg2.OperationalError("conexão recusada")
+
+    with monkeypatch.context() as m:
+        m.setattr(emotion_store, "add_user_emotion_counts", fora_do_ar)
+        with pytest.raises(psycopg2.OperationalError):
+            recorder.flush()
+    recorder.record(1, "angry", DIA)
+    assert recorder.flush() == 1
+    assert gravado[0][2][EMOTION_ORDER.index("angry")] == 2
+
+
+def test_violacao_de_chave_estrangeira_descarta_o_lote(monkeypatch):
+    recorder, gravado = gravador(monkeypatch)
+    recorder.record(1, "angry", DIA)
+
+    def usuario_excluido(rows):
+        raise psycopg2.IntegrityError("user_id não existe")
+
+    with monkeypatch.context() as m:
+        m.setattr(emotion_store, "add_user_emotion_counts", usuario_excluido)
+        assert recorder.flush() == 0
+    assert recorder.flush() == 0
+    assert gravado == []
@@ -0,0 +1,83 @@
+from text_analysis import IncrementalTextAnalyzer
+
+
+class Relogio:
+    def __init__(self):
+        self.agora = 0.0
+
+    def __call__(self):
+        return self.agora
+
+
+def novo_analisador(idle_timeout=2.0):
+    relogio = Relogio()
+    return IncrementalTextAnalyzer(idle_timeout=idle_timeout, clock=relogio), relogio
+
+
+def test_feed_conta_comportamentos_ao_fechar_o_token():
+    analyzer, _ = novo_analisador()
+    assert analyzer.feed("estou exausto") != []
+    # O último token continua aberto até um separador
+    assert analyzer.behaviors == {}
+    eventos = analyzer.feed(" ")
+    assert eventos[-1]["type"] == "estimate"
+    assert analyzer.behaviors == {"burnout": 1}
+    assert analyzer.total_tokens == 2
+
+
+def test_fim_de_sentenca_pontua_uma_vez():
+    analyzer, _ = novo_analisador()
+    eventos = analyzer.feed("estou com raiva.")
+    sentencas = [e for e in eventos if e["type"] == "sentence"]
+    assert len(sentencas) == 1
+    assert sentencas[0]["text"] == "estou com raiva"
+    assert sentencas[0]["behaviors"] == {"agressivo": 1}
+    assert analyzer.sentences_scored == 1
+    assert analyzer.feed(".") == []
+
+
+def test_backspace_reabre_o_token_anterior():
+    analyzer, _ = novo_analisador()
+    analyzer.feed("exausto ")
+    assert analyzer.behaviors == {"burnout": 1}
+    # Apaga o espaço e o "o": o token volta a ser editável e deixa de contar
+    analyzer.backspace(2)
+    assert analyzer.behaviors == {}
+    assert analyzer.total_tokens == 0
+    analyzer.feed("a ")
+    assert analyzer.behaviors == {"burnout": 1}
+
+
+def test_backspace_nao_passa_da_sentenca_aberta():
+    analyzer, _ = novo_analisador()
+    analyzer.feed("tudo bem. estou triste ")
+    assert analyzer.behaviors == {"triste": 1}
+    # Count enorme termina logo: só há a sentença aberta para apagar
+    analyzer.backspace(10 ** 12)
+    assert analyzer.behaviors == {}
+    assert analyzer.total_tokens == 2
+    assert analyzer.sentences_scored == 1
+    analyzer.feed("cansado ")
+    assert analyzer.behaviors == {"burnout": 1}
+
+
+def test_tick_pontua_depois_do_debounce():
+    analyzer, relogio = novo_analisador(idle_timeout=2.0)
+    analyzer.feed("sem energia")
+    relogio.agora = 1.0
+    assert analyzer.tick() == []
+    relogio.agora = 2.5
+    eventos = analyzer.tick()
+    assert [e["type"] for e in eventos] == ["estimate", "sentence"]
+    assert eventos[-1]["behaviors"] == {"burnout": 1}
+    # Sem digitação nova, o tick seguinte não pontua de novo
+    relogio.agora = 10.0
+    assert analyzer.tick() == []
+
+
+def test_reset_limpa_tudo():
+    analyzer, _ = novo_analisador()
+    analyzer.feed("estou sozinho ")
+    analyzer.reset()
+    assert analyzer.estimate()["tokens"] == 0
+    assert analyzer.behaviors == {}
@@ -0,0 +1,68 @@
+import pytest
+
+from ws_protocol import WIRE_ORDER, decode_result, encode_result
+from pipeline import empty_result
+
+
+def resultado(*faces, degradation=0):
+    return {
+        "face_detected": bool(faces),
+        "faces": list(faces),
+        "degradation": degradation,
+    }
+
+
+def rosto(x, y, w, h, dominante, track_id=0):
+    emotions = {label: 0.0 for label in WIRE_ORDER}
+    emotions[dominante] = 80.0
+    emotions[WIRE_ORDER[(WIRE_ORDER.index(dominante) + 1) % len(WIRE_ORDER)]] = 20.0
+    face = {"box": {"x": x, "y": y, "w": w, "h": h}, "emotions": emotions, "dominant_emotion": dominante}
+    if track_id:
+        face["track_id"] = track_id
+    return face
+
+
+@pytest.mark.parametrize("float16", [False, True])
+def test_ida_e_volta(float16):
+    original = resultado(rosto(10, 20, 30, 40, "happy", track_id=7), rosto(1, 2, 100, 120, "sad"), degradation=2)
+    decoded = decode_result(encode_result(original, timestamp=1700000000.5, float16=float16))
+    assert decoded["face_detected"] is True
+    assert decoded["degradation"] == 2
+    assert decoded["scene_unchanged"] is False
+    assert decoded["timestamp"] == 1700000000.5
+    assert [f["box"] for f in decoded["faces"]] == [f["box"] for f in original["faces"]]
+    assert decoded["faces"][0]["track_id"] == 7
+    assert "track_id" not in decoded["faces"][1]
+    # O rosto principal é o de maior área
+    assert decoded["dominant_emotion"] == "sad"
+    tolerance = 0.05 if float16 else 0.5
+    for got, sent in zip(decoded["faces"], original["faces"]):
+        assert got["dominant_emotion"] == sent["dominant_emotion"]
+        for label in WIRE_ORDER:
+            assert got["emotions"][label] == pytest.approx(sent["emotions"][label], abs=tolerance)
+
+
+def test_sem_rosto():
+    decoded = decode_result(encode_result(empty_result(), timestamp=1.0))
+    assert decoded["faces"] == []
+    assert decoded["dominant_emotion"] == "none"
+    assert decoded["face_detected"] is False
+
+
+def test_rosto_nao_classificado():
+    face = {"box": {"x": 0, "y": 0, "w": 5, "h": 5}, "emotions": {}, "dominant_emotion": "none"}
+    decoded = decode_result(encode_result(resultado(face), timestamp=1.0))
+    assert decoded["faces"][0]["dominant_emotion"] == "none"
+    assert decoded["faces"][0]["emotions"] == {}
+
+
+def test_caixa_fora_da_faixa_e_limitada():
+    decoded = decode_result(encode_result(resultado(rosto(-5, 70000, 10, 10, "angry")), timestamp=1.0))
+    assert decoded["faces"][0]["box"] == {"x": 0, "y": 0xFFFF, "w": 10, "h": 10}
+
+
+def test_frame_desconhecido_e_recusado():
+    data = bytearray(encode_result(empty_result(), timestamp=1.0))
+    data[0] = 0
+    with pytest.raises(ValueError):
+        decode_result(bytes(data))
@@ -0,0 +1,229 @@
+import os
+import time
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from textblob import TextBlob
+
+from keyword_matcher import get_matcher, radicais, radical
+from metrics import register_lru_cache
+
+SEM_COMPORTAMENTO = "Comportamento não identificado"
+
+# Limites de polaridade do TextBlob e o sentimento correspondente a cada faixa
+_LIMITES_SENTIMENTO = np.array([-0.5, 0.0, np.nextafter(0.5, 1.0)])
+_ROTULOS_SENTIMENTO = np.array(["Agressivo", "Triste", "Neutro", "Positivo"])
+
+
+def classificar_comportamento(palavra: str) -> str:
+    for comportamento, _, _ in get_matcher().encontrar(palavra):
+        return comportamento
+    return SEM_COMPORTAMENTO
+
+
+def classificar_sentimento(texto: str) -> str:
+    return rotular_polaridades(np.array([polaridade(texto)]))[0]
+
+
+def polaridade(texto: str) -> float:
+    return TextBlob(texto).sentiment.polarity
+
+
+def rotular_polaridades(polaridades: np.ndarray) -> List[str]:
+    # < -0.5 Agressivo, [-0.5, 0) Triste, [0, 0.5] Neutro, > 0.5 Positivo
+    return _ROTULOS_SENTIMENTO[np.digitize(polaridades, _LIMITES_SENTIMENTO, right=False)].tolist()
+
+
+def comportamentos(texto: str) -> Dict[str, int]:
+    # Uma passada pelo texto no autômato do léxico (palavras e expressões)
+    return get_matcher().contar(texto)
+
+
+def analisar_lote(mensagens: List[str]) -> List[Dict]:
+    # O TextBlob ainda roda uma vez por mensagem distinta (as repetidas, comuns
+    # em logs de chat, são pontuadas uma única vez); só a faixa de sentimento
+    # sai de uma chamada única de np.digitize para o lote inteiro
+    unicas = list(dict.fromkeys(mensagens))
+    polaridades_unicas = np.fromiter((polaridade(m) for m in unicas), dtype=np.float64, count=len(unicas))
+    indice = {m: i for i, m in enumerate(unicas)}
+    polaridades = polaridades_unicas[[indice[m] for m in mensagens]] if mensagens else polaridades_unicas
+    sentimentos = rotular_polaridades(polaridades)
+
+    resultados = []
+    for mensagem, pol, sentimento in zip(mensagens, polaridades.tolist(), sentimentos):
+        contagem = comportamentos(mensagem)
+        resultados.append({
+            "sentiment": sentimento,
+            "polarity": pol,
+            "behaviors": contagem,
+            "behavior": max(contagem, key=contagem.get) if contagem else SEM_COMPORTAMENTO
+        })
+    return resultados
+
+
+def resumir(resultados: Iterable[Dict]) -> Dict:
+    sentimentos: Dict[str, int] = {}
+    comportamentos_total: Dict[str, int] = {}
+    total = 0
+    for r in resultados:
+        total += 1
+        sentimentos[r["sentiment"]] = sentimentos.get(r["sentiment"], 0) + 1
+        for comportamento, n in r["behaviors"].items():
+            comportamentos_total[comportamento] = comportamentos_total.get(comportamento, 0) + n
+    return {"total": total, "sentiments": sentimentos, "behaviors": comportamentos_total}
+
+
+# Pausa na digitação (em segundos) que encerra a sentença e dispara a pontuação completa
+TEXT_IDLE_TIMEOUT = float(os.getenv("TEXT_IDLE_TIMEOUT", "2.0"))
+_FIM_SENTENCA = set(".!?\n")
+
+
+@lru_cache(maxsize=32768)
+def polaridade_palavra(palavra: str) -> float:
+    return polaridade(palavra)
+
+
+# Taxas de acerto dos caches da análise de texto no /metrics
+register_lru_cache("text_stem", radical)
+register_lru_cache("text_word_polarity", polaridade_palavra)
+
+
+class IncrementalTextAnalyzer:
+    """Análise de texto acompanhando a digitação, tecla a tecla.
+
+    Cada token fechado atualiza em O(1) a contagem de comportamentos (um passo
+    no autômato do léxico) e a estimativa de sentimento (polaridade da palavra,
+    em cache). A pontuação completa com o TextBlob só roda no fim da sentença
+    ou após TEXT_IDLE_TIMEOUT sem digitação, e cada sentença é pontuada uma
+    única vez. Espaço separa tokens, não encerra a frase.
+    """
+
+    def __init__(self, idle_timeout: float = TEXT_IDLE_TIMEOUT, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self._clock = clock
+        self._matcher = get_matcher()
+        self.reset()
+
+    def reset(self):
+        self._parcial: List[str] = []
+        # Tokens da sentença aberta: (texto, estado anterior do autômato, ocorrências,
+        # polaridade, separadores antes do token)
+        self._tokens: List[Tuple[str, int, List[Tuple[str, str, int]], float, int]] = []
+        self._separadores = 0
+        self._estado = 0
+        self._ultima_tecla: Optional[float] = None
+        self.behaviors: Dict[str, int] = {}
+        self._soma_polaridade = 0.0
+        self._n_polarizados = 0
+        self.total_tokens = 0
+        self.sentences_scored = 0
+
+    def estimate(self) -> Dict:
+        media = self._soma_polaridade / self._n_polarizados if self._n_polarizados else 0.0
+        return {
+            "tokens": self.total_tokens,
+            "behaviors": dict(self.behaviors),
+            "polarity_estimate": media,
+            "sentiment_estimate": rotular_polaridades(np.array([media]))[0]
+        }
+
+    def feed(self, texto: str) -> List[Dict]:
+        eventos: List[Dict] = []
+        self._ultima_tecla = self._clock()
+        for caractere in texto:
+            if caractere in _FIM_SENTENCA:
+                self._fechar_token(eventos)
+                self._pontuar_sentenca(eventos)
+            elif caractere.isalnum() or caractere in "-'":
+                self._parcial.append(caractere)
+            else:
+                self._fechar_token(eventos)
+                self._separadores += 1
+        return eventos
+
+    def backspace(self, n: int = 1) -> List[Dict]:
+        # Apaga dentro da sentença aberta; sentenças já pontuadas não são reabertas
+        eventos: List[Dict] = []
+        self._ultima_tecla = self._clock()
+        for _ in range(n):
+            if self._parcial:
+                self._parcial.pop()
+            elif self._separadores:
+                self._separadores -= 1
+                # Apagou o separador logo após um token: o token volta a ser editável
+                if not self._separadores and self._tokens:
+                    self._parcial = list(self._desfazer_token())
+                    eventos.append({"type": "estimate", **self.estimate()})
+            else:
+                # Sentença aberta vazia: o laço nunca passa do tamanho dela
+                break
+        return eventos
+
+    def tick(self, agora: Optional[float] = None) -> List[Dict]:
+        # Chamado periodicamente (ou no timeout de leitura) para aplicar o debounce por inatividade
+        eventos: List[Dict] = []
+        agora = self._clock() if agora is None else agora
+        if self._ultima_tecla is not None and agora - self._ultima_tecla >= self.idle_timeout:
+            self._fechar_token(eventos)
+            self._pontuar_sentenca(eventos)
+            self._ultima_tecla = None
+        return eventos
+
+    def _fechar_token(self, eventos: List[Dict]) -> bool:
+        if not self._parcial:
+            return False
+        token = "".join(self._parcial)
+        self._parcial = []
+
+        estado_anterior = self._estado
+        ocorrencias: List[Tuple[str, str, int]] = []
+        for r in radicais(token):
+            self._estado, saidas = self._matcher.avancar(self._estado, r)
+            ocorrencias.extend(saidas)
+        for categoria, _, _ in ocorrencias:
+            self.behaviors[categoria] = self.behaviors.get(categoria, 0) + 1
+
+        pol = polaridade_palavra(token.casefold())
+        if pol:
+            self._soma_polaridade += pol
+            self._n_polarizados += 1
+        self.total_tokens += 1
+        self._tokens.append((token, estado_anterior, ocorrencias, pol, self._separadores))
+        self._separadores = 0
+        eventos.append({"type": "estimate", **self.estimate()})
+        return True
+
+    def _desfazer_token(self) -> str:
+        token, estado_anterior, ocorrencias, pol, self._separadores = self._tokens.pop()
+        self._estado = estado_anterior
+        for categoria, _, _ in ocorrencias:
+            self.behaviors[categoria] -= 1
+            if not self.behaviors[categoria]:
+                del self.behaviors[categoria]
+        if pol:
+            self._soma_polaridade -= pol
+            self._n_polarizados -= 1
+        self.total_tokens -= 1
+        return token
+
+    def _pontuar_sentenca(self, eventos: List[Dict]):
+        if not self._tokens:
+            return
+        texto = " ".join(t[0] for t in self._tokens)
+        contagem: Dict[str, int] = {}
+        for _, _, ocorrencias, _, _ in self._tokens:
+            for categoria, _, _ in ocorrencias:
+                contagem[categoria] = contagem.get(categoria, 0) + 1
+        pol = polaridade(texto)
+        eventos.append({
+            "type": "sentence",
+            "text": texto,
+            "sentiment": rotular_polaridades(np.array([pol]))[0],
+            "polarity": pol,
+            "behaviors": contagem
+        })
+        self.sentences_scored += 1
+        self._tokens = []
+        self._separadores = 0
+        self._estado = 0
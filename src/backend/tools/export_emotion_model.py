@@ -0,0 +1,152 @@
+"""Exporta o modelo de emoções do DeepFace para ONNX ou TFLite em float16 ou int8.
+
+O resultado é usado pelo backend "onnx" ou "tflite" do emotion_model.py:
+
+    python tools/export_emotion_model.py --format onnx --precision int8 \\
+        --calibration ~/fer2013/train --output models/emotion-int8.onnx
+    EMOTION_BACKEND=onnx EMOTION_MODEL_PATH=models/emotion-int8.onnx uvicorn main:app
+
+A quantização int8 estática usa imagens de rostos (qualquer pasta com
+recortes de rosto, p.ex. o conjunto de treino do FER2013) para calibrar as
+ativações. Sem --calibration o ONNX cai para quantização dinâmica (só pesos)
+e o TFLite usa rostos sintéticos, com perda maior de acurácia. Compare o
+resultado com benchmarks/compare_classifiers.py antes de usar em produção.
+
+Requer tensorflow e deepface; para ONNX também tf2onnx e onnxruntime, e
+para float16 em ONNX o onnxconverter-common.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Permite importar os módulos do backend ao rodar os scripts desta pasta
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from emotion_model import faces_to_batch, get_emotion_model  # noqa: E402
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+INPUT_SHAPE = (48, 48, 1)
+
+
+def calibration_faces(path, limit):
+    # Recortes de rosto em tons de cinza, 48x48, como o crop_faces entrega ao classificador
+    import cv2
+    faces = []
+    if path:
+        for root, _, names in os.walk(path):
+            for name in sorted(names):
+                if not name.lower().endswith(IMAGE_EXTENSIONS):
+                    continue
+                img = cv2.imread(os.path.join(root, name), cv2.IMREAD_GRAYSCALE)
+                if img is not None:
+                    faces.append(cv2.resize(img, INPUT_SHAPE[:2], interpolation=cv2.INTER_AREA))
+                if len(faces) >= limit:
+                    return np.stack(faces)
+    if faces:
+        return np.stack(faces)
+    print("Sem --calibration: usando rostos sintéticos (acurácia int8 pior)")
+    rng = np.random.default_rng(0)
+    return rng.integers(0, 256, (min(limit, 64), *INPUT_SHAPE[:2]), dtype=np.uint8)
+
+
+def export_onnx(model, precision, output, faces):
+    import tensorflow as tf
+    import tf2onnx
+    import onnx
+
+    spec = (tf.TensorSpec((None, *INPUT_SHAPE), tf.float32, name="input"),)
+    onnx_model, _ = tf2onnx.convert.from_keras(model, input_signature=spec, opset=13)
+
+    if precision == "fp32":
+        onnx.save(onnx_model, output)
+        return
+    if precision == "fp16":
+        from onnxconverter_common import float16
+        # Entrada e saída continuam float32: o backend não precisa converter
+        onnx.save(float16.convert_float_to_float16(onnx_model, keep_io_types=True), output)
+        return
+
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fp32_path = os.path.join(tmp, "fp32.onnx")
+        prepared_path = os.path.join(tmp, "prepared.onnx")
+        onnx.save(onnx_model, fp32_path)
+        quant_pre_process(fp32_path, prepared_path)
+
+        if faces is None:
+            quantize_dynamic(prepared_path, output, weight_type=QuantType.QInt8)
+            return
+
+        class FaceReader(CalibrationDataReader):
+            def __init__(self):
+                batch = faces_to_batch(faces)
+                self._items = iter({"input": batch[i:i + 1]} for i in range(len(batch)))
+
+            def get_next(self):
+                return next(self._items, None)
+
+        quantize_static(
+            prepared_path, output, FaceReader(),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=True
+        )
+
+
+def export_tflite(model, precision, output, faces):
+    import tensorflow as tf
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if precision == "fp16":
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif precision == "int8":
+        batch = faces_to_batch(faces)
+
+        def representative_dataset():
+            for i in range(len(batch)):
+                yield [batch[i:i + 1]]
+
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        # Entrada e saída int8: o TFLiteClassifier quantiza e desquantiza com os parâmetros do modelo
+        converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    with open(output, "wb") as f:
+        f.write(converter.convert())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--format", choices=["onnx", "tflite"], required=True)
+    parser.add_argument("--precision", choices=["fp32", "fp16", "int8"], default="int8")
+    parser.add_argument("--calibration", help="pasta com recortes de rosto para calibrar o int8")
+    parser.add_argument("--calibration-limit", type=int, default=500)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    model = get_emotion_model()
+    faces = None
+    if args.precision == "int8" and (args.calibration or args.format == "tflite"):
+        faces = calibration_faces(args.calibration, args.calibration_limit)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    if args.format == "onnx":
+        export_onnx(model, args.precision, args.output, faces)
+    else:
+        export_tflite(model, args.precision, args.output, faces)
+    print(f"Modelo salvo em {args.output} ({os.path.getsize(args.output) / 1024:.0f} KiB)")
+
+
+if __name__ == "__main__":
+    main()
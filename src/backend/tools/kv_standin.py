@@ -0,0 +1,236 @@
+"""Servidor local que fala o subconjunto do protocolo do Redis usado pelo state_backend.py.
+
+Para testar vários workers e nós sem instalar Redis:
+
+    python tools/kv_standin.py --port 6390
+    STATE_BACKEND=redis STATE_URL=redis://localhost:6390/0 JWT_SECRET= \\
+        uvicorn main:app --workers 4
+
+Comandos: PING, AUTH, SELECT, GET, SET (EX, PX, NX), DEL, HINCRBY, HGETALL,
+HSET, HDEL, WATCH, UNWATCH, MULTI, EXEC, DISCARD, PUBLISH, SUBSCRIBE,
+UNSUBSCRIBE, QUIT. Tudo em memória, num só banco; não é para produção.
+"""
+import argparse
+import asyncio
+import time
+
+
+class Store:
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.channels = {}
+        # Versão de cada chave, para o EXEC saber se uma chave com WATCH mudou
+        self.versions = {}
+
+    def touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def version(self, key):
+        # Expira antes: chave que venceu durante o WATCH conta como alterada
+        self.get(key)
+        return self.versions.get(key, 0)
+
+    def get(self, key):
+        item = self.values.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self.values[key]
+            self.touch(key)
+            return None
+        return value
+
+
+class Session:
+    # Estado de uma conexão: canais assinados e a transação em andamento
+    def __init__(self):
+        self.subscriptions = set()
+        self.watched = {}
+        self.queued = None
+
+
+def encode(value) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    if value is _NULL_ARRAY:
+        return b"*-1\r\n"
+    if isinstance(value, bool):
+        return b":%d\r\n" % int(value)
+    if isinstance(value, int):
+        return b":%d\r\n" % value
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(v) for v in value)
+    if isinstance(value, Exception):
+        return f"-ERR {value}\r\n".encode()
+    return f"+{value}\r\n".encode()
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b"*"):
+        # Comando inline (ex.: "PING" digitado num telnet)
+        return line.strip().split()
+    args = []
+    for _ in range(int(line[1:-2])):
+        size = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(size + 2))[:-2])
+    return args
+
+
+class Server:
+    def __init__(self):
+        self.store = Store()
+
+    async def handle(self, reader, writer):
+        session = Session()
+        try:
+            while True:
+                args = await read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                name = args[0].upper()
+                if name == b"QUIT":
+                    writer.write(encode("OK"))
+                    break
+                try:
+                    reply = self.execute(name, args[1:], writer, session)
+                except (ValueError, IndexError) as e:
+                    reply = e
+                if reply is not _NO_REPLY:
+                    writer.write(encode(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in session.subscriptions:
+                self.store.channels.get(channel, set()).discard(writer)
+            writer.close()
+
+    def execute(self, name, args, writer, session):
+        store = self.store
+        if session.queued is not None and name not in (b"EXEC", b"DISCARD", b"MULTI", b"WATCH"):
+            session.queued.append((name, args))
+            return "QUEUED"
+        if name == b"WATCH":
+            for key in args:
+                session.watched.setdefault(key, store.version(key))
+            return "OK"
+        if name == b"UNWATCH":
+            session.watched.clear()
+            return "OK"
+        if name == b"MULTI":
+            if session.queued is not None:
+                return ValueError("MULTI dentro de MULTI")
+            session.queued = []
+            return "OK"
+        if name == b"DISCARD":
+            session.queued = None
+            session.watched.clear()
+            return "OK"
+        if name == b"EXEC":
+            if session.queued is None:
+                return ValueError("EXEC sem MULTI")
+            queued, session.queued = session.queued, None
+            changed = any(store.version(key) != version for key, version in session.watched.items())
+            session.watched.clear()
+            if changed:
+                return _NULL_ARRAY
+            return [self.execute(n, a, writer, session) for n, a in queued]
+        if name == b"PING":
+            return "PONG"
+        if name in (b"AUTH", b"SELECT"):
+            return "OK"
+        if name == b"GET":
+            return store.get(args[0])
+        if name == b"SET":
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            expires = None
+            for i, option in enumerate(options):
+                if option == b"EX":
+                    expires = time.monotonic() + int(args[2 + i + 1])
+                elif option == b"PX":
+                    expires = time.monotonic() + int(args[2 + i + 1]) / 1000
+            if b"NX" in options and store.get(key) is not None:
+                return None
+            store.values[key] = (value, expires)
+            store.touch(key)
+            return "OK"
+        if name == b"DEL":
+            removed = 0
+            for key in args:
+                removed += (store.values.pop(key, None) is not None) + (store.hashes.pop(key, None) is not None)
+                store.touch(key)
+            return removed
+        if name == b"HINCRBY":
+            h = store.hashes.setdefault(args[0], {})
+            value = int(h.get(args[1], b"0")) + int(args[2])
+            h[args[1]] = str(value).encode()
+            store.touch(args[0])
+            return value
+        if name == b"HGETALL":
+            return [v for item in store.hashes.get(args[0], {}).items() for v in item]
+        if name == b"HSET":
+            h = store.hashes.setdefault(args[0], {})
+            added = 0
+            for field, value in zip(args[1::2], args[2::2]):
+                added += field not in h
+                h[field] = value
+            store.touch(args[0])
+            return added
+        if name == b"HDEL":
+            h = store.hashes.get(args[0], {})
+            store.touch(args[0])
+            return sum(h.pop(field, None) is not None for field in args[1:])
+        if name == b"PUBLISH":
+            receivers = store.channels.get(args[0], set())
+            for receiver in list(receivers):
+                receiver.write(encode([b"message", args[0], args[1]]))
+            return len(receivers)
+        if name == b"SUBSCRIBE":
+            for channel in args:
+                store.channels.setdefault(channel, set()).add(writer)
+                session.subscriptions.add(channel)
+                writer.write(encode([b"subscribe", channel, len(session.subscriptions)]))
+            return _NO_REPLY
+        if name == b"UNSUBSCRIBE":
+            for channel in args or list(session.subscriptions):
+                store.channels.get(channel, set()).discard(writer)
+                session.subscriptions.discard(channel)
+                writer.write(encode([b"unsubscribe", channel, len(session.subscriptions)]))
+            return _NO_REPLY
+        return ValueError(f"comando não suportado '{name.decode(errors='replace')}'")
+
+
+_NO_REPLY = object()
+# Resposta do EXEC quando uma chave com WATCH mudou
+_NULL_ARRAY = object()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args()
+
+    async def serve():
+        server = await asyncio.start_server(Server().handle, args.host, args.port)
+        print(f"kv_standin ouvindo em {args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Rastreamento leve por requisição/frame: cada estágio (decode, detect,
+# classify, db, serialize...) soma sua duração no Trace ativo. Sem Trace
+# ativo, registrar um estágio custa só um ContextVar.get().
+
+# Devolve Server-Timing em todas as respostas, mesmo sem o cliente pedir
+TRACE_ALL = os.getenv("TRACE_ALL", "false").lower() == "true"
+# Frames da análise contínua mais lentos que isso são logados com os estágios
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "250"))
+
+TRACE_HEADER = b"x-trace"
+
+
+class Trace:
+    __slots__ = ("start", "spans")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: Dict[str, list] = {}
+
+    def add(self, name: str, seconds: float):
+        span = self.spans.get(name)
+        if span is None:
+            self.spans[name] = [seconds, 1]
+        else:
+            span[0] += seconds
+            span[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def timings_ms(self) -> Dict[str, float]:
+        timings = {name: round(total * 1000, 3) for name, (total, _) in self.spans.items()}
+        timings["total"] = round(self.elapsed() * 1000, 3)
+        return timings
+
+    def server_timing(self) -> str:
+        # Formato do cabeçalho Server-Timing (aparece na aba Network do navegador)
+        parts = [f"{name};dur={total * 1000:.3f}" for name, (total, _) in self.spans.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.3f}")
+        return ", ".join(parts)
+
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def record(name: str, seconds: float):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds)
+
+
+@contextmanager
+def span(name: str):
+    # Para trechos que não passam por observe_stage (p.ex. espera por lock ou fila)
+    trace = current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, time.perf_counter() - start)
+
+
+@contextmanager
+def traced(enabled: bool = True):
+    # Ativa um Trace novo no contexto atual (um por frame nos loops contínuos)
+    if not enabled:
+        yield None
+        return
+    trace = Trace()
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+
+
+def _wants_trace(scope) -> bool:
+    if TRACE_ALL:
+        return True
+    for name, value in scope.get("headers", ()):
+        if name == TRACE_HEADER:
+            return value.lower() in (b"1", b"true")
+    return False
+
+
+class TracingMiddleware:
+    # Com "X-Trace: 1" na requisição, devolve os estágios no cabeçalho
+    # Server-Timing. Em respostas em streaming o cabeçalho sai com o que já
+    # foi medido até o primeiro byte.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_trace(scope):
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace()
+        token = current_trace.set(trace)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_trace.reset(token)
+
+
+def log_if_slow(trace: Optional[Trace], label: str):
+    if trace is not None and trace.elapsed() * 1000 >= TRACE_SLOW_MS:
+        stages = " ".join(f"{k}={v:.1f}ms" for k, v in trace.timings_ms().items())
+        print(f"[trace] {label} lento: {stages}")
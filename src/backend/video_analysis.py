@@ -0,0 +1,254 @@
+"""Análise offline de vídeos gravados (reuniões enviadas depois do fato).
+
+O vídeo é dividido em trechos de VIDEO_CHUNK_SECONDS analisados em paralelo
+por processos separados; cada um amostra --fps frames por segundo com o
+mesmo pipeline de detecção e classificação do emotion_server.py e devolve
+a linha do tempo por segundo do seu trecho.
+
+    python video_analysis.py reuniao.mp4 --fps 2 --workers 8 --output timeline.json
+    python video_analysis.py reuniao.mp4 --store   # grava no banco (emotion_store)
+
+Também usado pela rota POST /videos/analyze do main.py.
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from emotion_model import EMOTION_LABELS, EMOTION_TRANSLATION
+from pipeline import analyze_faces
+from preprocessing import build_detector
+
+# Frames analisados por segundo de vídeo
+VIDEO_SAMPLE_FPS = float(os.getenv("VIDEO_SAMPLE_FPS", "2"))
+# Processos de análise (um núcleo cada)
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", str(os.cpu_count() or 1)))
+# Tamanho de cada trecho distribuído aos processos
+VIDEO_CHUNK_SECONDS = int(os.getenv("VIDEO_CHUNK_SECONDS", "60"))
+# Distância até o próximo frame amostrado a partir da qual vale mais buscar
+# (volta ao keyframe anterior e decodifica até o alvo) do que avançar com grab()
+VIDEO_SEEK_SECONDS = float(os.getenv("VIDEO_SEEK_SECONDS", "2"))
+# Detector dos processos: "mediapipe", como o emotion_server.py, ou "haar"
+VIDEO_DETECTOR = os.getenv("VIDEO_DETECTOR", "mediapipe")
+# Vídeos analisados ao mesmo tempo pela API; os demais esperam na fila
+VIDEO_MAX_JOBS = int(os.getenv("VIDEO_MAX_JOBS", "1"))
+
+# Estado de cada processo de análise
+_detector = None
+
+
+def _init_worker(detector_name: str):
+    global _detector
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    os.environ.setdefault("TF_NUM_INTRAOP_THREADS", "1")
+    os.environ.setdefault("TF_NUM_INTEROP_THREADS", "1")
+    cv2.setNumThreads(1)
+    import emotion_model
+    if emotion_model.EMOTION_MODEL_THREADS == 0:
+        emotion_model.EMOTION_MODEL_THREADS = 1
+    _detector = build_detector(detector_name, "bgr")
+    try:
+        emotion_model.get_classifier()
+    except Exception as e:
+        print(f"Processo de vídeo sem modelo de emoções: {str(e)}")
+
+
+def probe_video(path: str) -> Tuple[float, int]:
+    # (fps, número de frames) segundo o contêiner
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError(f"Não foi possível abrir o vídeo {path}")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+    if fps <= 0 or frames <= 0:
+        raise ValueError(f"Vídeo sem taxa de quadros ou duração legível: {path}")
+    return fps, frames
+
+
+def split_chunks(duration: float, chunk_seconds: int = VIDEO_CHUNK_SECONDS) -> List[Tuple[int, float]]:
+    # Trechos em segundos inteiros, para nenhum segundo da linha do tempo ficar dividido
+    chunks = []
+    start = 0
+    while start < duration:
+        chunks.append((start, min(start + chunk_seconds, duration)))
+        start += chunk_seconds
+    return chunks
+
+
+def sample_times(start: float, end: float, sample_fps: float) -> List[float]:
+    step = 1.0 / sample_fps
+    count = int(np.ceil((end - start) * sample_fps - 1e-9))
+    return [start + i * step for i in range(count)]
+
+
+def analyze_chunk(path: str, start: float, end: float, sample_fps: float) -> Dict[int, list]:
+    # Roda no processo filho. Devolve {segundo: [amostras, rostos, soma dos scores]}
+    cap = cv2.VideoCapture(path)
+    seconds: Dict[int, list] = {}
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        seek_frames = max(1, int(fps * VIDEO_SEEK_SECONDS))
+        position = None  # índice do próximo frame que o read() devolve
+        for t in sample_times(start, end, sample_fps):
+            target = int(round(t * fps))
+            if position is None or target < position or target - position > seek_frames:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                position = target
+            # grab() só demultiplexa e decodifica: sem conversão de cor nem cópia
+            while position < target and cap.grab():
+                position += 1
+            ok, frame = cap.read()
+            if not ok:
+                break
+            position += 1
+
+            result = analyze_faces(_detector, frame, "bgr")
+            second = seconds.setdefault(int(t), [0, 0, [0.0] * len(EMOTION_LABELS)])
+            second[0] += 1
+            for face in result["faces"]:
+                second[1] += 1
+                for i, label in enumerate(EMOTION_LABELS):
+                    second[2][i] += face["emotions"].get(label, 0.0)
+    finally:
+        cap.release()
+    return seconds
+
+
+def build_timeline(seconds: Dict[int, list]) -> List[Dict]:
+    timeline = []
+    for second in sorted(seconds):
+        samples, faces, sums = seconds[second]
+        emotions = {}
+        dominant = None
+        if faces:
+            # Média dos scores de todos os rostos vistos no segundo, em português
+            means = np.asarray(sums) / faces
+            emotions = {EMOTION_TRANSLATION[label]: round(float(v), 2) for label, v in zip(EMOTION_LABELS, means)}
+            dominant = EMOTION_TRANSLATION[EMOTION_LABELS[int(np.argmax(means))]]
+        timeline.append({
+            "second": second,
+            "samples": samples,
+            "faces": faces,
+            "dominant_emotion": dominant,
+            "emotions": emotions
+        })
+    return timeline
+
+
+def analyze_video(path: str, sample_fps: float = VIDEO_SAMPLE_FPS, workers: int = VIDEO_WORKERS,
+                  chunk_seconds: int = VIDEO_CHUNK_SECONDS, detector: str = VIDEO_DETECTOR,
+                  progress: Optional[Callable[[float], None]] = None) -> List[Dict]:
+    fps, frames = probe_video(path)
+    duration = frames / fps
+    chunks = split_chunks(duration, chunk_seconds)
+    seconds: Dict[int, list] = {}
+    done = 0.0
+
+    ctx = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max(1, min(workers, len(chunks))), mp_context=ctx,
+        initializer=_init_worker, initargs=(detector,)
+    ) as executor:
+        futures = {
+            executor.submit(analyze_chunk, path, start, end, sample_fps): end - start
+            for start, end in chunks
+        }
+        for future in concurrent.futures.as_completed(futures):
+            seconds.update(future.result())
+            done += futures[future]
+            if progress is not None:
+                progress(min(1.0, done / duration))
+    return build_timeline(seconds)
+
+
+_job_slots = threading.Semaphore(VIDEO_MAX_JOBS)
+
+
+def start_video_job(path: str, filename: str, sample_fps: float = VIDEO_SAMPLE_FPS,
+                    delete_after: bool = True, user_id: Optional[int] = None) -> int:
+    # Registra a análise no banco e processa em segundo plano; devolve o id
+    import emotion_store
+
+    fps, frames = probe_video(path)
+    analysis_id = emotion_store.create_video_analysis(filename, frames / fps, sample_fps, user_id)
+
+    def run():
+        last_report = [0.0]
+
+        def report(fraction):
+            # No máximo uma escrita por segundo no banco
+            now = time.monotonic()
+            if fraction >= 1.0 or now - last_report[0] >= 1.0:
+                last_report[0] = now
+                emotion_store.update_video_progress(analysis_id, fraction)
+
+        try:
+            with _job_slots:
+                # Até aqui a análise esperava na fila (VIDEO_MAX_JOBS)
+                emotion_store.start_video_processing(analysis_id)
+                start = time.perf_counter()
+                timeline = analyze_video(path, sample_fps, progress=report)
+                emotion_store.save_video_timeline(analysis_id, timeline)
+            emotion_store.finish_video_analysis(analysis_id)
+            print(f"Vídeo {analysis_id} ({filename}) analisado em {time.perf_counter() - start:.1f} s")
+        except Exception as e:
+            print(f"Erro na análise do vídeo {analysis_id}: {str(e)}")
+            emotion_store.finish_video_analysis(analysis_id, str(e))
+        finally:
+            if delete_after:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    threading.Thread(target=run, name=f"video-analysis-{analysis_id}", daemon=True).start()
+    return analysis_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("video")
+    parser.add_argument("--fps", type=float, default=VIDEO_SAMPLE_FPS, help="frames analisados por segundo")
+    parser.add_argument("--workers", type=int, default=VIDEO_WORKERS)
+    parser.add_argument("--chunk-seconds", type=int, default=VIDEO_CHUNK_SECONDS)
+    parser.add_argument("--detector", choices=["mediapipe", "haar"], default=VIDEO_DETECTOR)
+    parser.add_argument("--output", help="arquivo JSON com a linha do tempo")
+    parser.add_argument("--store", action="store_true", help="grava a linha do tempo no banco")
+    args = parser.parse_args()
+
+    fps, frames = probe_video(args.video)
+    duration = frames / fps
+    print(f"{args.video}: {duration:.0f} s a {fps:.1f} fps, {args.workers} processos, "
+          f"{len(split_chunks(duration, args.chunk_seconds))} trechos")
+
+    def report(fraction):
+        print(f"\r{fraction * 100:5.1f}%", end="", flush=True)
+
+    start = time.perf_counter()
+    timeline = analyze_video(args.video, args.fps, args.workers, args.chunk_seconds, args.detector, report)
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(timeline)} segundos analisados em {elapsed:.1f} s ({duration / elapsed:.1f}x tempo real)")
+
+    if args.store:
+        import emotion_store
+        analysis_id = emotion_store.create_video_analysis(os.path.basename(args.video), duration, args.fps)
+        emotion_store.save_video_timeline(analysis_id, timeline)
+        emotion_store.finish_video_analysis(analysis_id)
+        print(f"Linha do tempo gravada como análise {analysis_id}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(timeline, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import struct
+import time
+from typing import Dict, List, Optional
+
+from emotion_model import EMOTION_TRANSLATION
+
+# Protocolo binário opcional para os resultados de /ws/analyze.
+#
+# Negociado pelo cliente com ?format=binary ou com o subprotocolo
+# "emotion.bin.v1". Resultados vão em frames binários; mensagens de
+# controle (error, ping) continuam em JSON.
+#
+# Cabeçalho (14 bytes, little-endian):
+#   uint8  magic (0x45 'E')
+#   uint8  versão (1)
+#   uint8  tipo (1 = analysis_result)
+#   uint8  flags (bit0 = rosto detectado, bit1 = scores em float16,
+#                 bits 2-3 = nível de degradação do servidor, 0-3,
+#                 bit4 = cena sem mudança: rostos repetidos do último
+#                 frame analisado, como "scene_unchanged" no JSON)
+#   uint64 timestamp em ms desde a época Unix
+#   uint8  número de rostos
+#   uint8  índice do rosto principal (255 = nenhum)
+#
+# Cada rosto:
+#   uint16 x, y, w, h
+#   uint32 track_id (0 = sem tracking)
+#   uint8  índice da emoção dominante em WIRE_ORDER (255 = não classificado)
+#   7 scores em WIRE_ORDER: uint8 (0-255 = 0-100%) ou float16 (em %)
+
+BINARY_SUBPROTOCOL = "emotion.bin.v1"
+MAGIC = 0x45
+VERSION = 1
+MSG_ANALYSIS_RESULT = 1
+FLAG_FACE_DETECTED = 0x01
+FLAG_FLOAT16 = 0x02
+NO_PRIMARY = 255
+NOT_CLASSIFIED = 255
+DEGRADATION_SHIFT = 2
+DEGRADATION_MASK = 0x0C
+FLAG_SCENE_UNCHANGED = 0x10
+MAX_FACES = 255
+
+# Ordem fixa dos scores no fio, a mesma do mapeamento usado pelo frontend
+WIRE_ORDER = list(EMOTION_TRANSLATION)
+_WIRE_INDEX = {label: i for i, label in enumerate(WIRE_ORDER)}
+
+_HEADER = struct.Struct("<BBBBQBB")
+_FACE_U8 = struct.Struct("<HHHHIB7B")
+_FACE_F16 = struct.Struct("<HHHHIB7e")
+
+
+def wants_binary(websocket) -> bool:
+    if websocket.query_params.get("format") == "binary":
+        return True
+    return BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", [])
+
+
+def negotiated_subprotocol(websocket) -> Optional[str]:
+    # Ecoa o subprotocolo quando o cliente o oferece no handshake
+    if BINARY_SUBPROTOCOL in websocket.scope.get("subprotocols", []):
+        return BINARY_SUBPROTOCOL
+    return None
+
+
+def _clamp16(v) -> int:
+    return min(max(int(v), 0), 0xFFFF)
+
+
+def encode_result(result: Dict, timestamp: Optional[float] = None, float16: bool = False) -> bytes:
+    faces = result.get("faces", [])[:MAX_FACES]
+    face_struct = _FACE_F16 if float16 else _FACE_U8
+    flags = (FLAG_FACE_DETECTED if result.get("face_detected") else 0) | (FLAG_FLOAT16 if float16 else 0)
+    flags |= (int(result.get("degradation", 0)) << DEGRADATION_SHIFT) & DEGRADATION_MASK
+
+    primary = NO_PRIMARY
+    if faces:
+        primary = max(range(len(faces)), key=lambda i: faces[i]["box"]["w"] * faces[i]["box"]["h"])
+
+    ts_ms = int((time.time() if timestamp is None else timestamp) * 1000)
+    buf = bytearray(_HEADER.size + face_struct.size * len(faces))
+    _HEADER.pack_into(buf, 0, MAGIC, VERSION, MSG_ANALYSIS_RESULT, flags, ts_ms, len(faces), primary)
+
+    offset = _HEADER.size
+    for face in faces:
+        box = face["box"]
+        emotions = face["emotions"]
+        if float16:
+            scores = [float(emotions.get(label, 0.0)) for label in WIRE_ORDER]
+        else:
+            # 0-100% quantizado em 0-255
+            scores = [min(255, int(emotions.get(label, 0.0) * 2.55 + 0.5)) for label in WIRE_ORDER]
+        face_struct.pack_into(
+            buf, offset,
+            _clamp16(box["x"]), _clamp16(box["y"]), _clamp16(box["w"]), _clamp16(box["h"]),
+            int(face.get("track_id", 0)),
+            _WIRE_INDEX.get(face["dominant_emotion"], NOT_CLASSIFIED),
+            *scores
+        )
+        offset += face_struct.size
+    return bytes(buf)
+
+
+def carry_forward(payload: bytes, degradation: int, timestamp: Optional[float] = None) -> bytes:
+    # Reaproveita um resultado já codificado para um frame sem mudança de cena:
+    # só o cabeçalho muda (flag, nível de degradação atual e timestamp)
+    magic, version, msg_type, flags, _, count, primary = _HEADER.unpack_from(payload, 0)
+    flags = (flags & ~DEGRADATION_MASK) | FLAG_SCENE_UNCHANGED
+    flags |= (int(degradation) << DEGRADATION_SHIFT) & DEGRADATION_MASK
+    ts_ms = int((time.time() if timestamp is None else timestamp) * 1000)
+    buf = bytearray(payload)
+    _HEADER.pack_into(buf, 0, magic, version, msg_type, flags, ts_ms, count, primary)
+    return bytes(buf)
+
+
+def decode_result(data: bytes) -> Dict:
+    # Inverso de encode_result; usado por clientes Python, testes de carga e benchmarks
+    magic, version, msg_type, flags, ts_ms, count, primary = _HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or msg_type != MSG_ANALYSIS_RESULT:
+        raise ValueError("Frame binário desconhecido")
+
+    float16 = bool(flags & FLAG_FLOAT16)
+    face_struct = _FACE_F16 if float16 else _FACE_U8
+    faces: List[Dict] = []
+    offset = _HEADER.size
+    for _ in range(count):
+        x, y, w, h, track_id, dominant, *scores = face_struct.unpack_from(data, offset)
+        offset += face_struct.size
+        if not float16:
+            scores = [s / 2.55 for s in scores]
+        classified = dominant != NOT_CLASSIFIED
+        face = {
+            "box": {"x": x, "y": y, "w": w, "h": h},
+            "emotions": dict(zip(WIRE_ORDER, scores)) if classified else {},
+            "dominant_emotion": WIRE_ORDER[dominant] if classified else "none"
+        }
+        if track_id:
+            face["track_id"] = track_id
+        faces.append(face)
+
+    main_face = faces[primary] if primary != NO_PRIMARY and primary < len(faces) else None
+    return {
+        "emotions": main_face["emotions"] if main_face else {},
+        "dominant_emotion": main_face["dominant_emotion"] if main_face else "none",
+        "face_detected": bool(flags & FLAG_FACE_DETECTED),
+        "faces": faces,
+        "degradation": (flags & DEGRADATION_MASK) >> DEGRADATION_SHIFT,
+        "scene_unchanged": bool(flags & FLAG_SCENE_UNCHANGED),
+        "timestamp": ts_ms / 1000.0
+    }
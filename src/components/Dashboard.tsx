@@ -43,6 +43,18 @@ ChartJS.register(
   Legend
 );
 
+// Token do login: identifica o usuário no WebSocket (limite de conexões e
+// análises por equipe) e nas rotas que exigem autenticação
+const getAuthToken = () =>
+  localStorage.getItem("authToken") || sessionStorage.getItem("authToken") || "";
+
+const analyzeSocketUrl = () => {
+  const token = getAuthToken();
+  return token
+    ? `ws://localhost:8000/ws/analyze?token=${encodeURIComponent(token)}`
+    : "ws://localhost:8000/ws/analyze";
+};
+
 export default function Dashboard() {
   const router = useRouter();
   const { isLogged, userName } = useAuth();
@@ -423,7 +435,7 @@ export default function Dashboard() {
 
     if (!isLogged || mode !== "continuous" || !isAnalyzing) return;
 
-    websocket = new WebSocket("ws://localhost:8000/ws/analyze");
+    websocket = new WebSocket(analyzeSocketUrl());
     setWs(websocket);
 
     const processMessage = (data: any) => {
@@ -674,7 +686,7 @@ export default function Dashboard() {
       ],
     });
 
-    const websocket = new WebSocket("ws://localhost:8000/ws/analyze");
+    const websocket = new WebSocket(analyzeSocketUrl());
     setWs(websocket);
 
     // Controle de taxa de envio (3 FPS)
@@ -816,52 +828,28 @@ export default function Dashboard() {
         return acc;
       }, {} as Record<string, number>);
 
-      // Cria o prompt para a IA
-      const prompt = `Com base nos seguintes dados de análise emocional:
-${JSON.stringify(emotionData, null, 2)}
-
-Dominant emotion: ${dominantEmotion}
-Total frames analyzed: ${totalAnalyzed}
-
-Por favor, gere um relatório detalhado em português com:
-1. Uma análise geral do estado emocional
-2. Insights sobre possíveis causas para as emoções predominantes
-3. Recomendações para melhorar o bem-estar emocional
-4. Observações relevantes sobre padrões detectados
-
-Formate a resposta em markdown com títulos e parágrafos bem estruturados.`;
-
-      // Chama a API da OpenRouter
-      const response = await fetch(
-        "https://openrouter.ai/api/v1/chat/completions",
-        {
-          method: "POST",
-          headers: {
-            Authorization: `Bearer ${process.env.NEXT_PUBLIC_DEEPSEEK_API_KEY}`,
-            "HTTP-Referer": window.location.href,
-            "X-Title": "EmotionTrack",
-            "Content-Type": "application/json",
-          },
-          body: JSON.stringify({
-            model: "deepseek/deepseek-r1-0528:free",
-            messages: [
-              {
-                role: "user",
-                content: prompt,
-              },
-            ],
-          }),
-        }
-      );
+      // O backend monta o prompt, chama o provedor de IA e guarda o relatório
+      // em cache: os mesmos dados não geram uma nova chamada ao modelo
+      const response = await fetch("http://localhost:8000/reports", {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          Authorization: `Bearer ${getAuthToken()}`,
+        },
+        body: JSON.stringify({
+          emotions: emotionData,
+          dominant_emotion: dominantEmotion,
+          total_frames: totalAnalyzed,
+        }),
+      });
 
       if (!response.ok) {
         throw new Error(`Erro na API: ${response.statusText}`);
       }
 
-      const result = await response.json();
+      // Markdown enviado em streaming; o PDF precisa do texto completo
       const iaAnalysis =
-        result.choices[0]?.message?.content ||
-        "Não foi possível gerar a análise.";
+        (await response.text()) || "Não foi possível gerar a análise.";
 
       // Gera o PDF com a análise da IA
       generateIAPDF(iaAnalysis);